@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+ベンチマーク用のOpenAI / Anthropic APIの代替サーバー
+
+有料のAPIを呼ばずにパイプライン全体の性能を計測するため、チャット・音声認識・
+音声合成の各APIを、設定した遅延の分布とトークンの生成速度で模擬する。
+OPENAI_BASE_URL / ANTHROPIC_BASE_URL をこのサーバーに向けて使用する。
+
+使用例:
+    python -m benchmarks.fake_providers --port 9100 --ttft-ms 400 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:9100 \\
+        OPENAI_API_KEY=fake ANTHROPIC_API_KEY=fake python main.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# 応答テキストの素材（トークンに相当する単位に分割して返す）
+REPLY_SENTENCES = [
+    "これはベンチマーク用の応答です。",
+    "音声アシスタントの性能を計測しています。",
+    "実際のAPIは呼び出していません。",
+    "遅延とトークンの生成速度は設定で変更できます。",
+]
+
+@dataclass
+class LatencyProfile:
+    """遅延の分布（中央値と対数正規分布のσ）と生成速度"""
+    ttft_ms: float = 400.0  # 最初のトークンまでの遅延の中央値
+    sigma: float = 0.35  # 遅延のばらつき（対数正規分布のσ）
+    tokens_per_second: float = 60.0
+    reply_tokens: int = 60  # 応答のトークン数（平均）
+    tts_base_ms: float = 250.0  # 音声合成の固定遅延の中央値
+    tts_ms_per_char: float = 8.0
+    tts_bytes_per_char: int = 1200  # 合成音声のサイズ（MP3 24kbps程度）
+    stt_base_ms: float = 300.0  # 音声認識の固定遅延の中央値
+    stt_ms_per_kb: float = 2.0
+    error_rate: float = 0.0  # 500を返す割合
+    
+    def sample(self, median_ms: float) -> float:
+        """中央値が median_ms の対数正規分布から遅延（秒）をサンプリング"""
+        if median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(median_ms / 1000), self.sigma)
+    
+    def reply_chunks(self) -> List[str]:
+        """応答テキストをトークンに相当する2文字ずつの断片に分割"""
+        count = max(1, int(random.gauss(self.reply_tokens, self.reply_tokens * 0.2)))
+        text = ""
+        while len(text) < count * 2:
+            text += random.choice(REPLY_SENTENCES)
+        text = text[:count * 2]
+        return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+def _prompt_tokens(messages: List[dict]) -> int:
+    """プロンプトのトークン数の見積もり（文字数 / 2）"""
+    chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return max(1, chars // 2)
+
+def _has_cache_control(content) -> bool:
+    return isinstance(content, list) and any(
+        isinstance(block, dict) and "cache_control" in block for block in content
+    )
+
+def _block_text(content) -> str:
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return str(content)
+
+def _sse(data: dict, event: str = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+def create_app(profile: LatencyProfile) -> FastAPI:
+    app = FastAPI(title="Fake provider API")
+    
+    # Anthropicのプロンプトキャッシュに書き込まれたプレフィックス
+    cached_prefixes = set()
+    
+    def anthropic_usage(body: dict) -> dict:
+        """プロンプトキャッシュを模擬した入力トークン数
+        
+        cache_control の付いたブロックまでのプレフィックスを書き込み、
+        以降のリクエストでは一致する最も長いプレフィックスを読み込んだものとして数える。
+        """
+        blocks = [{"content": body.get("system", "")}] + body.get("messages", [])
+        total = _prompt_tokens(blocks)
+        breakpoints = [i for i, block in enumerate(blocks) if _has_cache_control(block.get("content"))]
+        if not breakpoints:
+            return {"input_tokens": total}
+        # cache_control の位置はプレフィックスの一致に影響しない
+        keys = [_block_text(block.get("content")) for block in blocks]
+        prefixes = [
+            json.dumps(keys[:i + 1], ensure_ascii=False)
+            for i in range(breakpoints[-1] + 1)
+        ]
+        hit = max((i for i, prefix in enumerate(prefixes) if prefix in cached_prefixes), default=-1)
+        read_tokens = _prompt_tokens(blocks[:hit + 1]) if hit >= 0 else 0
+        prefix_tokens = _prompt_tokens(blocks[:breakpoints[-1] + 1])
+        cached_prefixes.update(prefixes[i] for i in breakpoints)
+        return {
+            "input_tokens": max(0, total - prefix_tokens),
+            "cache_read_input_tokens": read_tokens,
+            "cache_creation_input_tokens": prefix_tokens - read_tokens,
+        }
+    
+    def server_error() -> JSONResponse:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected failure", "type": "server_error"}}
+        )
+    
+    async def stream_tokens(chunks: List[str]) -> AsyncIterator[str]:
+        await asyncio.sleep(profile.sample(profile.ttft_ms))
+        interval = 1 / profile.tokens_per_second if profile.tokens_per_second > 0 else 0
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(interval)
+    
+    async def generate(chunks: List[str]):
+        # ストリーミングしない場合も、生成が終わるまでの時間だけ待つ
+        async for _ in stream_tokens(chunks):
+            pass
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if random.random() < profile.error_rate:
+            return server_error()
+        chunks = profile.reply_chunks()
+        prompt_tokens = _prompt_tokens(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        
+        if not body.get("stream"):
+            await generate(chunks)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(chunks)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(chunks),
+                    "total_tokens": prompt_tokens + len(chunks)
+                }
+            }
+        
+        async def events() -> AsyncIterator[bytes]:
+            def chunk_event(delta: dict, finish_reason=None) -> bytes:
+                return _sse({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                })
+            
+            yield chunk_event({"role": "assistant", "content": ""})
+            async for chunk in stream_tokens(chunks):
+                yield chunk_event({"content": chunk})
+            yield chunk_event({}, "stop")
+            yield b"data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        if random.random() < profile.error_rate:
+            return server_error()
+        chunks = profile.reply_chunks()
+        input_usage = anthropic_usage(body)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "stop_sequence": None,
+        }
+        
+        if not body.get("stream"):
+            await generate(chunks)
+            return {
+                **message,
+                "content": [{"type": "text", "text": "".join(chunks)}],
+                "stop_reason": "end_turn",
+                "usage": {**input_usage, "output_tokens": len(chunks)}
+            }
+        
+        async def events() -> AsyncIterator[bytes]:
+            yield _sse({
+                "type": "message_start",
+                "message": {
+                    **message,
+                    "content": [],
+                    "stop_reason": None,
+                    "usage": {**input_usage, "output_tokens": 1}
+                }
+            }, "message_start")
+            yield _sse({
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""}
+            }, "content_block_start")
+            async for chunk in stream_tokens(chunks):
+                yield _sse({
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": chunk}
+                }, "content_block_delta")
+            yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            yield _sse({
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(chunks)}
+            }, "message_delta")
+            yield _sse({"type": "message_stop"}, "message_stop")
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        body = await request.json()
+        if random.random() < profile.error_rate:
+            return server_error()
+        text = body.get("input", "")
+        await asyncio.sleep(
+            profile.sample(profile.tts_base_ms) + len(text) * profile.tts_ms_per_char / 1000
+        )
+        # MP3のフレームヘッダーに似せた先頭バイト + 無音相当のデータ
+        audio = b"\xff\xf3\x44\xc4" + bytes(max(0, len(text) * profile.tts_bytes_per_char - 4))
+        return Response(content=audio, media_type="audio/mpeg")
+    
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        upload = form.get("file")
+        size = len(await upload.read()) if upload is not None else 0
+        if random.random() < profile.error_rate:
+            return server_error()
+        await asyncio.sleep(
+            profile.sample(profile.stt_base_ms) + size / 1024 * profile.stt_ms_per_kb / 1000
+        )
+        return {"text": "ベンチマーク用の音声入力です。今日の天気を教えてください。"}
+    
+    return app
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = LatencyProfile()
+    parser = argparse.ArgumentParser(description="OpenAI / Anthropic APIの代替サーバー（ベンチマーク用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms)
+    parser.add_argument("--sigma", type=float, default=defaults.sigma)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=defaults.reply_tokens)
+    parser.add_argument("--tts-base-ms", type=float, default=defaults.tts_base_ms)
+    parser.add_argument("--tts-ms-per-char", type=float, default=defaults.tts_ms_per_char)
+    parser.add_argument("--stt-base-ms", type=float, default=defaults.stt_base_ms)
+    parser.add_argument("--stt-ms-per-kb", type=float, default=defaults.stt_ms_per_kb)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    import uvicorn
+    args = parse_args(argv)
+    profile = LatencyProfile(
+        ttft_ms=args.ttft_ms,
+        sigma=args.sigma,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        tts_base_ms=args.tts_base_ms,
+        tts_ms_per_char=args.tts_ms_per_char,
+        stt_base_ms=args.stt_base_ms,
+        stt_ms_per_kb=args.stt_ms_per_kb,
+        error_rate=args.error_rate
+    )
+    uvicorn.run(create_app(profile), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
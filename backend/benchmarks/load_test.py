@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""
+APIの負荷試験
+
+/api/chat・/api/text-to-speech・/api/process-voice を指定した同時接続数で呼び出し、
+クライアントから見た応答時間と Server-Timing ヘッダーのステージごとの処理時間の
+p50/p95/p99、スループット、サーバープロセスのメモリ使用量を表示する。
+
+--spawn を指定すると、代替APIサーバー（benchmarks/fake_providers.py）とアプリケーションを
+起動して計測するため、有料のAPIを呼ばずに実行できる。--baseline に以前の --json の出力を
+指定すると、p95が --max-regression を超えて悪化した場合に終了コード1で終了する。
+
+使用例（backend ディレクトリで実行）:
+    python -m benchmarks.load_test --spawn --concurrency 1,8,32 --requests 100
+    python -m benchmarks.load_test --spawn --json result.json --baseline baseline.json
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --server-pid 12345
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from services.audio_utils import encode_wav
+
+SCENARIOS = {
+    "chat": "/api/chat",
+    "tts": "/api/text-to-speech",
+    "process-voice": "/api/process-voice",
+}
+
+# クライアントから見た応答時間の名前（Server-Timing の total と区別する）
+CLIENT_STAGE = "client"
+
+def percentile(values: List[float], p: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(np.ceil(p / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Server-Timing ヘッダーを {名前: ミリ秒} に変換（同じ名前は合計する）"""
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        name, *params = entry.strip().split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                try:
+                    timings[name] = timings.get(name, 0.0) + float(value)
+                except ValueError:
+                    pass
+    return timings
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """プロセスの常駐メモリ（RSS）を取得（Linuxのみ）"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+def _speech_clip(index: int, seconds: float = 2.0, sample_rate: int = 16000) -> str:
+    """音声認識用の合成音声（Base64のWAV）。同時リクエストが共有されないよう番号ごとにノイズを変える"""
+    rng = np.random.default_rng(index)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # 音節のように振幅が変化する音 + 小さなノイズ
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    samples = 0.3 * envelope * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(len(t))
+    return base64.b64encode(encode_wav(samples.astype(np.float32), sample_rate)).decode("utf-8")
+
+def build_payloads(scenario: str, count: int, repeat_inputs: bool, offset: int = 0) -> List[dict]:
+    """リクエストのボディを作成（repeat_inputs でない場合は毎回異なる内容にしてキャッシュ等を避ける）"""
+    payloads = []
+    for i in range(offset, offset + count):
+        index = 0 if repeat_inputs else i
+        if scenario == "chat":
+            payloads.append({"message": f"ベンチマーク{index}: 今日の予定を教えてください。"})
+        elif scenario == "tts":
+            payloads.append({"text": f"ベンチマーク用の音声合成です。番号は{index}です。"})
+        else:
+            payloads.append({"audio": _speech_clip(index), "format": "wav"})
+    return payloads
+
+class LevelResult:
+    """1つのシナリオ・同時接続数での計測結果"""
+    
+    def __init__(self, scenario: str, concurrency: int):
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.stages: Dict[str, List[float]] = {CLIENT_STAGE: []}
+        self.status_codes: Dict[int, int] = {}
+        self.errors = 0
+        self.elapsed = 0.0
+        self.rss_peak: Optional[int] = None
+        self.rss_end: Optional[int] = None
+    
+    def record(self, status_code: int, seconds: float, server_timing: Dict[str, float]):
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        if status_code >= 400:
+            self.errors += 1
+            return
+        self.stages[CLIENT_STAGE].append(seconds * 1000)
+        for name, duration in server_timing.items():
+            self.stages.setdefault(name, []).append(duration)
+    
+    def to_dict(self) -> dict:
+        completed = len(self.stages[CLIENT_STAGE])
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "requests": sum(self.status_codes.values()),
+            "errors": self.errors,
+            "statusCodes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "throughput": completed / self.elapsed if self.elapsed else 0.0,
+            "rssPeakBytes": self.rss_peak,
+            "rssEndBytes": self.rss_end,
+            "stages": {
+                name: {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                }
+                for name, values in self.stages.items()
+                if values
+            },
+        }
+
+async def _sample_memory(pid: int, result: LevelResult, interval: float = 0.2):
+    """計測中のサーバープロセスのRSSを定期的に記録"""
+    while True:
+        rss = read_rss_bytes(pid)
+        if rss is not None:
+            result.rss_peak = max(result.rss_peak or 0, rss)
+            result.rss_end = rss
+        await asyncio.sleep(interval)
+
+async def run_level(
+    client: httpx.AsyncClient,
+    scenario: str,
+    concurrency: int,
+    payloads: List[dict],
+    server_pid: Optional[int]
+) -> LevelResult:
+    """payloads を concurrency 本のワーカーで順に送信（クローズドループ）"""
+    result = LevelResult(scenario, concurrency)
+    path = SCENARIOS[scenario]
+    queue = iter(payloads)
+    
+    async def worker():
+        for payload in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=payload)
+            except httpx.HTTPError:
+                result.record(599, time.perf_counter() - start, {})
+                continue
+            result.record(
+                response.status_code,
+                time.perf_counter() - start,
+                parse_server_timing(response.headers.get("server-timing"))
+            )
+    
+    sampler = asyncio.create_task(_sample_memory(server_pid, result)) if server_pid else None
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        result.elapsed = time.perf_counter() - start
+        if sampler is not None:
+            sampler.cancel()
+    return result
+
+def _format_bytes(size: Optional[int]) -> str:
+    return f"{size / 1024 / 1024:.1f}MB" if size is not None else "n/a"
+
+def print_result(result: dict):
+    print(
+        f"\n[{result['scenario']}] concurrency={result['concurrency']} "
+        f"requests={result['requests']} errors={result['errors']} "
+        f"throughput={result['throughput']:.2f} req/s "
+        f"rss(peak/end)={_format_bytes(result['rssPeakBytes'])}/{_format_bytes(result['rssEndBytes'])}"
+    )
+    if result["errors"]:
+        print(f"  status codes: {result['statusCodes']}")
+    print(f"  {'stage':<16}{'count':>7}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}")
+    for name, stats in result["stages"].items():
+        print(
+            f"  {name:<16}{stats['count']:>7}{stats['p50']:>11.1f}"
+            f"{stats['p95']:>11.1f}{stats['p99']:>11.1f}"
+        )
+
+def compare_with_baseline(results: List[dict], baseline: List[dict], max_regression: float) -> List[str]:
+    """ベースラインと比べてp95が max_regression（割合）を超えて悪化したステージを返す"""
+    baseline_index = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_index.get((result["scenario"], result["concurrency"]))
+        if previous is None:
+            continue
+        for name, stats in result["stages"].items():
+            before = previous["stages"].get(name)
+            if before is None or not before["p95"]:
+                continue
+            ratio = stats["p95"] / before["p95"] - 1
+            if ratio > max_regression:
+                regressions.append(
+                    f"{result['scenario']} c={result['concurrency']} {name}: "
+                    f"p95 {before['p95']:.1f}ms -> {stats['p95']:.1f}ms (+{ratio * 100:.0f}%)"
+                )
+    return regressions
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited before becoming ready: {url}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def spawn_servers(args: argparse.Namespace) -> Tuple[str, int, List[subprocess.Popen]]:
+    """代替APIサーバーとアプリケーションを起動し、(アプリのURL, アプリのPID, プロセス) を返す"""
+    fake_port = _free_port()
+    app_port = _free_port()
+    processes = []
+    
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_providers", "--port", str(fake_port)]
+        + shlex.split(args.fake_args)
+    )
+    processes.append(fake)
+    _wait_until_ready(f"http://127.0.0.1:{fake_port}/docs", fake)
+    
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "benchmark",
+        "ANTHROPIC_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "LLM_PROVIDER": args.llm_provider,
+        "STT_PROVIDER": "openai",
+        "TTS_PROVIDER": "openai",
+        "FILLER_WARMUP": "false",
+    })
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(app_port), "--log-level", "warning"],
+        env=env
+    )
+    processes.append(app)
+    base_url = f"http://127.0.0.1:{app_port}"
+    _wait_until_ready(f"{base_url}/health", app)
+    return base_url, app.pid, processes
+
+async def run(args: argparse.Namespace, base_url: str, server_pid: Optional[int]) -> List[dict]:
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = []
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for scenario in scenarios:
+            if scenario not in SCENARIOS:
+                raise ValueError(f"Unknown scenario: {scenario}")
+            # ウォームアップ（接続の確立、モデルの読み込み等）は計測に含めない
+            warmup = build_payloads(scenario, args.warmup, args.repeat_inputs)
+            await run_level(client, scenario, 1, warmup, None)
+            offset = args.warmup
+            for concurrency in levels:
+                # 同時接続数ごとに異なる入力を使い、前の計測のキャッシュに当たらないようにする
+                payloads = build_payloads(scenario, args.requests, args.repeat_inputs, offset)
+                offset += args.requests
+                level = await run_level(client, scenario, concurrency, payloads, server_pid)
+                result = level.to_dict()
+                print_result(result)
+                results.append(result)
+    return results
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="音声アシスタントAPIの負荷試験")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="計測対象のURL（--spawn の場合は無視）")
+    parser.add_argument("--spawn", action="store_true", help="代替APIサーバーとアプリケーションを起動して計測する")
+    parser.add_argument("--fake-args", default="", help="代替APIサーバーに渡す引数（例: \"--ttft-ms 600 --error-rate 0.01\"）")
+    parser.add_argument("--llm-provider", choices=["openai", "claude"], default="openai", help="--spawn 時のLLMプロバイダー")
+    parser.add_argument("--server-pid", type=int, help="メモリ使用量を計測するサーバーのPID")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="カンマ区切り（chat, tts, process-voice）")
+    parser.add_argument("--concurrency", default="1,8,32", help="同時接続数（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=50, help="同時接続数ごとのリクエスト数")
+    parser.add_argument("--warmup", type=int, default=2, help="シナリオごとのウォームアップのリクエスト数")
+    parser.add_argument("--repeat-inputs", action="store_true", help="毎回同じ入力を送る（キャッシュ・共有の効果を計測）")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較するベースライン（以前の --json の出力）")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="許容するp95の悪化の割合")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.spawn:
+            base_url, server_pid, processes = spawn_servers(args)
+        else:
+            base_url, server_pid = args.base_url, args.server_pid
+        results = asyncio.run(run(args, base_url, server_pid))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+    
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file), args.max_regression)
+        if regressions:
+            print("\nPerformance regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo performance regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+起動時間のベンチマーク
+
+新しいプロセスで main をインポートし、以下の時間を計測する（--runs 回の中央値・最小・最大）。
+    process: インタプリタの起動から計測スクリプトの開始まで
+    import:  main のインポート（モジュールレベルのシングルトンの作成を含む）
+    startup: lifespan の開始処理（リクエストを受け付けられるまで）
+    ready:   バックグラウンドのウォームアップの完了（/health/ready が200になるまで）
+
+--budget-import-ms / --budget-ready-ms を超えた場合は終了コード1で終了する。
+
+使用例（backend ディレクトリで実行）:
+    python -m benchmarks.startup_bench --runs 5
+    python -m benchmarks.startup_bench --env STT_PROVIDER=local --env TTS_PROVIDER=local --importtime 15
+    python -m benchmarks.startup_bench --budget-import-ms 1500 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# 子プロセスで実行する計測スクリプト（結果を最終行にJSONで出力する）
+_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from services.warmup import startup_warmup
+
+async def probe():
+    async with main.app.router.lifespan_context(main.app):
+        serving = time.perf_counter()
+        await startup_warmup.wait()
+        ready = time.perf_counter()
+    return serving, ready, startup_warmup.status()
+
+serving, ready, status = asyncio.run(probe())
+print(json.dumps({
+    "import": imported - started,
+    "startup": serving - imported,
+    "ready": ready - imported,
+    "components": status["components"],
+}))
+"""
+
+METRICS = ("process", "import", "startup", "ready")
+
+def run_probe(env: Dict[str, str]) -> Dict[str, float]:
+    """新しいプロセスで起動時間を1回計測"""
+    launched = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", "import time; print(time.perf_counter(), flush=True)\n" + _PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    lines = result.stdout.strip().splitlines()
+    # 子プロセスの perf_counter はこのプロセスと同じ時計（CLOCK_MONOTONIC）を使う
+    probe_started = float(lines[0])
+    timings = json.loads(lines[-1])
+    timings["process"] = probe_started - launched
+    return timings
+
+def top_imports(env: Dict[str, str], count: int) -> List[str]:
+    """-X importtime で累積のインポート時間が長いモジュールを返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), module.rstrip()))
+    entries.sort(reverse=True)
+    return [f"{cumulative / 1000:>9.1f}ms {module}" for cumulative, module in entries[:count]]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--env", action="append", default=[], help="子プロセスの環境変数（KEY=VALUE、複数指定可）")
+    parser.add_argument("--importtime", type=int, default=0, help="インポート時間の長いモジュールを指定数だけ表示")
+    parser.add_argument("--budget-import-ms", type=float, help="main のインポート時間の上限（中央値）")
+    parser.add_argument("--budget-ready-ms", type=float, help="ウォームアップ完了までの時間の上限（中央値）")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    env = dict(os.environ)
+    for entry in args.env:
+        key, _, value = entry.partition("=")
+        env[key] = value
+    
+    runs = []
+    for _ in range(args.runs):
+        runs.append(run_probe(env))
+    
+    summary = {}
+    print(f"{'phase':<10}{'median(ms)':>12}{'min(ms)':>10}{'max(ms)':>10}")
+    for metric in METRICS:
+        values = [run[metric] * 1000 for run in runs]
+        summary[metric] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+        print(f"{metric:<10}{summary[metric]['median']:>12.1f}{summary[metric]['min']:>10.1f}{summary[metric]['max']:>10.1f}")
+    
+    print("\nWarm-up components (last run):")
+    for name, component in runs[-1]["components"].items():
+        print(f"  {name:<12}{component['status']:<10}{component['seconds'] * 1000:>10.1f}ms")
+    
+    if args.importtime:
+        print("\nSlowest imports (cumulative):")
+        for line in top_imports(env, args.importtime):
+            print(f"  {line}")
+    
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"summary": summary, "runs": runs}, output, indent=2)
+    
+    failures = []
+    if args.budget_import_ms is not None and summary["import"]["median"] > args.budget_import_ms:
+        failures.append(f"import {summary['import']['median']:.1f}ms > {args.budget_import_ms:.1f}ms")
+    if args.budget_ready_ms is not None and summary["ready"]["median"] > args.budget_ready_ms:
+        failures.append(f"ready {summary['ready']['median']:.1f}ms > {args.budget_ready_ms:.1f}ms")
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
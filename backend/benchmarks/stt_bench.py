@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+ローカル音声認識エンジンのベンチマーク
+
+エンジン（WHISPER_BACKEND の選択肢）ごとにモデルをロードし、同じ音声を認識して
+実時間係数（RTF = 処理時間 / 音声の長さ、小さいほど速い）を比較する。
+--parallel を指定すると、その数のスレッドで同時に認識した場合のスループット
+（1秒あたりに処理できる音声の秒数）も計測する。
+
+音声は --clips で指定したファイル（16kHz PCMのWAV以外はffmpegでデコード）を使う。
+省略した場合は音声に似た合成信号（5・15・30秒）を使うが、認識結果に意味はないため
+精度の比較には実際の録音を指定すること。
+
+使用例（backend ディレクトリで実行）:
+    python -m benchmarks.stt_bench --model base
+    python -m benchmarks.stt_bench --backends torch-int8 faster-whisper --threads 4 --parallel 2
+    python -m benchmarks.stt_bench --clips samples/*.wav --beam-size 5 --json stt.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import numpy as np
+from config.settings import settings
+from services.audio_utils import decode_audio, WHISPER_SAMPLE_RATE
+from services.whisper_service import STT_ENGINES, create_stt_engine
+
+SYNTHETIC_SECONDS = (5, 15, 30)
+
+def synthetic_clip(seconds: float, seed: int) -> np.ndarray:
+    """音声に似た信号（基本周波数が揺れる有声音の音節と短い無音の繰り返し）を生成"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * WHISPER_SAMPLE_RATE)
+    parts = []
+    length = 0
+    while length < total:
+        count = int(rng.uniform(0.12, 0.3) * WHISPER_SAMPLE_RATE)
+        t = np.arange(count) / WHISPER_SAMPLE_RATE
+        f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+        phase = 2 * np.pi * np.cumsum(f0) / WHISPER_SAMPLE_RATE
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = np.sin(np.pi * np.arange(count) / count)
+        parts.append(0.3 * voiced * envelope + 0.01 * rng.standard_normal(count))
+        length += count
+        if rng.random() < 0.2:
+            pause = int(rng.uniform(0.2, 0.5) * WHISPER_SAMPLE_RATE)
+            parts.append(np.zeros(pause))
+            length += pause
+    return np.concatenate(parts)[:total].astype(np.float32)
+
+def load_clips(paths: List[str]) -> List[Tuple[str, np.ndarray]]:
+    """計測に使う音声を (名前, 16kHzのfloat32の波形) のリストで返す"""
+    if not paths:
+        return [
+            (f"synthetic-{seconds}s", synthetic_clip(seconds, seed))
+            for seed, seconds in enumerate(SYNTHETIC_SECONDS)
+        ]
+    clips = []
+    for path in paths:
+        with open(path, "rb") as audio_file:
+            clips.append((path, decode_audio(audio_file.read())))
+    return clips
+
+def bench_backend(
+    name: str,
+    model_name: str,
+    device: str,
+    language: str,
+    clips: List[Tuple[str, np.ndarray]],
+    repeats: int,
+    parallel: int
+) -> Dict:
+    """1つのエンジンでロード時間・RTF・スループットを計測"""
+    engine = create_stt_engine(name)
+    if not engine.available:
+        return {"backend": name, "error": f"{engine.module} is not installed"}
+    
+    device = engine.resolve_device(device)
+    started = time.perf_counter()
+    model, size = engine.load(model_name, device)
+    load_seconds = time.perf_counter() - started
+    
+    # 初回の推論（メモリ確保等）は計測に含めない
+    engine.transcribe(model, np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32), language, device)
+    
+    def run(audio: np.ndarray) -> Tuple[float, str]:
+        started = time.perf_counter()
+        segments = engine.transcribe(model, audio, language, device)
+        return time.perf_counter() - started, "".join(text for _, _, text in segments).strip()
+    
+    rtfs = []
+    texts = {}
+    for clip_name, audio in clips:
+        duration = len(audio) / WHISPER_SAMPLE_RATE
+        for _ in range(repeats):
+            elapsed, text = run(audio)
+            rtfs.append(elapsed / duration)
+        texts[clip_name] = text
+    
+    result = {
+        "backend": name,
+        "model": model_name,
+        "device": device,
+        "loadSeconds": load_seconds,
+        "memoryMB": size / 1024 / 1024,
+        "rtf": {
+            "mean": statistics.mean(rtfs),
+            "p50": statistics.median(rtfs),
+            "max": max(rtfs),
+        },
+        "texts": texts,
+    }
+    
+    if parallel > 1:
+        audios = [audio for _, audio in clips] * repeats * parallel
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            list(executor.map(run, audios))
+        elapsed = time.perf_counter() - started
+        result["throughput"] = sum(len(audio) for audio in audios) / WHISPER_SAMPLE_RATE / elapsed
+    return result
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ローカル音声認識エンジンのベンチマーク")
+    parser.add_argument("--backends", nargs="+", choices=list(STT_ENGINES), default=list(STT_ENGINES))
+    parser.add_argument("--model", default=settings.whisper_model)
+    parser.add_argument("--device", default=settings.whisper_device)
+    parser.add_argument("--language", default="ja")
+    parser.add_argument("--clips", nargs="*", default=[], help="計測に使う音声ファイル（省略時は合成信号）")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--parallel", type=int, default=1, help="同時に認識するスレッド数（2以上でスループットを計測）")
+    parser.add_argument("--threads", type=int, default=settings.whisper_intra_op_threads, help="1回の推論に使うスレッド数")
+    parser.add_argument("--beam-size", type=int, default=settings.whisper_beam_size)
+    parser.add_argument("--compute-type", default=settings.whisper_compute_type, help="faster-whisper の推論精度")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # エンジンは設定を参照するため、計測の条件で上書きする
+    settings.whisper_intra_op_threads = args.threads
+    settings.whisper_beam_size = args.beam_size
+    settings.whisper_compute_type = args.compute_type
+    settings.whisper_workers = max(1, args.parallel)
+    
+    clips = load_clips(args.clips)
+    audio_seconds = sum(len(audio) for _, audio in clips) / WHISPER_SAMPLE_RATE
+    print(f"{len(clips)} clips, {audio_seconds:.1f}s of audio, model={args.model}, beam={args.beam_size}, threads={args.threads or 'default'}\n")
+    
+    results = []
+    for name in args.backends:
+        results.append(bench_backend(
+            name, args.model, args.device, args.language, clips, args.repeats, args.parallel
+        ))
+    
+    print(f"{'backend':<16}{'device':<8}{'load(s)':>9}{'mem(MB)':>9}{'RTF mean':>10}{'RTF p50':>9}{'RTF max':>9}{'audio s/s':>11}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<16}skipped: {result['error']}")
+            continue
+        throughput = f"{result['throughput']:>11.1f}" if "throughput" in result else f"{'-':>11}"
+        print(
+            f"{result['backend']:<16}{result['device']:<8}{result['loadSeconds']:>9.1f}{result['memoryMB']:>9.0f}"
+            f"{result['rtf']['mean']:>10.3f}{result['rtf']['p50']:>9.3f}{result['rtf']['max']:>9.3f}{throughput}"
+        )
+    
+    print("\nTranscripts:")
+    for result in results:
+        for clip_name, text in result.get("texts", {}).items():
+            print(f"  [{result['backend']}] {clip_name}: {text[:80]}")
+    
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"clips": [name for name, _ in clips], "results": results}, output, indent=2, ensure_ascii=False)
+    
+    return 0 if any("error" not in result for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,76 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, Literal
+from typing import Dict, Optional, Literal
 import os
 
 class Settings(BaseSettings):
     # LLM Provider Selection
     llm_provider: Literal["openai", "claude"] = "openai"
+    llm_secondary_provider: Optional[Literal["openai", "claude"]] = None  # 遅い・失敗した場合に使うプロバイダー
     
     # TTS Provider Selection
     tts_provider: Literal["openai", "local"] = "openai"
+    tts_secondary_provider: Optional[Literal["openai", "local"]] = None
     
     # STT Provider Selection
     stt_provider: Literal["openai", "local"] = "openai"
+    stt_secondary_provider: Optional[Literal["openai", "local"]] = None
     
     # API Keys
     openai_api_key: Optional[str] = None
     anthropic_api_key: Optional[str] = None
     google_cloud_api_key: Optional[str] = None
     
+    # API Base URLs（ベンチマーク用の代替サーバー等に向ける場合のみ指定）
+    openai_base_url: Optional[str] = None
+    anthropic_base_url: Optional[str] = None
+    
     # Server Settings
     host: str = "0.0.0.0"
     port: int = 8000
+    startup_wait_for_warmup: bool = False  # 起動時のウォームアップが終わるまでリクエストを受け付けない
+    
+    # Production Server Settings (serve.py)
+    serve_workers: int = 0  # ワーカープロセス数（0の場合はCPU数）
+    serve_threads_per_worker: int = 0  # ワーカーごとの推論スレッド数（0の場合はCPU数をワーカー数で分割）
+    serve_preload_models: bool = True  # fork前にローカルモデルの重みをロードしてワーカー間で共有する
+    serve_graceful_timeout_seconds: int = 30  # 停止時に処理中のリクエストの完了を待つ時間
+    
+    # Admission Control Settings（0の場合は無制限）
+    admission_max_concurrent_requests: int = 64  # 同時に処理するAPIリクエスト数
+    admission_queue_size: int = 128  # 処理待ちにできるAPIリクエスト数（超えると503を返す）
+    stt_max_concurrency: int = 16  # ステージごとの同時実行数
+    llm_max_concurrency: int = 32
+    tts_max_concurrency: int = 16
+    stage_queue_size: int = 64  # ステージごとに実行待ちにできる数（超えると503を返す）
+    admission_queue_timeout_seconds: float = 10.0  # 待ち行列でこれ以上待った場合は503を返す
+    admission_retry_after_seconds: int = 1
+    session_max_pending: int = 2  # 同じセッションで実行中 + 待機中にできるリクエスト数（超えると429を返す）
+    
+    # Provider HTTP Client Settings
+    http_max_connections: int = 100  # コネクションプールの最大接続数
+    http_max_keepalive_connections: int = 20  # 再利用のために保持する接続数
+    http_keepalive_expiry_seconds: float = 30.0
+    http_connect_timeout_seconds: float = 5.0
+    stt_timeout_seconds: float = 30.0  # 1回あたりのタイムアウト
+    chat_timeout_seconds: float = 60.0
+    tts_timeout_seconds: float = 30.0
+    provider_max_retries: int = 2
+    provider_retry_backoff_seconds: float = 0.25  # 指数バックオフの初期値（ジッター付き）
+    provider_retry_max_backoff_seconds: float = 4.0
+    provider_deadline_seconds: float = 90.0  # リトライを含めた全体の期限
+    
+    # Provider Routing Settings（*_secondary_provider を指定した場合）
+    router_hedging_enabled: bool = True  # 優先のプロバイダーが遅い場合に副プロバイダーにも送る
+    router_hedge_delay_ms: int = 0  # 副プロバイダーにも送るまでの待ち時間（0の場合は直近の遅延のパーセンタイル）
+    router_hedge_percentile: float = 0.95
+    router_hedge_min_delay_ms: int = 300
+    router_hedge_initial_delay_ms: int = 2000  # 遅延の記録が少ない間の待ち時間
+    router_ewma_alpha: float = 0.2
+    router_window_size: int = 100  # 遅延の分布とエラー率を計算する直近の呼び出し数
+    router_min_samples: int = 20
+    router_failure_threshold: int = 5  # 連続してこの回数失敗したらブレーカーを開く
+    router_error_rate_threshold: float = 0.5  # 直近のエラー率がこれを超えたらブレーカーを開く
+    router_open_seconds: float = 30.0  # ブレーカーを開いてから再び試すまでの時間
     
     # OpenAI Model Settings
     openai_chat_model: str = "gpt-3.5-turbo"
@@ -30,9 +81,94 @@ class Settings(BaseSettings):
     # Claude Model Settings
     claude_model: str = "claude-3-opus-20240229"
     
+    # Conversation History Settings
+    history_token_budget: int = 2000  # 会話履歴に使うトークン数の上限
+    history_token_budgets: Dict[str, int] = {}  # モデルごとの上限（例: {"gpt-4": 6000}）
+    history_summary_enabled: bool = True  # 上限を超えた古い発話を要約に畳み込む
+    history_summary_max_tokens: int = 300
+    
+    # Session Store Settings
+    session_store: Literal["memory", "sqlite"] = "memory"  # 複数ワーカーで共有する場合は sqlite
+    session_ttl_seconds: int = 3600  # 最後のアクセスからこの時間が経過したセッションを破棄
+    session_max_sessions: int = 10000  # メモリストアで保持するセッション数の上限
+    session_max_messages: int = 20  # セッションごとに保持するメッセージ数
+    session_sqlite_path: str = "sessions.db"
+    session_lease_seconds: float = 30.0  # sqlite: ワーカー間で処理中のセッションを排他するリースの期限（保持中は延長する）
+    session_lease_timeout_seconds: float = 60.0  # sqlite: 他のワーカーの処理の完了を待つ時間（超えると429を返す）
+    
+    # Local Whisper Settings
+    whisper_model: str = "base"  # デフォルトモデル（tiny, base, small, medium, large）
+    whisper_device: str = "auto"  # "cpu", "cuda", or "auto"
+    whisper_max_loaded_models: int = 2  # 同時にメモリに保持するモデル数
+    whisper_max_memory_mb: int = 4096  # 保持するモデルの合計メモリ上限
+    whisper_preload_models: str = ""  # 起動時にロードするモデル（カンマ区切り、空ならデフォルトモデル）
+    whisper_warmup: bool = True  # 起動時にモデルをロードして推論を1回実行する
+    whisper_workers: int = 1  # 推論を実行するスレッド数
+    whisper_queue_size: int = 8  # 実行待ちにできるリクエスト数（超えると503を返す）
+    whisper_retry_after_seconds: int = 1
+    whisper_batch_window_ms: int = 0  # 0より大きい場合、この時間内に届いた短い音声をまとめて推論
+    whisper_max_batch_size: int = 8
+    # 認識エンジン（openai-whisper: 標準 / torch-int8: 動的量子化したCPU向け / faster-whisper: CTranslate2）
+    whisper_backend: Literal["openai-whisper", "torch-int8", "faster-whisper"] = "openai-whisper"
+    whisper_compute_type: str = "int8"  # faster-whisper の推論精度（int8, int8_float16, float16, float32）
+    whisper_intra_op_threads: int = 0  # 1回の推論に使うスレッド数（0の場合は既定値）
+    whisper_inter_op_threads: int = 0  # torchの演算間の並列スレッド数（0の場合は既定値）
+    whisper_beam_size: int = 1  # 1の場合は貪欲法、2以上でビームサーチ（精度は上がるが遅くなる）
+    
+    # Voice Activity Detection Settings（STTの前に無音を除去する）
+    vad_enabled: bool = True
+    vad_threshold_db: float = -50.0  # これより小さいフレームは常に無音とみなす（dBFS）
+    vad_min_speech_ms: int = 150  # これより短い発話区間は除外する
+    vad_min_silence_ms: int = 300  # これより短い途切れは1つの発話区間にまとめる
+    vad_padding_ms: int = 200  # 発話区間の前後に残す余白
+    vad_split_seconds: float = 30.0  # これより長い録音は無音の位置で分割して並列に認識する
+    vad_upload_opus_bitrate: str = "24k"  # 無音を除いた音声をOpenAIへ送る場合のOpusのビットレート
+    
+    # Streaming STT Settings (/ws/speech-to-text)
+    stt_stream_interval_seconds: float = 1.0  # 途中結果を更新する間隔
+    stt_stream_window_seconds: float = 20.0  # 未確定の音声がこれを超えたら区切りまで確定する（30秒未満）
+    stt_stream_holdback_seconds: float = 1.0  # 末尾のこの範囲で終わるセグメントは確定しない
+    stt_stream_max_audio_mb: int = 20  # 1発話で受け付ける音声の上限
+    
+    # LLM Response Cache Settings（会話履歴のないプロンプトへの応答を再利用する）
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: float = 600.0
+    llm_cache_max_entries: int = 1000
+    
+    # Claude Prompt Caching（システムプロンプトと過去の会話履歴をプロバイダー側でキャッシュする）
+    claude_prompt_caching: bool = True
+    claude_prompt_caching_beta: str = "prompt-caching-2024-07-31"  # anthropic-beta ヘッダー（不要な場合は空）
+    
+    # TTS Output Format Settings
+    tts_output_format: Optional[str] = None  # 既定の出力フォーマット（mp3, opus, aac, flac, wav, pcm、未指定の場合はOpenAIはmp3・ローカルはwav）
+    tts_opus_bitrate: str = "32k"  # ローカルTTSの音声をエンコードする場合のビットレート
+    tts_aac_bitrate: str = "64k"
+    tts_mp3_bitrate: str = "64k"
+    
+    # Batch TTS Settings
+    tts_batch_max_items: int = 500  # 1リクエストの最大項目数
+    tts_batch_concurrency: int = 4  # 1リクエスト内で同時に合成する数（音声対話の枠を使い切らないよう小さくする）
+    tts_batch_busy_retries: int = 3  # TTSの枠が空かない場合に再試行する回数
+    
+    # TTS Cache Settings
+    tts_cache_enabled: bool = True
+    tts_cache_max_memory_mb: int = 64  # メモリ上のキャッシュの上限
+    tts_cache_dir: Optional[str] = None  # 指定するとディスクにもキャッシュする
+    tts_cache_max_disk_mb: int = 1024  # ディスク上のキャッシュの上限
+    
+    # Filler Audio Settings（LLMの応答を待つ間に再生する相づち）
+    filler_phrases: str = "はい。,えーと。,なるほど。,そうですね。"  # カンマ区切り
+    filler_warmup: bool = True  # 起動時に相づちの音声を合成しておく
+    
     # MeloTTS Settings
     melotts_language: Literal["EN", "JP", "ZH"] = "JP"
     melotts_device: str = "auto"  # "cpu", "cuda", or "auto"
+    melotts_workers: int = 1  # モデルをロードするワーカープロセス数
+    melotts_threads_per_worker: int = 0  # ワーカーごとのtorchのスレッド数（0の場合はCPU数をワーカー数で分割）
+    melotts_max_parallel_sentences: int = 2  # 1リクエスト内で並列に合成する文の数
+    melotts_queue_size: int = 8  # 実行待ちにできるリクエスト数（超えると503を返す）
+    melotts_retry_after_seconds: int = 1
+    melotts_warmup: bool = True  # 起動時にワーカーを起動してモデルをロードする
     
     class Config:
         env_file = ".env"
@@ -1,13 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+from starlette.background import BackgroundTask
+from starlette.routing import Match
+import asyncio
+import base64
+import json
 import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import uuid
 from config.settings import settings
 from services.llm_service import llm_service
 from services.speech_service import speech_service
+from services.provider_clients import provider_clients
+from services.sentence_splitter import SentenceSplitter, join_sentences
+from services.filler_service import filler_service
+from services.tts_batch import BatchItem, synthesize_batch
+from services.warmup import startup_warmup
+from services.streaming_stt import StreamingTranscription
+from services.errors import ServiceBusyError
+from services.admission import BULK, INTERACTIVE, request_limiter, request_priority
+from services.audio_utils import CONCAT_FORMATS, concat_audio, format_from_content_type, format_from_filename, media_type_for
+from services.metrics import (
+    format_server_timing,
+    http_request_duration,
+    http_requests_in_flight,
+    registry,
+    stage_timer,
+    start_request_timing,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,8 +44,29 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     logger.info(f"Server running on {settings.host}:{settings.port}")
+    # SDKのインポートやモデルのロードはバックグラウンドで行い、起動（リクエストの受け付け）を待たせない
+    # 完了前のリクエストでは、必要なものをその時点でロードする
+    startup_warmup.start("providers", lambda: asyncio.to_thread(provider_clients.import_sdks))
+    whisper = getattr(speech_service, "whisper", None)
+    if whisper is not None and settings.whisper_warmup:
+        startup_warmup.start("whisper", whisper.warm_up)
+    melotts = getattr(speech_service, "melotts", None)
+    if melotts is not None and settings.melotts_warmup:
+        startup_warmup.start("melotts", melotts.warm_up)
+    if settings.filler_warmup:
+        startup_warmup.start("filler", filler_service.warm_up)
+    if settings.startup_wait_for_warmup:
+        await startup_warmup.wait()
     yield
     logger.info("Shutting down...")
+    startup_warmup.cancel()
+    whisper = getattr(speech_service, "whisper", None)
+    if whisper is not None:
+        whisper.shutdown()
+    if melotts is not None:
+        melotts.shutdown()
+    await llm_service.close()
+    await provider_clients.close()
 
 app = FastAPI(
     title="Voice Assistant API",
@@ -32,22 +81,98 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id", "Server-Timing"],
 )
 
+def _handler_name(request: Request) -> str:
+    """メトリクスのラベルに使うハンドラー名（パスパラメータを含まない関数名）"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "name", None) or request.url.path
+    return "not_found"
+
+# 音声対話のターンより後回しにしてよいリクエスト
+BULK_PATH_PREFIXES = ("/api/text-to-speech",)
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """
+    APIリクエストの同時処理数を制限し、超えた分は優先度順に待たせる
+    
+    音声対話（process-voice等）を単体のTTSより優先し、待ち行列がいっぱいの場合は503を返す。
+    ストリーミングのレスポンスはヘッダーの送信までを1つのリクエストとして数える
+    （以降はステージごとの制限で抑える）。
+    """
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    
+    priority = BULK if request.url.path.startswith(BULK_PATH_PREFIXES) else INTERACTIVE
+    request_priority.set(priority)
+    try:
+        async with request_limiter.slot(priority):
+            return await call_next(request)
+    except ServiceBusyError as e:
+        # ミドルウェアで発生した例外は例外ハンドラーを経由しないため、ここで応答する
+        return await service_busy_handler(request, e)
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """リクエストの処理時間を記録し、各ステージの時間を Server-Timing ヘッダーで返す"""
+    handler = _handler_name(request)
+    timings = start_request_timing()
+    http_requests_in_flight.inc(handler=handler)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        http_requests_in_flight.dec(handler=handler)
+        http_request_duration.observe(
+            elapsed, handler=handler, method=request.method, status=str(status)
+        )
+    
+    # ストリーミングのレスポンスではヘッダー送信までに終わったステージのみが含まれる
+    response.headers["Server-Timing"] = format_server_timing(timings + [("total", elapsed * 1000)])
+    return response
+
+@app.exception_handler(ServiceBusyError)
+async def service_busy_handler(request: Request, exc: ServiceBusyError):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
+
 @app.get("/")
 async def root():
     return {"message": "Voice Assistant API is running"}
 
 @app.get("/health")
 async def health_check():
+    """生存確認（プロセスがリクエストを受け付けていれば常に200）"""
     return {
         "status": "healthy",
         "version": "1.0.0"
     }
 
+@app.get("/health/ready")
+async def readiness_check():
+    """準備完了の確認（起動時のウォームアップがすべて成功するまで503）"""
+    status = startup_warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus形式のメトリクス（ステージごとの処理時間、実行中の数、キャッシュ等）"""
+    return Response(
+        content=registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 class SpeechToTextRequest(BaseModel):
     audio: str
     format: str = "webm"
+    model: Optional[str] = None  # ローカルWhisperのモデル（tiny, base, small等）
 
 class SpeechToTextResponse(BaseModel):
     text: str
@@ -60,32 +185,59 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     sessionId: str
+    promptTokens: Optional[int] = None  # LLMに送信したプロンプトのトークン数（取得できない場合は見積もり値）
+    cachedPromptTokens: Optional[int] = None  # そのうちプロバイダー側のプロンプトキャッシュから読み込まれた数
+    cachedResponse: bool = False  # 応答キャッシュから返した場合はtrue
+
+class ClearSessionResponse(BaseModel):
+    sessionId: str
+    cleared: bool
 
 class TextToSpeechRequest(BaseModel):
     text: str
     voice: Optional[str] = "alloy"
     speed: Optional[float] = 1.0
+    format: Optional[str] = None  # 出力フォーマット（mp3, opus, aac, flac, wav, pcm、省略時は設定値）
 
 class TextToSpeechResponse(BaseModel):
     audio: str
     format: str
 
+class BatchTextToSpeechItem(BaseModel):
+    id: Optional[str] = None  # 結果の識別子（アーカイブのファイル名にも使う）
+    text: str
+    voice: Optional[str] = None
+    speed: Optional[float] = 1.0
+    format: Optional[str] = None
+
+class BatchTextToSpeechRequest(BaseModel):
+    items: List[BatchTextToSpeechItem]
+    archive: bool = False  # true の場合は結果をZIPアーカイブで返す
+
 class ProcessVoiceRequest(BaseModel):
     audio: str
     format: str = "webm"
     sessionId: Optional[str] = None
+    sttModel: Optional[str] = None  # ローカルWhisperのモデル（tiny, base, small等）
+    speculative: bool = False  # 応答の最初の文が完成した時点でその文のTTSを開始する
+    responseFormat: Optional[str] = None  # 応答音声のフォーマット（mp3, opus, aac, flac, wav, pcm）
 
 class ProcessVoiceResponse(BaseModel):
     responseAudio: str
     responseText: str
     inputText: str
     sessionId: str
+    responseFormat: Optional[str] = None  # 応答音声の実際のフォーマット
 
 @app.post("/api/speech-to-text", response_model=SpeechToTextResponse)
 async def speech_to_text(request: SpeechToTextRequest):
     try:
-        text = await speech_service.speech_to_text(request.audio, request.format)
+        text = await speech_service.speech_to_text(request.audio, request.format, request.model)
         return SpeechToTextResponse(text=text)
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Speech to text error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -98,46 +250,626 @@ async def chat(request: ChatRequest):
             request.message,
             session_id
         )
-        return ChatResponse(response=response, sessionId=session_id)
+        usage = await llm_service.get_session_usage(session_id)
+        prompt_tokens = None
+        if usage:
+            prompt_tokens = usage["promptTokens"] or usage["estimatedPromptTokens"]
+        return ChatResponse(
+            response=response,
+            sessionId=session_id,
+            promptTokens=prompt_tokens,
+            cachedPromptTokens=usage.get("cachedPromptTokens") if usage else None,
+            cachedResponse=bool(usage and usage.get("cachedResponse"))
+        )
+    except ServiceBusyError:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/api/sessions/{session_id}", response_model=ClearSessionResponse)
+async def clear_session(session_id: str):
+    """セッションの会話履歴を削除"""
+    cleared = await llm_service.clear_session(session_id)
+    return ClearSessionResponse(sessionId=session_id, cleared=cleared)
+
 @app.post("/api/text-to-speech", response_model=TextToSpeechResponse)
 async def text_to_speech(request: TextToSpeechRequest):
     try:
         audio_base64, format = await speech_service.text_to_speech(
             request.text,
             request.voice,
-            request.speed
+            request.speed,
+            request.format
         )
         return TextToSpeechResponse(audio=audio_base64, format=format)
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Text to speech error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/text-to-speech/batch")
+async def text_to_speech_batch(request: BatchTextToSpeechRequest):
+    """
+    複数のテキストをまとめて音声に変換
+    
+    同じ内容の項目は1回だけ合成し、並列数を制限して（単体のTTSと同じく音声対話より低い優先度で）処理する。
+    通常は完了した項目から順にNDJSON（1行に1項目）で返し、最後に集計の行を返す。
+    archive が true の場合は、音声ファイルと結果の一覧（manifest.json）を含むZIPを返す。
+    失敗した項目は、その項目の error に理由を格納する。
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items")
+    if len(request.items) > settings.tts_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items (max {settings.tts_batch_max_items})"
+        )
+    
+    items: List[BatchItem] = [
+        (item.text, item.voice, item.speed or 1.0, item.format) for item in request.items
+    ]
+    if request.archive:
+        return await _batch_archive(request.items, items)
+    return StreamingResponse(
+        _batch_lines(request.items, items),
+        media_type="application/x-ndjson"
+    )
+
+async def _batch_lines(
+    request_items: List[BatchTextToSpeechItem],
+    items: List[BatchItem]
+) -> AsyncIterator[str]:
+    """バッチの結果を完了した順にNDJSONの行として返す"""
+    unique = succeeded = 0
+    async for indices, audio, error in synthesize_batch(items):
+        unique += 1
+        result = {}
+        if error is not None:
+            result["error"] = str(error)
+        else:
+            result["format"] = audio[1]
+            result["audio"] = base64.b64encode(audio[0]).decode('utf-8')
+            succeeded += len(indices)
+        for index in indices:
+            line = {"type": "item", "index": index, "id": request_items[index].id, **result}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    
+    yield json.dumps({
+        "type": "done",
+        "total": len(items),
+        "unique": unique,
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded
+    }) + "\n"
+
+_ARCHIVE_UNSAFE_CHARS = re.compile(r"[^\w.-]")
+
+def _archive_name(index: int, item_id: Optional[str], audio_format: str) -> str:
+    """アーカイブ内のファイル名（順番 + 識別子）"""
+    if not item_id:
+        return f"{index:04d}.{audio_format}"
+    return f"{index:04d}-{_ARCHIVE_UNSAFE_CHARS.sub('_', item_id)[:64]}.{audio_format}"
+
+async def _batch_archive(
+    request_items: List[BatchTextToSpeechItem],
+    items: List[BatchItem]
+) -> FileResponse:
+    """バッチの結果をZIPアーカイブ（一時ファイル）に書き込んで返す"""
+    archive = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    manifest = []
+    try:
+        # 音声は圧縮済みのフォーマットが多いため、無圧縮で格納する
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as archive_file:
+            async for indices, audio, error in synthesize_batch(items):
+                for index in indices:
+                    entry = {"index": index, "id": request_items[index].id, "text": items[index][0]}
+                    if error is not None:
+                        entry["error"] = str(error)
+                    else:
+                        name = _archive_name(index, request_items[index].id, audio[1])
+                        await asyncio.to_thread(archive_file.writestr, name, audio[0])
+                        entry["file"] = name
+                        entry["format"] = audio[1]
+                    manifest.append(entry)
+            
+            manifest.sort(key=lambda entry: entry["index"])
+            archive_file.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        archive.close()
+    except BaseException:
+        archive.close()
+        os.remove(archive.name)
+        raise
+    
+    return FileResponse(
+        archive.name,
+        media_type="application/zip",
+        filename="text-to-speech.zip",
+        background=BackgroundTask(os.remove, archive.name)
+    )
+
 @app.post("/api/process-voice", response_model=ProcessVoiceResponse)
 async def process_voice(request: ProcessVoiceRequest):
     try:
         session_id = request.sessionId or str(uuid.uuid4())
+        # 音声認識とLLMの前に出力フォーマットを検証する
+        speech_service.output_format(request.responseFormat)
         
-        input_text = await speech_service.speech_to_text(request.audio, request.format)
+        input_text = await speech_service.speech_to_text(
+            request.audio,
+            request.format,
+            request.sttModel
+        )
         
-        response_text = await llm_service.get_chat_response(input_text, session_id)
+        # 発話が検出されなかった場合はLLMとTTSを呼ばずに空の応答を返す
+        if not input_text:
+            return ProcessVoiceResponse(
+                responseAudio="",
+                responseText="",
+                inputText="",
+                sessionId=session_id
+            )
         
-        response_audio, _ = await speech_service.text_to_speech(response_text)
+        if request.speculative:
+            response_text, response_audio, response_format = await _speculative_reply(
+                input_text,
+                session_id,
+                request.responseFormat
+            )
+        else:
+            response_text = await llm_service.get_chat_response(input_text, session_id)
+            response_audio, response_format = await speech_service.text_to_speech(
+                response_text,
+                output_format=request.responseFormat
+            )
         
         return ProcessVoiceResponse(
             responseAudio=response_audio,
             responseText=response_text,
             inputText=input_text,
-            sessionId=session_id
+            sessionId=session_id,
+            responseFormat=response_format
         )
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Process voice error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _speculative_reply(
+    input_text: str,
+    session_id: str,
+    output_format: Optional[str] = None
+) -> Tuple[str, str, str]:
+    """
+    LLMの応答をストリーミングし、最初の文が完成した時点でその文のTTSを開始する
+    
+    残りの文は生成の完了後にまとめて合成し、最初の文の音声と連結して返す。
+    連結できないフォーマット（Opus・FLAC）の場合は、生成の完了後に応答全体を1回で合成する。
+    
+    Returns:
+        (応答テキスト, Base64の音声データ, 音声フォーマット)
+    """
+    speculate = speech_service.response_format(output_format) in CONCAT_FORMATS
+    splitter = SentenceSplitter()
+    sentences = []
+    first_task: Optional[asyncio.Task] = None
+    response_chunks = []
+    try:
+        async for delta in llm_service.stream_chat_response(input_text, session_id):
+            response_chunks.append(delta)
+            sentences.extend(splitter.feed(delta))
+            if speculate and first_task is None and sentences:
+                first_task = asyncio.create_task(
+                    speech_service.synthesize(sentences[0], output_format=output_format)
+                )
+        sentences.extend(splitter.flush())
+        
+        response_text = "".join(response_chunks)
+        if first_task is None:
+            first_task = asyncio.create_task(
+                speech_service.synthesize(response_text, output_format=output_format)
+            )
+            sentences = sentences[:1]
+        
+        parts = [await first_task]
+        rest_text = join_sentences(sentences[1:])
+        if rest_text:
+            parts.append(await speech_service.synthesize(rest_text, output_format=output_format))
+    except BaseException:
+        if first_task is not None:
+            first_task.cancel()
+        raise
+    
+    combined = concat_audio(parts)
+    if combined is None:
+        # 文ごとの音声のフォーマットが揃わなかった場合（ローカルTTSのエンコードの失敗等）のみ
+        logger.warning("Failed to concatenate sentence audio, synthesizing the whole reply")
+        combined = await speech_service.synthesize(response_text, output_format=output_format)
+    with stage_timer("encode", "base64"):
+        response_audio = base64.b64encode(combined[0]).decode('utf-8')
+    return response_text, response_audio, combined[1]
+
+async def _read_audio_upload(request: Request, audio_format: Optional[str]) -> Tuple[bytes, str]:
+    """multipart/form-data または生のバイナリボディから音声データを読み取る"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing audio file field 'file'")
+        audio_data = await upload.read()
+        audio_format = (
+            audio_format
+            or form.get("format")
+            or format_from_filename(upload.filename)
+            or format_from_content_type(upload.content_type)
+        )
+    else:
+        audio_data = await request.body()
+        audio_format = audio_format or format_from_content_type(content_type)
+    
+    if not audio_data:
+        raise HTTPException(status_code=400, detail="Empty audio payload")
+    return audio_data, audio_format or "webm"
+
+@app.post("/api/speech-to-text/upload", response_model=SpeechToTextResponse)
+async def speech_to_text_upload(
+    request: Request,
+    format: Optional[str] = None,
+    model: Optional[str] = None
+):
+    """音声をバイナリ（multipart/form-data または application/octet-stream）で受け取りテキストに変換"""
+    audio_data, audio_format = await _read_audio_upload(request, format)
+    try:
+        text = await speech_service.transcribe(audio_data, audio_format, model)
+        return SpeechToTextResponse(text=text)
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Speech to text error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/text-to-speech/audio")
+async def text_to_speech_audio(request: TextToSpeechRequest):
+    """テキストを音声に変換し、Base64を介さずに音声データをストリーミングで返す"""
+    # ディスクキャッシュにある場合はファイルをそのまま配信する
+    try:
+        cached_file = speech_service.cached_audio_file(
+            request.text,
+            request.voice,
+            request.speed,
+            request.format
+        )
+        if cached_file is not None:
+            path, audio_format = cached_file
+            return FileResponse(path, media_type=media_type_for(audio_format))
+        
+        chunks, audio_format = await speech_service.stream_text_to_speech(
+            request.text,
+            request.voice,
+            request.speed,
+            request.format
+        )
+        return StreamingResponse(chunks, media_type=media_type_for(audio_format))
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Text to speech error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/process-voice/upload")
+async def process_voice_upload(
+    request: Request,
+    format: Optional[str] = None,
+    sessionId: Optional[str] = None,
+    sttModel: Optional[str] = None,
+    responseFormat: Optional[str] = None
+):
+    """
+    音声をバイナリで受け取り、応答音声をバイナリで返す
+    
+    レスポンスは multipart/form-data で、認識結果と応答テキストのJSON（metadata）と
+    応答音声（audio）を含む。ブラウザでは Response.formData() で読み取れる。
+    """
+    audio_data, audio_format = await _read_audio_upload(request, format)
+    try:
+        session_id = sessionId or str(uuid.uuid4())
+        speech_service.output_format(responseFormat)
+        
+        input_text = await speech_service.transcribe(audio_data, audio_format, sttModel)
+        
+        # 発話が検出されなかった場合はLLMとTTSを呼ばずに 204 を返す
+        if not input_text:
+            return Response(status_code=204, headers={"X-Session-Id": session_id})
+        
+        response_text = await llm_service.get_chat_response(input_text, session_id)
+        
+        response_audio, response_format = await speech_service.synthesize(
+            response_text,
+            output_format=responseFormat
+        )
+        
+        # テキストはヘッダーに入れると長い応答でプロキシの上限を超えうるため、音声と同じボディに含める
+        metadata = {
+            "inputText": input_text,
+            "responseText": response_text,
+            "sessionId": session_id,
+            "responseFormat": response_format
+        }
+        return _form_data_response(
+            [
+                ("metadata", None, "application/json", json.dumps(metadata, ensure_ascii=False).encode("utf-8")),
+                ("audio", f"response.{response_format}", media_type_for(response_format), response_audio)
+            ],
+            headers={"X-Session-Id": session_id}
+        )
+    except ServiceBusyError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Process voice error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _form_data_response(
+    parts: List[Tuple[str, Optional[str], str, bytes]],
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """(フィールド名, ファイル名, Content-Type, データ) のリストを multipart/form-data のレスポンスにする"""
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, filename, content_type, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: {disposition}\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        body += data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return Response(
+        content=bytes(body),
+        media_type=f"multipart/form-data; boundary={boundary}",
+        headers=headers
+    )
+
+async def _stream_reply(
+    websocket: WebSocket,
+    input_text: str,
+    session_id: str,
+    output_format: Optional[str] = None
+) -> str:
+    """LLMの応答をストリーミングし、文が完成するたびにTTSを開始して音声を順番に送信する"""
+    splitter = SentenceSplitter()
+    tts_queue: asyncio.Queue = asyncio.Queue()
+    
+    def schedule_tts(sentence: str):
+        task = asyncio.create_task(
+            speech_service.text_to_speech(sentence, output_format=output_format)
+        )
+        tts_queue.put_nowait((sentence, task))
+    
+    async def send_audio():
+        # TTSは並行して進めつつ、音声は文の順番どおりに送信する
+        index = 0
+        while True:
+            item = await tts_queue.get()
+            if item is None:
+                break
+            sentence, task = item
+            audio, audio_format = await task
+            await websocket.send_json({
+                "type": "audio",
+                "index": index,
+                "text": sentence,
+                "audio": audio,
+                "format": audio_format
+            })
+            index += 1
+    
+    sender = asyncio.create_task(send_audio())
+    response_chunks = []
+    try:
+        async for delta in llm_service.stream_chat_response(input_text, session_id):
+            response_chunks.append(delta)
+            await websocket.send_json({"type": "token", "text": delta})
+            for sentence in splitter.feed(delta):
+                schedule_tts(sentence)
+        
+        for sentence in splitter.flush():
+            schedule_tts(sentence)
+        tts_queue.put_nowait(None)
+        await sender
+    except BaseException:
+        sender.cancel()
+        while not tts_queue.empty():
+            item = tts_queue.get_nowait()
+            if item is not None:
+                item[1].cancel()
+        raise
+    
+    return "".join(response_chunks)
+
+async def _send_filler(websocket: WebSocket, response_format: Optional[str] = None):
+    """LLMの応答を待つ間に再生する相づちの音声を送信（準備できていない場合は何もしない）"""
+    filler = filler_service.choose(response_format)
+    if filler is not None:
+        await websocket.send_json({"type": "filler", **filler})
+
+@app.websocket("/ws/process-voice")
+async def process_voice_stream(websocket: WebSocket):
+    """
+    音声入力から音声応答までをストリーミングで処理
+    
+    クライアントは {"audio", "format", "sessionId", "sttModel", "filler", "responseFormat"} のJSONを送信する。
+    サーバーは transcript → token（複数）→ audio（文ごと、順番どおり）→ done の順にJSONを返す。
+    filler が true の場合は transcript の直後に相づちの音声（filler）を返す。
+    """
+    await websocket.accept()
+    try:
+        while True:
+            request = await websocket.receive_json()
+            try:
+                session_id = request.get("sessionId") or str(uuid.uuid4())
+                response_format = request.get("responseFormat")
+                speech_service.output_format(response_format)
+                
+                # 1ターンをAPIリクエストと同じ同時処理数の制限の対象とする
+                async with request_limiter.slot(INTERACTIVE):
+                    input_text = await speech_service.speech_to_text(
+                        request["audio"],
+                        request.get("format", "webm"),
+                        request.get("sttModel")
+                    )
+                    await websocket.send_json({
+                        "type": "transcript",
+                        "text": input_text,
+                        "sessionId": session_id
+                    })
+                    
+                    if request.get("filler") and input_text:
+                        await _send_filler(websocket, response_format)
+                    
+                    # 発話が検出されなかった場合はLLMとTTSを呼ばない
+                    response_text = await _stream_reply(
+                        websocket,
+                        input_text,
+                        session_id,
+                        response_format
+                    ) if input_text else ""
+                    
+                    await websocket.send_json({
+                        "type": "done",
+                        "responseText": response_text,
+                        "inputText": input_text,
+                        "sessionId": session_id
+                    })
+            except WebSocketDisconnect:
+                raise
+            except ServiceBusyError as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": str(e),
+                    "retryAfter": e.retry_after
+                })
+            except Exception as e:
+                logger.error(f"Process voice stream error: {str(e)}")
+                await websocket.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        logger.info("Process voice stream disconnected")
+
+@app.websocket("/ws/speech-to-text")
+async def speech_to_text_stream(websocket: WebSocket):
+    """
+    録音中の音声チャンクを受け取りながら逐次音声認識
+    
+    クライアントは {"type": "start", "format", "sttModel", "sessionId"} を送信した後、
+    録音中の音声チャンク（MediaRecorderのtimeslice等）をバイナリで順に送信し、
+    録音を終えたら {"type": "end", "respond": true|false, "filler": true|false, "responseFormat"} を送信する。
+    サーバーは partial（途中結果、ローカルWhisperのみ）→ transcript（最終結果）を返し、
+    respond が true の場合は続けて /ws/process-voice と同じ filler → token → audio を返す。
+    最後に必ず done を返す（応答しない場合、発話が検出されなかった場合は responseText が空）。
+    """
+    await websocket.accept()
+    
+    async def send_partial(text: str, committed: str):
+        await websocket.send_json({"type": "partial", "text": text, "committed": committed})
+    
+    transcription: Optional[StreamingTranscription] = None
+    session_id: Optional[str] = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                if message.get("bytes") is not None:
+                    if transcription is None:
+                        transcription = StreamingTranscription(on_partial=send_partial)
+                    transcription.append(message["bytes"])
+                    continue
+                
+                request = json.loads(message["text"])
+                if request.get("type") == "start":
+                    if transcription is not None:
+                        transcription.cancel()
+                    transcription = StreamingTranscription(
+                        request.get("format", "webm"),
+                        request.get("sttModel"),
+                        on_partial=send_partial
+                    )
+                    session_id = request.get("sessionId") or session_id
+                    continue
+                
+                if request.get("type") != "end":
+                    raise ValueError(f"Unknown message type: {request.get('type')}")
+                if transcription is None:
+                    raise ValueError("No audio received")
+                
+                session_id = session_id or str(uuid.uuid4())
+                current, transcription = transcription, None
+                async with request_limiter.slot(INTERACTIVE):
+                    input_text = await current.finalize()
+                    await websocket.send_json({
+                        "type": "transcript",
+                        "text": input_text,
+                        "sessionId": session_id
+                    })
+                    
+                    # 認識の完了後すぐにLLMの応答を開始する
+                    response_text = ""
+                    if request.get("respond") and input_text:
+                        if request.get("filler"):
+                            await _send_filler(websocket, request.get("responseFormat"))
+                        response_text = await _stream_reply(
+                            websocket,
+                            input_text,
+                            session_id,
+                            request.get("responseFormat")
+                        )
+                    
+                    # 応答しない場合（発話が検出されなかった場合を含む）も done で発話の処理の終了を知らせる
+                    await websocket.send_json({
+                        "type": "done",
+                        "responseText": response_text,
+                        "inputText": input_text,
+                        "sessionId": session_id
+                    })
+            except WebSocketDisconnect:
+                raise
+            except ServiceBusyError as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": str(e),
+                    "retryAfter": e.retry_after
+                })
+            except Exception as e:
+                logger.error(f"Speech to text stream error: {str(e)}")
+                # 録音中の発話は破棄し、次の start（または音声チャンク）から新しい発話として扱う
+                if transcription is not None:
+                    transcription.cancel()
+                    transcription = None
+                await websocket.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        logger.info("Speech to text stream disconnected")
+    finally:
+        if transcription is not None:
+            transcription.cancel()
+
 if __name__ == "__main__":
+    # 開発用（1プロセス、コード変更時に再起動）。本番では serve.py で複数ワーカーを起動する
     import uvicorn
     uvicorn.run(
         "main:app",
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+本番用のマルチワーカーサーバー
+
+1つのソケットを共有する複数のワーカープロセスを fork し、すべてのCPUコアで
+リクエストを処理する。main.py の `__main__`（開発用、reload付きの1プロセス）の代わりに使う。
+
+- ローカルのWhisper・MeloTTSの重みは fork 前に1回だけロードし、各ワーカーと
+  コピーオンライトで共有する（モデルのメモリがワーカー数倍にならない）
+- ワーカーごとの推論スレッド数を CPU数 / ワーカー数 に抑え、スレッドの奪い合いを防ぐ
+- SIGTERM / SIGINT を受けると新しい接続の受け付けを止め、処理中のリクエストの完了を
+  SERVE_GRACEFUL_TIMEOUT_SECONDS まで待ってから終了する。異常終了したワーカーは再起動する
+
+使用例（backend ディレクトリで実行）:
+    python serve.py
+    python serve.py --workers 4 --threads-per-worker 2 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+from config.settings import settings
+
+logger = logging.getLogger("serve")
+
+# 数値計算ライブラリのスレッド数（numpy・torch のインポート前に設定する）
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# 短時間で異常終了を繰り返すワーカーの再起動間隔
+RESTART_BACKOFF_SECONDS = 1.0
+
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+def _uses_cuda(device: str) -> bool:
+    import torch
+    return device == "cuda" or (device == "auto" and torch.cuda.is_available())
+
+def preload_models():
+    """
+    ローカルモデルの重みをこのプロセスにロードする（推論は行わない）
+    
+    fork 後のワーカーでは、ロード済みのモデルを使ってウォームアップ（推論）だけを行う。
+    CUDAのモデルと fork に対応していないエンジンは、各ワーカーで従来どおりロードする。
+    """
+    from services.speech_service import speech_service
+    whisper = getattr(speech_service, "whisper", None)
+    melotts = getattr(speech_service, "melotts", None)
+    
+    # fork 前に torch のスレッドプールを作らないよう、1スレッドでロードする
+    intra_op_threads = settings.whisper_intra_op_threads
+    settings.whisper_intra_op_threads = 1
+    try:
+        if whisper is not None:
+            if not whisper.engine.fork_safe:
+                logger.info(f"Whisper backend '{whisper.engine.name}' is loaded in each worker")
+            elif whisper.device == "cuda":
+                logger.info("CUDA Whisper models are loaded in each worker")
+            else:
+                started = time.perf_counter()
+                whisper.preload()
+                logger.info(f"Preloaded Whisper models in {time.perf_counter() - started:.1f}s")
+        
+        if melotts is not None and melotts.available:
+            if _uses_cuda(settings.melotts_device):
+                logger.info("CUDA MeloTTS models are loaded in each worker")
+            else:
+                melotts.preload(threads=1)
+    finally:
+        settings.whisper_intra_op_threads = intra_op_threads
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """全ワーカーで共有する待ち受けソケットを作成"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock: socket.socket, threads: int):
+    """ワーカープロセスでuvicornを実行する（fork した子プロセスで呼び出す）"""
+    import uvicorn
+    
+    # 端末の Ctrl-C は親プロセスだけが受け取り、ワーカーには SIGTERM で停止を伝える
+    os.setpgid(0, 0)
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    # 再試行のジッター等がワーカー間で同じ乱数列にならないようにする
+    random.seed()
+    
+    settings.whisper_intra_op_threads = settings.whisper_intra_op_threads or threads
+    if "torch" in sys.modules:
+        import torch
+        torch.set_num_threads(settings.whisper_intra_op_threads)
+    
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        timeout_graceful_shutdown=settings.serve_graceful_timeout_seconds
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+class WorkerSupervisor:
+    """ワーカープロセスを起動・監視し、シグナルを受けたら順に停止させる"""
+    
+    def __init__(self, app, sock: socket.socket, workers: int, threads: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self._children: Dict[int, float] = {}  # pid -> 起動時刻
+        self._stopping = False
+    
+    def spawn(self):
+        # ワーカーが自分のシグナルハンドラを設定するまで、親のハンドラが呼ばれないようにする
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.threads)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        self._children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+    
+    def stop(self, signum, frame):
+        """処理中のリクエストを終えてから停止するよう各ワーカーに伝える（2回目は即時停止）"""
+        self._stopping = True
+        logger.info(f"Received {signal.Signals(signum).name}, stopping {len(self._children)} worker(s)")
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def run(self) -> int:
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                logger.info(f"Worker {pid} stopped ({code})")
+                continue
+            logger.warning(f"Worker {pid} exited unexpectedly ({code}), restarting")
+            if time.monotonic() - started < RESTART_BACKOFF_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+            self.spawn()
+        
+        self.sock.close()
+        return 0
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="本番用のマルチワーカーサーバー")
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.serve_workers, help="ワーカープロセス数（0でCPU数）")
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=settings.serve_threads_per_worker,
+        help="ワーカーごとの推論スレッド数（0でCPU数をワーカー数で分割）"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    cpu_count = os.cpu_count() or 1
+    workers = args.workers or cpu_count
+    threads = args.threads_per_worker or max(1, cpu_count // workers)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    
+    logging.basicConfig(level=logging.INFO)
+    if workers > 1 and settings.session_store == "memory":
+        logger.warning("SESSION_STORE=memory keeps conversation history per worker; use sqlite to share it")
+    
+    from main import app
+    if settings.serve_preload_models:
+        preload_models()
+    # 共有した重み等のオブジェクトにGCが触れてページがコピーされないよう、以降のGCの対象から外す
+    gc.collect()
+    gc.freeze()
+    
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Serving on {args.host}:{args.port} with {workers} worker(s), {threads} thread(s) each")
+    return WorkerSupervisor(app, sock, workers, threads).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
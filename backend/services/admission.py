@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from config.settings import settings
+from services.errors import ServiceBusyError, TooManyRequestsError
+from services.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 優先度（値が小さいほど先に実行する）
+INTERACTIVE = 0  # 音声対話のターン
+BULK = 1  # 単体のTTS等、待たせても体感に影響しにくいリクエスト
+
+# 現在のリクエストの優先度（ステージの待ち行列で使う）
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+admission_active = registry.register(Gauge(
+    "admission_active",
+    "Operations currently holding an admission slot.",
+    ("stage",)
+))
+admission_queued = registry.register(Gauge(
+    "admission_queued",
+    "Operations waiting for an admission slot.",
+    ("stage",)
+))
+admission_rejected = registry.register(Counter(
+    "admission_rejected",
+    "Operations rejected by admission control.",
+    ("stage", "reason")
+))
+
+class StageLimiter:
+    """
+    同時実行数を制限し、超えた分を優先度順の有限の待ち行列で待たせる
+    
+    待ち行列がいっぱいの場合と、待ち時間が admission_queue_timeout_seconds を
+    超えた場合は ServiceBusyError（503）で即座に押し返す。
+    max_concurrency が0の場合は制限しない。
+    """
+    
+    def __init__(self, stage: str, max_concurrency: int, max_queue: int):
+        self.stage = stage
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        # (優先度, 到着順, Future) のヒープ
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+    
+    async def acquire(self, priority: int = INTERACTIVE):
+        if not self.max_concurrency:
+            return
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            admission_active.inc(stage=self.stage)
+            return
+        if len(self._waiters) >= self.max_queue:
+            admission_rejected.inc(stage=self.stage, reason="queue_full")
+            raise ServiceBusyError(
+                f"Server is busy ({self.stage})",
+                retry_after=settings.admission_retry_after_seconds
+            )
+        
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(self._waiters, entry)
+        admission_queued.inc(stage=self.stage)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), settings.admission_queue_timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 枠を受け取った直後にキャンセルされた場合は次の待機者に渡す
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                admission_queued.dec(stage=self.stage)
+            if isinstance(e, asyncio.TimeoutError):
+                admission_rejected.inc(stage=self.stage, reason="timeout")
+                raise ServiceBusyError(
+                    f"Server is busy ({self.stage})",
+                    retry_after=settings.admission_retry_after_seconds
+                )
+            raise
+    
+    def release(self):
+        if not self.max_concurrency:
+            return
+        # 枠は減らさずに、優先度の最も高い待機者へそのまま渡す
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            admission_queued.dec(stage=self.stage)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+        admission_active.dec(stage=self.stage)
+    
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None) -> AsyncIterator[None]:
+        """枠を確保して処理を行うコンテキストマネージャ（優先度の省略時は現在のリクエストの優先度）"""
+        await self.acquire(request_priority.get() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    async def run(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """枠を確保してから factory() を実行"""
+        async with self.slot():
+            return await factory()
+
+class SessionGate:
+    """
+    同じセッションのリクエストをプロセス内で1つずつ順番に処理する
+    
+    実行中 + 待機中のリクエストが max_pending を超えた場合は TooManyRequestsError（429）を返す。
+    複数のワーカープロセス（serve.py）の間の排他はセッションストアのリース
+    （SessionStore.lease、SESSION_STORE=sqlite の場合）で行う。
+    """
+    
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        # セッションID -> (ロック, 実行中 + 待機中の数)
+        self._sessions: Dict[str, Tuple[asyncio.Lock, int]] = {}
+    
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        if not session_id:
+            yield
+            return
+        
+        lock, pending = self._sessions.get(session_id) or (asyncio.Lock(), 0)
+        if self.max_pending and pending >= self.max_pending:
+            admission_rejected.inc(stage="session", reason="too_many_requests")
+            raise TooManyRequestsError(
+                "Too many concurrent requests for this session",
+                retry_after=settings.admission_retry_after_seconds
+            )
+        self._sessions[session_id] = (lock, pending + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, pending = self._sessions[session_id]
+            if pending <= 1:
+                del self._sessions[session_id]
+            else:
+                self._sessions[session_id] = (lock, pending - 1)
+
+# シングルトンインスタンス
+request_limiter = StageLimiter(
+    "request",
+    settings.admission_max_concurrent_requests,
+    settings.admission_queue_size
+)
+stage_limiters: Dict[str, StageLimiter] = {
+    "stt": StageLimiter("stt", settings.stt_max_concurrency, settings.stage_queue_size),
+    "llm": StageLimiter("llm", settings.llm_max_concurrency, settings.stage_queue_size),
+    "tts": StageLimiter("tts", settings.tts_max_concurrency, settings.stage_queue_size),
+}
@@ -0,0 +1,233 @@
+import io
+import shutil
+import subprocess
+import wave
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Whisperが想定するサンプルレート
+WHISPER_SAMPLE_RATE = 16000
+
+# 音声フォーマットとMIMEタイプの対応
+AUDIO_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "webm": "audio/webm",
+    "ogg": "audio/ogg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "m4a": "audio/mp4",
+    "mp4": "audio/mp4",
+    "pcm": "audio/pcm",
+}
+
+# TTSで指定できる出力フォーマット（pcmはヘッダーなしの16bit リトルエンディアン モノラル）
+TTS_OUTPUT_FORMATS = ("mp3", "opus", "aac", "flac", "wav", "pcm")
+
+# concat_audio で連結できるフォーマット（Opus（Ogg）とFLACはストリームのヘッダーがあるため連結できない）
+CONCAT_FORMATS = ("mp3", "aac", "pcm", "wav")
+
+# pcm 出力のサンプルレート（OpenAI TTSの pcm と揃える）
+PCM_SAMPLE_RATE = 24000
+
+# フォーマットごとのffmpegの出力オプション（{bitrate} はビットレートに置き換える）
+_ENCODER_ARGS = {
+    "opus": ["-c:a", "libopus", "-b:a", "{bitrate}", "-application", "voip", "-f", "ogg"],
+    "aac": ["-c:a", "aac", "-b:a", "{bitrate}", "-f", "adts"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "{bitrate}", "-f", "mp3"],
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    "pcm": ["-ar", str(PCM_SAMPLE_RATE), "-c:a", "pcm_s16le", "-f", "s16le"],
+}
+
+_CONTENT_TYPE_FORMATS = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/webm": "webm",
+    "video/webm": "webm",
+    "audio/ogg": "ogg",
+    "audio/aac": "aac",
+    "audio/flac": "flac",
+    "audio/mp4": "mp4",
+    "audio/x-m4a": "m4a",
+}
+
+def media_type_for(audio_format: str) -> str:
+    """音声フォーマットに対応するMIMEタイプを返す"""
+    return AUDIO_MEDIA_TYPES.get(audio_format, "application/octet-stream")
+
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Content-Typeヘッダーから音声フォーマットを推定する（不明な場合はNone）"""
+    if not content_type:
+        return None
+    mime = content_type.split(";")[0].strip().lower()
+    return _CONTENT_TYPE_FORMATS.get(mime)
+
+def format_from_filename(filename: Optional[str]) -> Optional[str]:
+    """ファイル名の拡張子から音声フォーマットを推定する（不明な場合はNone）"""
+    if not filename or "." not in filename:
+        return None
+    return filename.rsplit(".", 1)[1].lower()
+
+def decode_audio(audio_data: bytes, sample_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    音声データをモノラルのfloat32配列（-1.0〜1.0）にメモリ上でデコード
+    
+    16bit PCMのWAVでサンプルレートが一致する場合はそのまま読み込み、
+    それ以外（webm, mp3等）はffmpegの標準入出力をパイプで繋いで変換する。
+    
+    Args:
+        audio_data: 音声データ
+        sample_rate: 出力のサンプルレート
+    
+    Returns:
+        float32のNumPy配列
+    """
+    samples = _decode_pcm_wav(audio_data, sample_rate)
+    if samples is not None:
+        return samples
+    
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    try:
+        result = subprocess.run(cmd, input=audio_data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise Exception("ffmpeg is not installed")
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Failed to decode audio: {e.stderr.decode(errors='ignore').strip()[-200:]}")
+    
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+def encode_wav(samples: np.ndarray, sample_rate: int = WHISPER_SAMPLE_RATE) -> bytes:
+    """float32の波形（-1.0〜1.0）を16bit PCMのモノラルWAVに変換"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+def concat_audio(parts: List[Tuple[bytes, str]]) -> Optional[Tuple[bytes, str]]:
+    """
+    同じフォーマットの音声データを連結する
+    
+    MP3・AAC（ADTS）・pcmはそのまま連結し、WAVはPCMを連結してヘッダーを書き直す
+    （サンプルレートの異なる16bitモノラルのWAVは最初の音声のレートに変換し、
+    モック音声等の空のWAVは除く）。連結できない組み合わせの場合はNoneを返す。
+    """
+    formats = {audio_format for _, audio_format in parts}
+    if len(formats) != 1:
+        return None
+    audio_format = formats.pop()
+    if audio_format in ("mp3", "aac", "pcm"):
+        # MP3とADTS形式のAACはフレームの列、pcmはヘッダーがないため、そのまま連結できる
+        return b"".join(data for data, _ in parts), audio_format
+    if audio_format != "wav":
+        return None
+    
+    params = None
+    frames = []
+    try:
+        for data, _ in parts:
+            with wave.open(io.BytesIO(data)) as wav_file:
+                part_params = (wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate())
+                pcm = wav_file.readframes(wav_file.getnframes())
+            if not pcm:
+                continue
+            if part_params[2] <= 0:
+                return None
+            if params is None:
+                params = part_params
+            elif part_params != params:
+                if part_params[:2] != (1, 2) or params[:2] != (1, 2):
+                    return None
+                pcm = _resample_pcm16(pcm, part_params[2], params[2])
+            frames.append(pcm)
+        
+        # すべて空の場合は最初の音声をそのまま返す
+        if params is None:
+            return parts[0]
+        
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(params[0])
+            wav_file.setsampwidth(params[1])
+            wav_file.setframerate(params[2])
+            wav_file.writeframes(b"".join(frames))
+    except (wave.Error, EOFError):
+        return None
+    return buffer.getvalue(), audio_format
+
+def _resample_pcm16(pcm: bytes, from_rate: int, to_rate: int) -> bytes:
+    """16bitモノラルのPCMのサンプルレートを線形補間で変換"""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    count = int(round(len(samples) * to_rate / from_rate))
+    positions = np.arange(count) * (from_rate / to_rate)
+    resampled = np.interp(positions, np.arange(len(samples)), samples)
+    return np.clip(np.round(resampled), -32768, 32767).astype("<i2").tobytes()
+
+@lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    """ffmpegがインストールされているか"""
+    return shutil.which("ffmpeg") is not None
+
+def encode_audio(wav_data: bytes, audio_format: str, bitrate: Optional[str] = None) -> bytes:
+    """
+    WAVをffmpegの標準入出力をパイプで繋いで指定のフォーマットにエンコード
+    
+    Args:
+        wav_data: WAVの音声データ
+        audio_format: 出力フォーマット（opus, aac, mp3, flac, pcm）
+        bitrate: ビットレート（例: "32k"、flac と pcm では使わない）
+    
+    Returns:
+        エンコードした音声データ
+    """
+    if audio_format not in _ENCODER_ARGS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", "-ac", "1"]
+    cmd += [arg.format(bitrate=bitrate or "64k") for arg in _ENCODER_ARGS[audio_format]]
+    cmd.append("pipe:1")
+    try:
+        result = subprocess.run(cmd, input=wav_data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise Exception("ffmpeg is not installed")
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Failed to encode audio: {e.stderr.decode(errors='ignore').strip()[-200:]}")
+    
+    return result.stdout
+
+def _decode_pcm_wav(audio_data: bytes, sample_rate: int) -> Optional[np.ndarray]:
+    """変換不要なWAV（16bit PCM、指定サンプルレート）であれば直接読み込む"""
+    if not audio_data.startswith(b"RIFF") or audio_data[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(io.BytesIO(audio_data)) as wav_file:
+            if wav_file.getsampwidth() != 2 or wav_file.getframerate() != sample_rate:
+                return None
+            channels = wav_file.getnchannels()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    
+    samples = np.frombuffer(frames, np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
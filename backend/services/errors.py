@@ -0,0 +1,18 @@
+from typing import Optional
+
+class ServiceBusyError(Exception):
+    """処理能力を超えたため、リクエストを受け付けられない場合のエラー
+    
+    HTTPでは `status_code` のステータスと Retry-After ヘッダーで応答する。
+    """
+    
+    status_code = 503
+    
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TooManyRequestsError(ServiceBusyError):
+    """同じクライアント（セッション）からのリクエストが多すぎる場合のエラー"""
+    
+    status_code = 429
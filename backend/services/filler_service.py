@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional
+from config.settings import settings
+from services.speech_service import speech_service
+
+logger = logging.getLogger(__name__)
+
+class FillerService:
+    """
+    LLMの応答を待つ間に再生する相づち（「はい。」「えーと。」等）の音声を保持する
+    
+    起動時に filler_phrases の各フレーズを合成してメモリに置いておき、
+    発話の認識後すぐに返せるようにする。合成に失敗したフレーズは使わない。
+    """
+    
+    def __init__(self, phrases: List[str]):
+        self.phrases = phrases
+        self._fillers: Dict[Optional[str], List[Dict[str, str]]] = {}  # 出力フォーマット -> 相づち
+        self._preparing: Dict[Optional[str], asyncio.Task] = {}
+        self._last_text: Optional[str] = None
+    
+    async def warm_up(self):
+        """既定の出力フォーマットで各フレーズの音声を合成して保持"""
+        await self._prepare(None)
+    
+    async def _prepare(self, requested_format: Optional[str]):
+        """指定の出力フォーマットで各フレーズの音声を合成して保持"""
+        output_format = speech_service.output_format(requested_format)
+        # APIキーがない場合はモック音声（無音）になるため合成しない
+        if speech_service.tts_provider != "local" and not speech_service.api_key_exists:
+            logger.info("Skipping filler audio warm-up (no TTS available)")
+            self._fillers[output_format] = []
+            return
+        
+        results = await asyncio.gather(
+            *(
+                speech_service.text_to_speech(phrase, output_format=requested_format)
+                for phrase in self.phrases
+            ),
+            return_exceptions=True
+        )
+        fillers = []
+        for phrase, result in zip(self.phrases, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to synthesize filler '{phrase}': {str(result)}")
+                continue
+            audio, audio_format = result
+            fillers.append({"text": phrase, "audio": audio, "format": audio_format})
+        self._fillers[output_format] = fillers
+        logger.info(
+            f"Filler audio ready ({speech_service.response_format(requested_format)}): "
+            f"{len(fillers)}/{len(self.phrases)} phrases"
+        )
+    
+    def choose(self, requested_format: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        相づちを1つ選ぶ（直前と同じものは避ける）
+        
+        指定の出力フォーマットの音声が準備できていない場合はNoneを返し、
+        バックグラウンドで合成を始める（次のターンから使える）。
+        """
+        output_format = speech_service.output_format(requested_format)
+        fillers = self._fillers.get(output_format)
+        if fillers is None:
+            if output_format not in self._preparing:
+                self._preparing[output_format] = asyncio.ensure_future(self._prepare(requested_format))
+            return None
+        
+        candidates = [f for f in fillers if f["text"] != self._last_text] or fillers
+        if not candidates:
+            return None
+        filler = random.choice(candidates)
+        self._last_text = filler["text"]
+        return filler
+
+# シングルトンインスタンス
+filler_service = FillerService(
+    [phrase.strip() for phrase in settings.filler_phrases.split(",") if phrase.strip()]
+)
@@ -0,0 +1,66 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config.settings import settings
+from services.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+llm_cache_lookups = registry.register(Counter(
+    "llm_cache_lookups",
+    "LLM response cache lookups by result (hit, miss).",
+    ("result",)
+))
+llm_cache_entries = registry.register(Gauge(
+    "llm_cache_entries",
+    "Responses currently held in the LLM response cache."
+))
+
+class LLMResponseCache:
+    """
+    会話履歴のないプロンプトに対するLLMの応答の完全一致キャッシュ
+    
+    (プロバイダー, モデル, システムプロンプト, メッセージ, 生成パラメータ) のハッシュをキーとし、
+    TTLを過ぎた応答は使わない。件数が上限を超えると最も長く使われていない応答から削除する。
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # キー -> (有効期限, 応答)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            llm_cache_lookups.inc(result="miss")
+            return None
+        self._entries.move_to_end(key)
+        llm_cache_lookups.inc(result="hit")
+        return entry[1]
+    
+    def put(self, key: str, response: str):
+        if self.max_entries <= 0 or not response:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# シングルトンインスタンス
+llm_response_cache = LLMResponseCache(settings.llm_cache_max_entries, settings.llm_cache_ttl_seconds)
+
+def _collect_llm_cache_metrics():
+    llm_cache_entries.set(len(llm_response_cache))
+
+registry.add_collector(_collect_llm_cache_metrics)
@@ -1,124 +1,625 @@
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
-from typing import Dict, List, Optional
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
 import logging
+import time
 from config.settings import settings
+from services.admission import BULK, SessionGate, stage_limiters
+from services.errors import ServiceBusyError
+from services.llm_cache import llm_response_cache
+from services.metrics import observe_stage, stage_timer
+from services.provider_clients import provider_clients, with_retries
+from services.provider_router import provider_routers
+from services.session_store import create_session_store
+from services.single_flight import SingleFlight, content_key
+from services.token_budget import estimate_tokens, message_tokens, trim_to_budget
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SYSTEM_PROMPT = "You are a helpful voice assistant. Keep your responses concise and conversational."
+
+# 応答の生成パラメータ
+CHAT_TEMPERATURE = 0.7
+CHAT_MAX_TOKENS = 500
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a voice assistant. "
+    "Update the existing summary with the new messages. Keep facts, names, decisions and user "
+    "preferences, drop small talk, and answer with the updated summary only."
+)
+
 class LLMService:
     def __init__(self):
         self.provider = settings.llm_provider
-        self.sessions: Dict[str, List[Dict[str, str]]] = {}
+        self.session_store = create_session_store()
+        self._chat_flight = SingleFlight("chat")
+        # 同じセッションのリクエストを順番に処理し、会話履歴の読み書きが交錯しないようにする
+        self.session_gate = SessionGate(settings.session_max_pending)
+        # 応答を返した後に実行中の要約の更新
+        self._summary_tasks: Set[asyncio.Task] = set()
         
-        # OpenAI クライアントの初期化
-        if self.provider == "openai":
-            self.api_key_exists = bool(settings.openai_api_key)
-            if self.api_key_exists:
-                self.openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
-            else:
-                self.openai_client = None
+        self.api_key_exists = _api_key_exists(self.provider)
+    
+    @property
+    def openai_client(self):
+        # OpenAI クライアント（共有のコネクションプールを使用）
+        return provider_clients.openai
+    
+    @property
+    def claude_client(self):
+        # Claude クライアント（共有のコネクションプールを使用）
+        return provider_clients.anthropic
+    
+    def _fallback_response(self, message: str) -> str:
+        """APIキーがない場合の定型文を返す"""
+        # ローカルTTSのテストメッセージの場合
+        if message == "ローカルTTSのテストメッセージ":
+            from datetime import datetime
+            import pytz
+            
+            # 日本時間を取得
+            japan_tz = pytz.timezone('Asia/Tokyo')
+            now = datetime.now(japan_tz)
+            
+            # 時刻を日本語形式でフォーマット
+            hour = now.hour
+            minute = now.minute
+            
+            # 午前/午後の判定
+            period = "午前" if hour < 12 else "午後"
+            display_hour = hour if hour <= 12 else hour - 12
+            if display_hour == 0:
+                display_hour = 12
+            
+            time_str = f"{period}{display_hour}時{minute}分"
+            
+            return f"こんにちは、ローカルTTSです。現在の時刻は{time_str}です。"
         
-        # Claude クライアントの初期化
-        elif self.provider == "claude":
-            self.api_key_exists = bool(settings.anthropic_api_key)
-            if self.api_key_exists:
-                self.claude_client = AsyncAnthropic(api_key=settings.anthropic_api_key)
-            else:
-                self.claude_client = None
+        provider_name = "OpenAI" if self.provider == "openai" else "Anthropic"
+        return f"APIキーがセットされていません。環境変数に{provider_name} APIキーを設定してください。"
+    
+    def _chat_providers(self) -> List[str]:
+        """応答の生成に使うプロバイダー（先頭が優先、副プロバイダーはAPIキーがある場合のみ）"""
+        providers = [self.provider]
+        secondary = settings.llm_secondary_provider
+        if secondary and secondary != self.provider and _api_key_exists(secondary):
+            providers.append(secondary)
+        return providers
+    
+    def _chat_model(self) -> str:
+        return settings.openai_chat_model if self.provider == "openai" else settings.claude_model
+    
+    def _history_token_budget(self) -> int:
+        """現在のモデルで会話履歴に使えるトークン数"""
+        return settings.history_token_budgets.get(self._chat_model(), settings.history_token_budget)
+    
+    async def _load_session(self, session_id: Optional[str]) -> Dict[str, Any]:
+        """セッションストアから会話履歴と要約を読み込む"""
+        session = await self.session_store.get(session_id) if session_id else None
+        return {
+            "messages": session.get("messages", []) if session else [],
+            "summary": session.get("summary", "") if session else ""
+        }
+    
+    def _system_prompt_with_summary(self, system_prompt: str, summary: str) -> str:
+        """要約がある場合はシステムプロンプトに付け加える"""
+        if not summary:
+            return system_prompt
+        return f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+    
+    def _estimate_usage(self, system_prompt: str, history: List[Dict[str, str]], message: str) -> Dict[str, Any]:
+        """送信するプロンプトのトークン数を見積もる"""
+        model = self._chat_model()
+        system_tokens = estimate_tokens(system_prompt, model)
+        history_tokens = sum(message_tokens(msg, model) for msg in history)
+        user_tokens = message_tokens({"role": "user", "content": message}, model)
+        return {
+            "promptTokens": None,
+            "estimatedPromptTokens": system_tokens + history_tokens + user_tokens,
+            "historyTokens": history_tokens
+        }
+    
+    def _build_openai_messages(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        system_prompt: str
+    ) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(history)
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def _build_claude_messages(
+        self,
+        message: str,
+        history: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        # Claudeのメッセージ形式に変換
+        claude_messages = []
+        
+        for msg in history:
+            claude_messages.append({
+                "role": msg["role"] if msg["role"] != "system" else "user",
+                "content": msg["content"]
+            })
+        
+        claude_messages.append({"role": "user", "content": message})
+        return claude_messages
+    
+    def _claude_request_options(
+        self,
+        system_prompt: str,
+        claude_messages: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Claudeのリクエストの system と messages（プロンプトキャッシュの指定を含む）
+        
+        毎回同じになるシステムプロンプトと、最新の発話より前の会話履歴までを
+        キャッシュの区切りとして指定し、次のターンではその部分の処理を省けるようにする。
+        """
+        if not settings.claude_prompt_caching:
+            return {"system": system_prompt, "messages": claude_messages}
+        
+        cache_control = {"type": "ephemeral"}
+        messages = list(claude_messages)
+        if len(messages) > 1:
+            last_history = messages[-2]
+            messages[-2] = {
+                "role": last_history["role"],
+                "content": [{"type": "text", "text": last_history["content"], "cache_control": cache_control}]
+            }
+        options = {
+            "system": [{"type": "text", "text": system_prompt, "cache_control": cache_control}],
+            "messages": messages
+        }
+        if settings.claude_prompt_caching_beta:
+            options["extra_headers"] = {"anthropic-beta": settings.claude_prompt_caching_beta}
+        return options
+    
+    def _response_cache_key(
+        self,
+        system_prompt: str,
+        session: Dict[str, Any],
+        message: str
+    ) -> Optional[str]:
+        """応答キャッシュのキー（会話履歴があり、応答が文脈に依存する場合はNone）"""
+        if not settings.llm_cache_enabled or session["messages"] or session["summary"]:
+            return None
+        return content_key(
+            "response",
+            self.provider,
+            self._chat_model(),
+            system_prompt,
+            message,
+            CHAT_TEMPERATURE,
+            CHAT_MAX_TOKENS
+        )
+    
+    async def _record_turn(
+        self,
+        session_id: Optional[str],
+        session: Dict[str, Any],
+        message: str,
+        assistant_message: str,
+        usage: Dict[str, Any]
+    ) -> List[Dict[str, str]]:
+        """
+        会話履歴にユーザー発話と応答を追加してセッションストアに保存
+        
+        トークン予算を超えた古い発話は履歴から外して返す（_fold_summary で要約に畳み込む）。
+        """
+        if not session_id:
+            return []
+        
+        messages = session["messages"] + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": assistant_message}
+        ]
+        messages, dropped = trim_to_budget(
+            messages,
+            self._history_token_budget(),
+            self._chat_model(),
+            settings.session_max_messages
+        )
+        
+        logger.info(
+            f"Session {session_id}: prompt tokens={usage['promptTokens']} "
+            f"(estimated {usage['estimatedPromptTokens']}), "
+            f"history messages={len(messages)}, folded into summary={len(dropped)}"
+        )
+        await self.session_store.set(session_id, {
+            "messages": messages,
+            "summary": session["summary"],
+            "usage": usage
+        })
+        return dropped
+    
+    async def _finish_turn(
+        self,
+        session_id: Optional[str],
+        dropped: List[Dict[str, str]],
+        hold: AsyncExitStack
+    ):
+        """
+        応答を返した後、切り捨てた発話を要約に畳み込んでからセッションを解放する
+        
+        要約の更新はLLMの呼び出しを待つため裏で実行し、次のターンは
+        セッションの保持（hold）が解放されるまで待って更新後の要約を使う。
+        """
+        if not dropped:
+            await hold.aclose()
+            return
+        
+        task = asyncio.create_task(self._fold_summary(session_id, dropped, hold))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+    
+    async def _fold_summary(
+        self,
+        session_id: str,
+        dropped: List[Dict[str, str]],
+        hold: AsyncExitStack
+    ):
+        """切り捨てた発話をこれまでの要約に追加して保存し、セッションを解放する"""
+        async with hold:
+            try:
+                session = await self.session_store.get(session_id)
+                # 応答を返した後にセッションが削除された場合は保存しない
+                if session is None:
+                    return
+                summary = await self._update_summary(session.get("summary", ""), dropped)
+                if summary != session.get("summary", ""):
+                    session["summary"] = summary
+                    await self.session_store.set(session_id, session)
+            except Exception as e:
+                logger.warning(f"Failed to save conversation summary: {str(e)}")
+    
+    async def _update_summary(self, summary: str, dropped: List[Dict[str, str]]) -> str:
+        """これまでの要約に切り捨てた発話だけを追加して要約を更新"""
+        if not settings.history_summary_enabled or not self.api_key_exists:
+            return summary
+        
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in dropped)
+        prompt = f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+        
+        try:
+            # 要約の更新は応答を返した後に裏で行うため、応答の生成より低い優先度でLLMの枠を使う
+            async with stage_limiters["llm"].slot(BULK):
+                if self.provider == "openai":
+                    response = await with_retries("chat", lambda timeout: self.openai_client.chat.completions.create(
+                        model=settings.openai_chat_model,
+                        messages=[
+                            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0,
+                        max_tokens=settings.history_summary_max_tokens,
+                        timeout=timeout
+                    ))
+                    return response.choices[0].message.content.strip()
+                
+                response = await with_retries("chat", lambda timeout: self.claude_client.messages.create(
+                    model=settings.claude_model,
+                    system=SUMMARY_SYSTEM_PROMPT,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                    max_tokens=settings.history_summary_max_tokens,
+                    timeout=timeout
+                ))
+                return response.content[0].text.strip()
+        
+        except Exception as e:
+            # 要約に失敗しても会話は継続する（古い発話は要約されずに失われる）
+            logger.warning(f"Failed to update conversation summary: {str(e)}")
+            return summary
+    
+    async def get_session_usage(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """直近のターンのプロンプトのトークン数を返す"""
+        session = await self.session_store.get(session_id)
+        return session.get("usage") if session else None
     
     async def get_chat_response(
         self, 
         message: str, 
         session_id: Optional[str] = None,
-        system_prompt: str = "You are a helpful voice assistant. Keep your responses concise and conversational."
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT
     ) -> str:
         # APIキーがない場合は定型文を返す
         if not self.api_key_exists:
-            # ローカルTTSのテストメッセージの場合
-            if message == "ローカルTTSのテストメッセージ":
-                from datetime import datetime
-                import pytz
-                
-                # 日本時間を取得
-                japan_tz = pytz.timezone('Asia/Tokyo')
-                now = datetime.now(japan_tz)
-                
-                # 時刻を日本語形式でフォーマット
-                hour = now.hour
-                minute = now.minute
-                
-                # 午前/午後の判定
-                period = "午前" if hour < 12 else "午後"
-                display_hour = hour if hour <= 12 else hour - 12
-                if display_hour == 0:
-                    display_hour = 12
-                
-                time_str = f"{period}{display_hour}時{minute}分"
-                
-                return f"こんにちは、ローカルTTSです。現在の時刻は{time_str}です。"
-            
-            provider_name = "OpenAI" if self.provider == "openai" else "Anthropic"
-            return f"APIキーがセットされていません。環境変数に{provider_name} APIキーを設定してください。"
+            return self._fallback_response(message)
         
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(self._hold_session(session_id))
+            assistant_message, dropped = await self._get_chat_response(message, session_id, system_prompt)
+            # 要約の更新が終わるまでセッションの保持を引き継ぐ
+            await self._finish_turn(session_id, dropped, stack.pop_all())
+            return assistant_message
+    
+    async def _get_chat_response(
+        self,
+        message: str,
+        session_id: Optional[str],
+        system_prompt: str
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """(応答, 会話履歴から切り捨てた発話) を返す"""
         try:
-            if self.provider == "openai":
-                messages = [{"role": "system", "content": system_prompt}]
-                
-                if session_id and session_id in self.sessions:
-                    messages.extend(self.sessions[session_id])
-                
-                messages.append({"role": "user", "content": message})
-                
-                response = await self.openai_client.chat.completions.create(
-                    model=settings.openai_chat_model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500
-                )
-                
-                assistant_message = response.choices[0].message.content
+            session = await self._load_session(session_id)
+            history = session["messages"]
+            system_prompt = self._system_prompt_with_summary(system_prompt, session["summary"])
+            usage = self._estimate_usage(system_prompt, history, message)
             
-            elif self.provider == "claude":
-                # Claudeのメッセージ形式に変換
-                claude_messages = []
-                
-                if session_id and session_id in self.sessions:
-                    for msg in self.sessions[session_id]:
-                        claude_messages.append({
-                            "role": msg["role"] if msg["role"] != "system" else "user",
-                            "content": msg["content"]
-                        })
-                
-                claude_messages.append({"role": "user", "content": message})
-                
-                response = await self.claude_client.messages.create(
-                    model=settings.claude_model,
-                    system=system_prompt,
-                    messages=claude_messages,
-                    temperature=0.7,
-                    max_tokens=500
-                )
-                
-                assistant_message = response.content[0].text
+            cache_key = self._response_cache_key(system_prompt, session, message)
+            cached = llm_response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                assistant_message = cached
+                usage["cachedResponse"] = True
+                observe_stage("llm_total", "cache", 0.0)
+            else:
+                # 同じプロンプト（システムプロンプト・履歴・メッセージ）の同時リクエストは1回の呼び出しを共有する
+                key = content_key(self.provider, self._chat_model(), system_prompt, history, message)
+                with stage_timer("llm_total", self.provider):
+                    assistant_message, token_usage = await self._chat_flight.do(
+                        key,
+                        lambda: stage_limiters["llm"].run(
+                            lambda: self._create_chat_completion(message, history, system_prompt)
+                        )
+                    )
+                usage.update(token_usage)
+                if cache_key:
+                    llm_response_cache.put(cache_key, assistant_message)
             
-            if session_id:
-                if session_id not in self.sessions:
-                    self.sessions[session_id] = []
-                self.sessions[session_id].append({"role": "user", "content": message})
-                self.sessions[session_id].append({"role": "assistant", "content": assistant_message})
-                
-                if len(self.sessions[session_id]) > 20:
-                    self.sessions[session_id] = self.sessions[session_id][-20:]
+            dropped = await self._record_turn(session_id, session, message, assistant_message, usage)
             
-            return assistant_message
+            return assistant_message, dropped
             
+        except ServiceBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error getting chat response: {str(e)}")
             raise Exception(f"Failed to get LLM response: {str(e)}")
     
-    def clear_session(self, session_id: str):
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+    async def _create_chat_completion(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        system_prompt: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        プロバイダーに応答の生成を依頼し、(応答, 実際のトークン数の情報) を返す
+        
+        副プロバイダーがある場合は、優先のプロバイダーが遅い・失敗した場合にそちらにも送り、
+        先に返った応答を使う。
+        """
+        calls = {
+            provider: lambda provider=provider: self._complete(provider, message, history, system_prompt)
+            for provider in self._chat_providers()
+        }
+        result, _ = await provider_routers["llm"].run(calls)
+        return result
+    
+    async def _complete(
+        self,
+        provider: str,
+        message: str,
+        history: List[Dict[str, str]],
+        system_prompt: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        if provider == "openai":
+            messages = self._build_openai_messages(message, history, system_prompt)
+            
+            response = await with_retries("chat", lambda timeout: self.openai_client.chat.completions.create(
+                model=settings.openai_chat_model,
+                messages=messages,
+                temperature=CHAT_TEMPERATURE,
+                max_tokens=CHAT_MAX_TOKENS,
+                timeout=timeout
+            ))
+            return response.choices[0].message.content, _openai_token_usage(response.usage)
+        
+        claude_messages = self._build_claude_messages(message, history)
+        
+        response = await with_retries("chat", lambda timeout: self.claude_client.messages.create(
+            model=settings.claude_model,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS,
+            timeout=timeout,
+            **self._claude_request_options(system_prompt, claude_messages)
+        ))
+        return response.content[0].text, _claude_token_usage(response.usage)
+    
+    async def stream_chat_response(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT
+    ) -> AsyncIterator[str]:
+        """LLMの応答をトークン（差分テキスト）単位で順次返す
+        
+        全文の生成が完了した時点で会話履歴に記録し、要約の更新は応答を返した後に行う。
+        """
+        # APIキーがない場合は定型文を一度に返す
+        if not self.api_key_exists:
+            yield self._fallback_response(message)
+            return
+        
+        # ストリームの終了（会話履歴への記録と要約の更新）までセッションを保持する
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(self._hold_session(session_id))
+            dropped: List[Dict[str, str]] = []
+            async for delta in self._stream_chat_response(message, session_id, system_prompt, dropped):
+                yield delta
+            await self._finish_turn(session_id, dropped, stack.pop_all())
+    
+    @asynccontextmanager
+    async def _hold_session(self, session_id: Optional[str]) -> AsyncIterator[None]:
+        """同じセッションのターンを1つずつ処理する（プロセス内は SessionGate、ワーカー間はストアのリース）"""
+        async with self.session_gate.hold(session_id), self.session_store.lease(session_id):
+            yield
+    
+    async def _stream_chat_response(
+        self,
+        message: str,
+        session_id: Optional[str],
+        system_prompt: str,
+        dropped: List[Dict[str, str]]
+    ) -> AsyncIterator[str]:
+        """応答の差分を順次返す（会話履歴から切り捨てた発話は dropped に追加する）"""
+        chunks: List[str] = []
+        provider = self.provider
+        start = time.perf_counter()
+        try:
+            session = await self._load_session(session_id)
+            history = session["messages"]
+            system_prompt = self._system_prompt_with_summary(system_prompt, session["summary"])
+            usage = self._estimate_usage(system_prompt, history, message)
+            cache_key = self._response_cache_key(system_prompt, session, message)
+            cached = llm_response_cache.get(cache_key) if cache_key else None
+            
+            if cached is not None:
+                # キャッシュした応答は一度に返す
+                observe_stage("llm_ttft", "cache", time.perf_counter() - start)
+                usage["cachedResponse"] = True
+                chunks.append(cached)
+                yield cached
+            
+            else:
+                # ストリームの受信が終わるまでLLMの枠を保持する（要約の更新の前に解放する）
+                async with stage_limiters["llm"].slot():
+                    # 最初のトークンが先に届いたプロバイダーの応答を使う（遅い場合は副プロバイダーにも送る）
+                    calls = {
+                        provider: lambda provider=provider: _first_delta(
+                            self._stream_from(provider, message, history, system_prompt, usage)
+                        )
+                        for provider in self._chat_providers()
+                    }
+                    (first, stream), provider = await provider_routers["llm_ttft"].run(calls, discard=_close_stream)
+                    observe_stage("llm_ttft", provider, time.perf_counter() - start)
+                    try:
+                        if first:
+                            chunks.append(first)
+                            yield first
+                        async for delta in stream:
+                            chunks.append(delta)
+                            yield delta
+                    finally:
+                        await stream.aclose()
+            
+        except ServiceBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            raise Exception(f"Failed to get LLM response: {str(e)}")
+        
+        assistant_message = "".join(chunks)
+        observe_stage("llm_total", "cache" if cached else provider, time.perf_counter() - start)
+        if cache_key and not cached:
+            llm_response_cache.put(cache_key, assistant_message)
+        dropped.extend(await self._record_turn(session_id, session, message, assistant_message, usage))
+    
+    async def _stream_from(
+        self,
+        provider: str,
+        message: str,
+        history: List[Dict[str, str]],
+        system_prompt: str,
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """1つのプロバイダーから応答の差分を順次受け取る（Claudeの場合は最後に usage を更新する）"""
+        if provider == "openai":
+            messages = self._build_openai_messages(message, history, system_prompt)
+            
+            # ストリームの開始（レスポンスヘッダーの受信）までをリトライの対象とする
+            stream = await with_retries("chat", lambda timeout: self.openai_client.chat.completions.create(
+                model=settings.openai_chat_model,
+                messages=messages,
+                temperature=CHAT_TEMPERATURE,
+                max_tokens=CHAT_MAX_TOKENS,
+                stream=True,
+                timeout=timeout
+            ))
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+            return
+        
+        claude_messages = self._build_claude_messages(message, history)
+        
+        # OpenAIと同じく、ストリームの開始（レスポンスヘッダーの受信）までをリトライの対象とする
+        stream = await with_retries("chat", lambda timeout: self.claude_client.messages.create(
+            model=settings.claude_model,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS,
+            stream=True,
+            timeout=timeout,
+            **self._claude_request_options(system_prompt, claude_messages)
+        ))
+        
+        try:
+            async for event in stream:
+                if event.type == "message_start":
+                    # プロンプトのトークン数は最初のイベントで届く
+                    usage.update(_claude_token_usage(event.message.usage))
+                elif event.type == "content_block_delta":
+                    delta = getattr(event.delta, "text", None)
+                    if delta:
+                        yield delta
+        finally:
+            await stream.close()
+    
+    async def clear_session(self, session_id: str) -> bool:
+        """セッションの会話履歴を削除（存在した場合はTrue）"""
+        return await self.session_store.delete(session_id)
+    
+    async def close(self):
+        """実行中の要約の更新を待ってからセッションストアを閉じる"""
+        if self._summary_tasks:
+            await asyncio.gather(*self._summary_tasks, return_exceptions=True)
+        await self.session_store.close()
+
+def _api_key_exists(provider: str) -> bool:
+    if provider == "openai":
+        return bool(settings.openai_api_key)
+    return bool(settings.anthropic_api_key)
+
+async def _first_delta(stream: AsyncIterator[str]) -> Tuple[str, AsyncIterator[str]]:
+    """ストリームの最初の差分が届くまで待ち、(最初の差分, 残りのストリーム) を返す"""
+    try:
+        return await stream.__anext__(), stream
+    except StopAsyncIteration:
+        return "", stream
+
+async def _close_stream(result: Tuple[str, AsyncIterator[str]]):
+    """使わなかったストリームを閉じる（接続を切断する）"""
+    await result[1].aclose()
+
+def _openai_token_usage(usage) -> Dict[str, Any]:
+    """OpenAIの usage からプロンプトのトークン数（自動キャッシュされた分を含む）を取得"""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached_tokens = details.get("cached_tokens")
+    else:
+        cached_tokens = getattr(details, "cached_tokens", None)
+    return {"promptTokens": usage.prompt_tokens, "cachedPromptTokens": cached_tokens}
+
+def _claude_token_usage(usage) -> Dict[str, Any]:
+    """
+    Claudeの usage からプロンプトのトークン数を取得
+    
+    input_tokens にはキャッシュから読み込んだ分と書き込んだ分が含まれないため、合計して返す。
+    """
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return {
+        "promptTokens": usage.input_tokens + cache_read + cache_write,
+        "cachedPromptTokens": cache_read,
+        "cacheWritePromptTokens": cache_write
+    }
 
 llm_service = LLMService()
\ No newline at end of file
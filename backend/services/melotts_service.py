@@ -1,68 +1,261 @@
+import asyncio
 import base64
+import os
 import struct
 import logging
-from typing import Tuple
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import AsyncIterator, Optional, Tuple
+import numpy as np
 from config.settings import settings
+from services.errors import ServiceBusyError
+from services.sentence_splitter import split_sentences
 
 logger = logging.getLogger(__name__)
 
+# テスト用のビープ音のパラメータ
+SAMPLE_RATE = 22050
+BEEP_DURATION = 0.5  # 0.5秒（速度1.0の場合）
+BEEP_FREQUENCY = 440  # A4音（ラ）
+BEEP_AMPLITUDE = 0.3
+
+# ストリーミング時に1回で送るPCMのサンプル数（約0.1秒）
+STREAM_CHUNK_SAMPLES = 2205
+# 長さが未確定のWAVをストリーミングする際にヘッダーに書くデータサイズ（最大値）
+UNKNOWN_DATA_SIZE = 0xFFFFFFFF - 36
+
+def wav_header(num_samples: Optional[int], sample_rate: int = SAMPLE_RATE) -> bytes:
+    """16bit PCM・モノラルのWAVヘッダー（44バイト）を作成（num_samples がNoneの場合は長さ未確定）"""
+    data_size = UNKNOWN_DATA_SIZE if num_samples is None else num_samples * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size,  # ファイルサイズ
+        b'WAVE',
+        b'fmt ', 16,  # fmt チャンクサイズ
+        1,  # PCM
+        1,  # モノラル
+        sample_rate,  # サンプルレート
+        sample_rate * 2,  # バイトレート
+        2,  # ブロックアライン
+        16,  # ビット深度
+        b'data', data_size  # データサイズ
+    )
+
+@lru_cache(maxsize=32)
+def _sine_pcm(duration: float, frequency: float, sample_rate: int) -> bytes:
+    """サイン波の16bit PCMを生成（同じパラメータの波形は再利用する）"""
+    num_samples = int(sample_rate * duration)
+    t = np.arange(num_samples, dtype=np.float64) / sample_rate
+    samples = 32767 * BEEP_AMPLITUDE * np.sin(2 * np.pi * frequency * t)
+    return samples.astype('<i2').tobytes()
+
+@lru_cache(maxsize=32)
+def _simple_wav(duration: float, frequency: float, sample_rate: int) -> bytes:
+    """ヘッダーとPCMを連結したWAVを生成（同じパラメータのWAVは再利用する）"""
+    pcm = _sine_pcm(duration, frequency, sample_rate)
+    return wav_header(len(pcm) // 2, sample_rate) + pcm
+
+# ワーカープロセス内で保持するMeloTTSのモデルと話者ID
+_worker_model = None
+_worker_speaker_id = None
+
+def _init_worker(language: str, device: str, threads: int):
+    """ワーカープロセスの起動時にMeloTTSのモデルを1回だけロードする"""
+    global _worker_model, _worker_speaker_id
+    import torch
+    from melo.api import TTS
+    
+    if threads > 0:
+        torch.set_num_threads(threads)
+    _worker_model = TTS(language=language, device=device)
+    speaker_ids = _worker_model.hps.data.spk2id
+    _worker_speaker_id = speaker_ids[language] if language in speaker_ids else next(iter(speaker_ids.values()))
+
+def _synthesize_in_worker(text: str, speed: float) -> Tuple[bytes, int]:
+    """1文を合成し、16bit PCMとサンプルレートを返す（ワーカープロセスで実行）"""
+    audio = _worker_model.tts_to_file(text, _worker_speaker_id, None, speed=speed, quiet=True)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+    return pcm, _worker_model.hps.data.sampling_rate
+
 class MeloTTSService:
+    """
+    MeloTTSによるローカル音声合成
+    
+    モデルはプロセスプールの各ワーカーで1回だけロードし、文単位に分割した合成を
+    複数のワーカーで並列に実行する。MeloTTSがインストールされていない場合や
+    ワーカーの起動に失敗した場合は、テスト用のビープ音を返す。
+    """
+    
     def __init__(self):
         self.language = settings.melotts_language
+        self.available = find_spec("melo") is not None
+        if not self.available:
+            logger.warning("MeloTTS is not installed, falling back to a test beep")
         
-    def _create_simple_wav(self, text: str) -> bytes:
+        self._pool: Optional[Executor] = None
+        # 実行中 + 待機中のリクエスト数（上限を超えたら503で押し返す）
+        self._pending = 0
+        self._max_pending = settings.melotts_workers + settings.melotts_queue_size
+    
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None and _worker_model is not None:
+            # このプロセスにロード済み（preload）の場合は、同じモデルをスレッドで使う
+            self._pool = ThreadPoolExecutor(
+                max_workers=settings.melotts_workers,
+                thread_name_prefix="melotts"
+            )
+        if self._pool is None:
+            workers = settings.melotts_workers
+            threads = settings.melotts_threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+            # CUDAやtorchのスレッドを引き継がないよう、forkではなくspawnで起動する
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.language, settings.melotts_device, threads)
+            )
+        return self._pool
+    
+    def _beep_parameters(self, text: str, speed: float) -> Tuple[float, float, int]:
+        """テキストと速度から波形のパラメータ（長さ, 周波数, サンプルレート）を決める"""
+        # 現在のビープ音はテキストに依存せず、速度に応じて長さだけが変わる
+        return round(BEEP_DURATION / max(speed, 0.25), 3), BEEP_FREQUENCY, SAMPLE_RATE
+    
+    def _create_simple_wav(self, text: str, speed: float = 1.0) -> bytes:
         """簡単なWAVファイルを生成（テスト用）"""
-        # 簡単なテスト音声として、ビープ音を生成
-        sample_rate = 22050
-        duration = 0.5  # 0.5秒
-        frequency = 440  # A4音（ラ）
-        
-        num_samples = int(sample_rate * duration)
-        
-        # サイン波を生成
-        import math
-        samples = []
-        for i in range(num_samples):
-            t = i / sample_rate
-            sample = int(32767 * 0.3 * math.sin(2 * math.pi * frequency * t))
-            samples.append(sample)
-        
-        # WAVファイルのヘッダー
-        wav_data = b'RIFF'
-        wav_data += struct.pack('<I', 36 + num_samples * 2)  # ファイルサイズ
-        wav_data += b'WAVE'
-        wav_data += b'fmt '
-        wav_data += struct.pack('<I', 16)  # fmt チャンクサイズ
-        wav_data += struct.pack('<H', 1)   # PCM
-        wav_data += struct.pack('<H', 1)   # モノラル
-        wav_data += struct.pack('<I', sample_rate)  # サンプルレート
-        wav_data += struct.pack('<I', sample_rate * 2)  # バイトレート
-        wav_data += struct.pack('<H', 2)   # ブロックアライン
-        wav_data += struct.pack('<H', 16)  # ビット深度
-        wav_data += b'data'
-        wav_data += struct.pack('<I', num_samples * 2)  # データサイズ
-        
-        # 音声データを追加
-        for sample in samples:
-            wav_data += struct.pack('<h', sample)
-        
-        return wav_data
+        return _simple_wav(*self._beep_parameters(text, speed))
     
     async def text_to_speech(
         self,
         text: str,
         speed: float = 1.0
     ) -> Tuple[str, str]:
-        """テキストを音声に変換"""
-        logger.info(f"MeloTTS text_to_speech called with text: {text}")
+        """テキストを音声に変換し、Base64エンコードして返す"""
+        wav_data, audio_format = await self.synthesize(text, speed)
+        return base64.b64encode(wav_data).decode('utf-8'), audio_format
+    
+    async def synthesize(
+        self,
+        text: str,
+        speed: float = 1.0
+    ) -> Tuple[bytes, str]:
+        """テキストを音声データ（バイナリ）に変換"""
+        logger.info(f"MeloTTS synthesize called with text: {text}")
+        
+        if self.available:
+            pcm_chunks, sample_rate = [], SAMPLE_RATE
+            async for pcm, sample_rate in self._synthesize_sentences(text, speed):
+                pcm_chunks.append(pcm)
+            if pcm_chunks:
+                pcm = b"".join(pcm_chunks)
+                return wav_header(len(pcm) // 2, sample_rate) + pcm, "wav"
         
         # MeloTTSが利用できない場合は、簡単なビープ音を返す
         # （実際の音声合成はWeb Speech APIで行う）
-        wav_data = self._create_simple_wav(text)
-        audio_base64 = base64.b64encode(wav_data).decode('utf-8')
+        wav_data = self._create_simple_wav(text, speed)
         
         logger.info(f"Generated simple WAV audio: {len(wav_data)} bytes")
-        return audio_base64, "wav"
+        return wav_data, "wav"
+    
+    async def stream_synthesize(
+        self,
+        text: str,
+        speed: float = 1.0
+    ) -> AsyncIterator[bytes]:
+        """
+        テキストを音声に変換し、WAVをヘッダー → PCMのチャンクの順に返す
+        
+        ビープ音の場合はヘッダーに全体の長さを書き込む。MeloTTSの場合は長さ未確定の
+        ヘッダーを先に返し、文ごとの音声を合成できた順（文の順番どおり）に返す。
+        """
+        if self.available:
+            header_sent = False
+            async for pcm, sample_rate in self._synthesize_sentences(text, speed):
+                if not header_sent:
+                    yield wav_header(None, sample_rate)
+                    header_sent = True
+                yield pcm
+            if header_sent:
+                return
+        
+        duration, frequency, sample_rate = self._beep_parameters(text, speed)
+        pcm = _sine_pcm(duration, frequency, sample_rate)
+        
+        yield wav_header(len(pcm) // 2, sample_rate)
+        view = memoryview(pcm)
+        chunk_bytes = STREAM_CHUNK_SAMPLES * 2
+        for offset in range(0, len(pcm), chunk_bytes):
+            yield bytes(view[offset:offset + chunk_bytes])
+    
+    async def _synthesize_sentences(self, text: str, speed: float) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        文単位で並列に合成し、(PCM, サンプルレート) を文の順番どおりに返す
+        
+        ワーカーの起動に失敗した場合は以降MeloTTSを使わず、何も返さない（呼び出し元でビープ音にする）。
+        """
+        sentences = split_sentences(text) or [text]
+        if self._pending >= self._max_pending:
+            raise ServiceBusyError(
+                "Local speech synthesis is busy",
+                retry_after=settings.melotts_retry_after_seconds
+            )
+        
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, settings.melotts_max_parallel_sentences))
+        
+        async def synthesize_sentence(sentence: str) -> Tuple[bytes, int]:
+            async with semaphore:
+                return await loop.run_in_executor(self.pool, _synthesize_in_worker, sentence, speed)
+        
+        tasks = [asyncio.create_task(synthesize_sentence(sentence)) for sentence in sentences]
+        try:
+            for task in tasks:
+                yield await task
+        except BrokenProcessPool as e:
+            logger.error(f"MeloTTS worker failed, falling back to a test beep: {str(e)}")
+            self.available = False
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._pending -= 1
+    
+    async def warm_up(self):
+        """各ワーカーを起動してモデルをロードし、短い文を1回合成して初回リクエストの遅延をなくす"""
+        if not self.available:
+            return
+        loop = asyncio.get_running_loop()
+        warmup_text = {"EN": "Hello.", "JP": "こんにちは。", "ZH": "你好。"}[self.language]
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(self.pool, _synthesize_in_worker, warmup_text, 1.0)
+                for _ in range(settings.melotts_workers)
+            ))
+            logger.info(f"MeloTTS warmed up: {settings.melotts_workers} worker(s)")
+        except BrokenProcessPool as e:
+            logger.error(f"MeloTTS worker failed to start, falling back to a test beep: {str(e)}")
+            self.available = False
+    
+    def preload(self, threads: int = 0):
+        """
+        モデルをこのプロセスに直接ロードする
+        
+        serve.py がワーカープロセスを fork する前に呼び出す。以降の合成はプロセスプールではなく
+        スレッドで実行し、fork したワーカーはロード済みの重みをコピーオンライトで共有する。
+        """
+        if self.available:
+            _init_worker(self.language, settings.melotts_device, threads)
+            logger.info("MeloTTS model preloaded")
+    
+    def shutdown(self):
+        """ワーカープロセス（またはスレッド）を停止"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
 
 # シングルトンインスタンス
 melotts_service = MeloTTSService()
\ No newline at end of file
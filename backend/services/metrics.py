@@ -0,0 +1,230 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 処理時間（秒）のバケット
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# ペイロードサイズ（バイト）のバケット
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# リクエストごとの Server-Timing 用の計測結果: [(名前, ミリ秒)]
+_server_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("server_timings", default=None)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric(ABC):
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+    
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """現在の値をPrometheusのテキスト形式の行で返す（ロックを取得した状態で呼び出される）"""
+
+class _ValueMetric(_Metric):
+    """ラベルごとに1つの値を持つメトリクス"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def _set(self, value: float, labels: Dict[str, str]):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+class Counter(_ValueMetric):
+    """単調に増加する累計値（Prometheusの命名規則に従い、名前に _total を付けて出力する）"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        if not name.endswith("_total"):
+            name += "_total"
+        super().__init__(name, documentation, labelnames)
+    
+    def set_total(self, value: float, **labels: str):
+        """別に数えている累計値を反映する（収集時のコールバックから呼び出す）"""
+        self._set(value, labels)
+
+class Gauge(_ValueMetric):
+    kind = "gauge"
+    
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels: str):
+        self._set(value, labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # ラベルごとの [バケットごとの件数..., 合計, 件数]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """メトリクスを登録し、Prometheusのテキスト形式で出力する"""
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+    
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def add_collector(self, collector: Callable[[], None]):
+        """出力の直前に呼び出され、ゲージ等を最新の値に更新する関数を登録"""
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+stage_duration = registry.register(Histogram(
+    "voice_stage_duration_seconds",
+    "Time spent in each pipeline stage (decode, stt, llm_ttft, llm_total, tts, encode).",
+    ("stage", "provider")
+))
+stage_in_flight = registry.register(Gauge(
+    "voice_stage_in_flight",
+    "Pipeline stage operations currently running.",
+    ("stage", "provider")
+))
+payload_bytes = registry.register(Histogram(
+    "voice_payload_bytes",
+    "Size of audio payloads received and returned.",
+    ("direction", "kind"),
+    buckets=SIZE_BUCKETS
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being processed.",
+    ("handler",)
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response headers are sent.",
+    ("handler", "method", "status")
+))
+
+def start_request_timing() -> List[Tuple[str, float]]:
+    """現在のリクエストで Server-Timing の計測を開始"""
+    timings: List[Tuple[str, float]] = []
+    _server_timings.set(timings)
+    return timings
+
+def record_timing(name: str, seconds: float):
+    """現在のリクエストの Server-Timing に計測結果を追加"""
+    timings = _server_timings.get()
+    if timings is not None:
+        timings.append((name, seconds * 1000))
+
+def format_server_timing(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing ヘッダーの値を作成"""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings)
+
+def observe_stage(stage: str, provider: str, seconds: float):
+    """ステージの処理時間を記録"""
+    stage_duration.observe(seconds, stage=stage, provider=provider)
+    record_timing(stage, seconds)
+
+@contextmanager
+def stage_timer(stage: str, provider: str) -> Iterator[None]:
+    """
+    ステージの処理時間と実行中の数を記録するコンテキストマネージャ
+    
+    使用例:
+        with stage_timer("stt", "openai"):
+            text = await transcribe(...)
+    """
+    stage_in_flight.inc(stage=stage, provider=provider)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_in_flight.dec(stage=stage, provider=provider)
+        observe_stage(stage, provider, time.perf_counter() - start)
+
+def observe_payload(direction: str, kind: str, size: int):
+    """ペイロードサイズを記録（direction: in/out）"""
+    payload_bytes.observe(size, direction=direction, kind=kind)
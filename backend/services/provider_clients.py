@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, TypeVar
+import httpx
+from config.settings import settings
+
+# SDKのインポートは重いため、クライアントを初めて使う時点まで遅らせる
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 操作ごとの1回あたりのタイムアウト（秒）
+OPERATION_TIMEOUTS = {
+    "stt": lambda: settings.stt_timeout_seconds,
+    "chat": lambda: settings.chat_timeout_seconds,
+    "tts": lambda: settings.tts_timeout_seconds,
+}
+
+class ProviderClients:
+    """
+    OpenAI / Anthropic のクライアントをプロセス内で共有する
+    
+    1つのhttpxクライアント（コネクションプール）を両方のSDKで使い回し、
+    アプリケーションの終了時に lifespan から close() で閉じる。
+    SDK自身のリトライは無効にし、with_retries で期限付きのリトライを行う。
+    各SDKは対応するクライアントを初めて使う時点でインポートする。
+    """
+    
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._anthropic: Optional["AsyncAnthropic"] = None
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry_seconds
+                ),
+                timeout=httpx.Timeout(
+                    settings.chat_timeout_seconds,
+                    connect=settings.http_connect_timeout_seconds
+                )
+            )
+        return self._http_client
+    
+    @property
+    def openai(self) -> Optional["AsyncOpenAI"]:
+        """OpenAIクライアント（APIキーがない場合はNone）"""
+        if self._openai is None and settings.openai_api_key:
+            from openai import AsyncOpenAI
+            self._openai = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                http_client=self.http_client,
+                max_retries=0
+            )
+        return self._openai
+    
+    @property
+    def anthropic(self) -> Optional["AsyncAnthropic"]:
+        """Anthropicクライアント（APIキーがない場合はNone）"""
+        if self._anthropic is None and settings.anthropic_api_key:
+            from anthropic import AsyncAnthropic
+            self._anthropic = AsyncAnthropic(
+                api_key=settings.anthropic_api_key,
+                base_url=settings.anthropic_base_url,
+                http_client=self.http_client,
+                max_retries=0
+            )
+        return self._anthropic
+    
+    def import_sdks(self):
+        """APIキーが設定されているSDKをインポートしておく（ウォームアップ用、スレッドで実行する）"""
+        if settings.openai_api_key:
+            import openai  # noqa: F401
+        if settings.anthropic_api_key:
+            import anthropic  # noqa: F401
+    
+    async def close(self):
+        """コネクションプールを閉じる"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._openai = None
+        self._anthropic = None
+
+def _is_retryable(error: Exception) -> bool:
+    """タイムアウト・接続エラー・429・5xxをリトライ対象とする"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    if type(error).__name__ in ("APITimeoutError", "APIConnectionError"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code in (408, 409, 429) or (status_code is not None and status_code >= 500)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """エラーレスポンスの Retry-After ヘッダー（秒）を取得"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+async def with_retries(
+    operation: str,
+    call: Callable[[float], Awaitable[T]],
+    max_retries: Optional[int] = None
+) -> T:
+    """
+    プロバイダー呼び出しをタイムアウトとジッター付き指数バックオフで再試行
+    
+    Args:
+        operation: 操作の種類（stt, chat, tts）。1回あたりのタイムアウトを決める
+        call: 1回あたりのタイムアウト（秒）を受け取り、呼び出しを行う関数
+        max_retries: 最大リトライ回数（省略時は設定値）
+    
+    Returns:
+        呼び出しの結果
+    """
+    if max_retries is None:
+        max_retries = settings.provider_max_retries
+    timeout = OPERATION_TIMEOUTS[operation]()
+    deadline = time.monotonic() + settings.provider_deadline_seconds
+    
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        attempt_timeout = min(timeout, remaining)
+        try:
+            return await asyncio.wait_for(call(attempt_timeout), attempt_timeout)
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            
+            # フルジッターの指数バックオフ（Retry-After があればそれ以上待つ）
+            backoff = random.uniform(
+                0,
+                min(settings.provider_retry_max_backoff_seconds,
+                    settings.provider_retry_backoff_seconds * (2 ** attempt))
+            )
+            backoff = max(backoff, _retry_after(e) or 0)
+            if time.monotonic() + backoff >= deadline:
+                raise
+            
+            attempt += 1
+            logger.warning(
+                f"Retrying {operation} request ({attempt}/{max_retries}) in {backoff:.2f}s: {str(e)}"
+            )
+            await asyncio.sleep(backoff)
+
+# シングルトンインスタンス
+provider_clients = ProviderClients()
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+from config.settings import settings
+from services.errors import ServiceBusyError
+from services.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+provider_latency_ewma = registry.register(Gauge(
+    "provider_latency_ewma_seconds",
+    "Exponentially weighted moving average of each provider's latency.",
+    ("stage", "provider")
+))
+provider_latency_p95 = registry.register(Gauge(
+    "provider_latency_p95_seconds",
+    "95th percentile of each provider's recent latencies.",
+    ("stage", "provider")
+))
+provider_error_rate = registry.register(Gauge(
+    "provider_error_rate",
+    "Share of failed calls among each provider's recent calls.",
+    ("stage", "provider")
+))
+provider_circuit_open = registry.register(Gauge(
+    "provider_circuit_open",
+    "1 while the circuit breaker keeps a provider out of rotation.",
+    ("stage", "provider")
+))
+provider_backup_requests = registry.register(Counter(
+    "provider_backup_requests",
+    "Requests sent to another provider because the first was slow (hedge) or failed (failover).",
+    ("stage", "reason")
+))
+provider_wins = registry.register(Counter(
+    "provider_wins",
+    "Requests answered by each provider.",
+    ("stage", "provider")
+))
+
+class ProviderStats:
+    """
+    1つのプロバイダーの遅延（EWMAと直近の分布）、エラー率、サーキットブレーカーの状態
+    
+    連続した失敗が router_failure_threshold 回に達するか、直近のエラー率が
+    router_error_rate_threshold を超えるとブレーカーを開き、router_open_seconds の間は
+    ルーティングの対象から外す。その後は1件だけ試し（half-open）、成功すれば閉じる。
+    """
+    
+    def __init__(self):
+        self.ewma: Optional[float] = None
+        self._latencies: Deque[float] = deque(maxlen=settings.router_window_size)
+        self._outcomes: Deque[bool] = deque(maxlen=settings.router_window_size)
+        self._consecutive_failures = 0
+        self._open_until: Optional[float] = None
+        self._trial_in_flight = False
+    
+    @property
+    def circuit_open(self) -> bool:
+        return self._open_until is not None and time.monotonic() < self._open_until
+    
+    def available(self) -> bool:
+        """ブレーカーが閉じているか、開いた後の試行（half-open）を受け付けられる場合はTrue"""
+        if self._open_until is None:
+            return True
+        return not self.circuit_open and not self._trial_in_flight
+    
+    def begin(self):
+        """呼び出しの開始（half-open の場合は結果が出るまで他の呼び出しを通さない）"""
+        if self._open_until is not None:
+            self._trial_in_flight = True
+    
+    def record(self, seconds: float, ok: bool):
+        """呼び出しの結果を記録"""
+        self._trial_in_flight = False
+        self._observe_latency(seconds)
+        self._outcomes.append(ok)
+        if ok:
+            if self._open_until is not None:
+                # ブレーカーを閉じ、開く前の失敗は数えない
+                self._open_until = None
+                self._outcomes.clear()
+            self._consecutive_failures = 0
+            return
+        
+        self._consecutive_failures += 1
+        if self._open_until is not None or self._should_open():
+            self._open_until = time.monotonic() + settings.router_open_seconds
+    
+    def record_latency(self, seconds: float):
+        """結果の出なかった呼び出し（キャンセル）の経過時間を記録（少なくともこれだけ遅かった）"""
+        self._trial_in_flight = False
+        self._observe_latency(seconds)
+    
+    def release(self):
+        """成功・失敗のどちらにも数えない呼び出し（処理能力の超過や不正な入力）の終了"""
+        self._trial_in_flight = False
+    
+    def _observe_latency(self, seconds: float):
+        alpha = settings.router_ewma_alpha
+        self.ewma = seconds if self.ewma is None else alpha * seconds + (1 - alpha) * self.ewma
+        self._latencies.append(seconds)
+    
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= settings.router_failure_threshold:
+            return True
+        return (
+            len(self._outcomes) >= settings.router_min_samples
+            and self.error_rate() >= settings.router_error_rate_threshold
+        )
+    
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """直近の遅延のパーセンタイル（記録が router_min_samples 件未満の場合はNone）"""
+        if len(self._latencies) < settings.router_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ProviderRouter:
+    """
+    同じ処理を提供する複数のプロバイダーへの振り分け
+    
+    優先のプロバイダーに送り、ヘッジの待ち時間を過ぎても応答がない場合は次のプロバイダーにも
+    送って先に成功した方を使う（遅い方はキャンセルする）。失敗した場合は次のプロバイダーに
+    切り替える。ブレーカーが開いているプロバイダーは使わない（すべて開いている場合は優先の
+    プロバイダーを試す）。
+    
+    使用例:
+        text, provider = await provider_routers["stt"].run({
+            "openai": lambda: transcribe_openai(audio),
+            "local": lambda: transcribe_local(audio),
+        })
+    """
+    
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._stats: Dict[str, ProviderStats] = {}
+    
+    def stats(self, provider: str) -> ProviderStats:
+        if provider not in self._stats:
+            self._stats[provider] = ProviderStats()
+        return self._stats[provider]
+    
+    def order(self, providers: Sequence[str]) -> List[str]:
+        """試す順番（ブレーカーが開いているものを除き、優先のプロバイダーの次は遅延の小さい順）"""
+        available = [provider for provider in providers if self.stats(provider).available()]
+        if not available:
+            return list(providers[:1])
+        primary, rest = available[0], available[1:]
+        rest.sort(key=lambda provider: self.stats(provider).ewma or 0.0)
+        return [primary] + rest
+    
+    def hedge_delay(self, provider: str) -> float:
+        """次のプロバイダーにも送るまでの待ち時間（秒）"""
+        if settings.router_hedge_delay_ms > 0:
+            return settings.router_hedge_delay_ms / 1000
+        latency = self.stats(provider).percentile(settings.router_hedge_percentile)
+        if latency is None:
+            return settings.router_hedge_initial_delay_ms / 1000
+        return max(latency, settings.router_hedge_min_delay_ms / 1000)
+    
+    async def run(
+        self,
+        calls: Dict[str, Callable[[], Awaitable[T]]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None
+    ) -> Tuple[T, str]:
+        """
+        プロバイダーを呼び出し、最初に成功した (結果, プロバイダー) を返す
+        
+        Args:
+            calls: プロバイダー -> 呼び出し（先頭が優先のプロバイダー）
+            discard: 使わなかった成功結果の後始末（ストリームを閉じる等）
+        """
+        order = self.order(list(calls))
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        
+        def launch(provider: str):
+            task = asyncio.ensure_future(self._attempt(provider, calls[provider]))
+            pending[task] = provider
+        
+        launch(order.pop(0))
+        try:
+            while pending:
+                timeout = None
+                if order and settings.router_hedging_enabled:
+                    timeout = self.hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    provider_backup_requests.inc(stage=self.stage, reason="hedge")
+                    launch(order.pop(0))
+                    continue
+                
+                winner = None
+                invalid = None
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if winner is None:
+                            winner = (task.result(), provider)
+                        elif discard is not None:
+                            await discard(task.result())
+                    elif isinstance(error, ValueError):
+                        # 入力の誤りは他のプロバイダーでも変わらない
+                        invalid = error
+                    else:
+                        last_error = error
+                        logger.warning(f"{self.stage} provider {provider} failed: {str(error)}")
+                
+                if winner is not None:
+                    provider_wins.inc(stage=self.stage, provider=winner[1])
+                    return winner
+                if invalid is not None:
+                    raise invalid
+                if not pending and order:
+                    provider_backup_requests.inc(stage=self.stage, reason="failover")
+                    launch(order.pop(0))
+            
+            raise last_error
+        finally:
+            if pending:
+                asyncio.ensure_future(self._cancel(pending, discard))
+    
+    async def _attempt(self, provider: str, call: Callable[[], Awaitable[T]]) -> T:
+        stats = self.stats(provider)
+        stats.begin()
+        start = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            stats.record_latency(time.perf_counter() - start)
+            raise
+        except (ServiceBusyError, ValueError):
+            stats.release()
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start, ok=False)
+            raise
+        stats.record(time.perf_counter() - start, ok=True)
+        return result
+    
+    async def _cancel(
+        self,
+        pending: Dict[asyncio.Task, str],
+        discard: Optional[Callable[[T], Awaitable[None]]]
+    ):
+        """使わなかった呼び出しをキャンセルし、キャンセルより先に成功していた結果を後始末する"""
+        tasks = list(pending)
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if discard is None:
+            return
+        for result in results:
+            if not isinstance(result, BaseException):
+                try:
+                    await discard(result)
+                except Exception as e:
+                    logger.warning(f"Failed to discard {self.stage} result: {str(e)}")
+    
+    def collect_metrics(self):
+        for provider, stats in self._stats.items():
+            labels = {"stage": self.stage, "provider": provider}
+            provider_latency_ewma.set(stats.ewma or 0.0, **labels)
+            provider_latency_p95.set(stats.percentile(0.95) or 0.0, **labels)
+            provider_error_rate.set(stats.error_rate(), **labels)
+            provider_circuit_open.set(1 if stats.circuit_open else 0, **labels)
+
+# ステージごとのルーター（llm_ttft はストリーミングの最初のトークンまでの時間で比較する）
+provider_routers = {
+    stage: ProviderRouter(stage) for stage in ("llm", "llm_ttft", "stt", "tts")
+}
+
+def _collect_router_metrics():
+    for router in provider_routers.values():
+        router.collect_metrics()
+
+registry.add_collector(_collect_router_metrics)
@@ -0,0 +1,91 @@
+import re
+from typing import List
+
+# 日本語の文末記号（直後で即座に区切る）
+_JA_TERMINATORS = "。！？"
+# ASCIIの文末記号（小数点や略語と区別するため、直後が空白か非ASCII文字の場合のみ区切る）
+_ASCII_TERMINATORS = ".!?"
+# 文末記号の直後に続く閉じ括弧類は同じ文に含める
+_CLOSING_CHARS = "」』）)\"'”’"
+
+_WHITESPACE = re.compile(r"\s+")
+
+class SentenceSplitter:
+    """ストリーミングされるテキストを文単位に区切る
+    
+    LLMのトークンを `feed` で順次渡すと、完成した文のリストが返される。
+    最後に `flush` を呼ぶと、区切られずに残ったテキストが返される。
+    """
+    
+    def __init__(self, min_length: int = 2):
+        self.min_length = min_length
+        self._buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        """テキストを追加し、完成した文を返す"""
+        self._buffer += text
+        sentences = []
+        
+        while True:
+            end = self._find_boundary(self._buffer)
+            if end is None:
+                break
+            sentence = self._buffer[:end].strip()
+            if len(sentence) < self.min_length:
+                # 短すぎる断片は次の文と結合する
+                next_end = self._find_boundary(self._buffer, start=end)
+                if next_end is None:
+                    break
+                end = next_end
+                sentence = self._buffer[:end].strip()
+            self._buffer = self._buffer[end:]
+            if sentence:
+                sentences.append(_WHITESPACE.sub(" ", sentence))
+        
+        return sentences
+    
+    def flush(self) -> List[str]:
+        """残りのテキストを文として返す"""
+        sentence = self._buffer.strip()
+        self._buffer = ""
+        return [_WHITESPACE.sub(" ", sentence)] if sentence else []
+    
+    def _find_boundary(self, text: str, start: int = 0):
+        """文の終わり（区切り位置の直後のインデックス）を探す"""
+        for i in range(start, len(text)):
+            char = text[i]
+            if char == "\n":
+                return i + 1
+            if char in _JA_TERMINATORS:
+                end = i + 1
+            elif char in _ASCII_TERMINATORS:
+                end = i + 1
+                # 後続の文字が届いていない場合は判断を保留する
+                while end < len(text) and text[end] in _ASCII_TERMINATORS + _CLOSING_CHARS:
+                    end += 1
+                if end >= len(text):
+                    return None
+                if text[end].isascii() and not text[end].isspace():
+                    continue
+                return end
+            else:
+                continue
+            
+            while end < len(text) and text[end] in _JA_TERMINATORS + _CLOSING_CHARS:
+                end += 1
+            return end
+        return None
+
+def split_sentences(text: str) -> List[str]:
+    """完成済みのテキストを文のリストに分割する"""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+def join_sentences(sentences: List[str]) -> str:
+    """文のリストを1つのテキストに結合する（ASCIIの文の後には空白を入れる）"""
+    text = ""
+    for sentence in sentences:
+        if text and text[-1].isascii():
+            text += " "
+        text += sentence
+    return text
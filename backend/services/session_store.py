@@ -0,0 +1,270 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from config.settings import settings
+from services.errors import TooManyRequestsError
+
+logger = logging.getLogger(__name__)
+
+SessionData = Dict[str, Any]
+
+class SessionStore(ABC):
+    """
+    会話セッションの保存先のインターフェース
+    
+    セッションのデータはJSONに変換できる辞書（例: {"messages": [...]}）で、
+    最後にアクセスしてから ttl_seconds を過ぎたセッションは期限切れとして破棄される。
+    """
+    
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        """セッションを取得（存在しないか期限切れの場合はNone）"""
+    
+    @abstractmethod
+    async def set(self, session_id: str, data: SessionData):
+        """セッションを保存し、有効期限を延長する"""
+    
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        """セッションを削除（存在した場合はTrue）"""
+    
+    @asynccontextmanager
+    async def lease(self, session_id: str) -> AsyncIterator[None]:
+        """
+        他のプロセスとの間でセッションを排他的に使う（1つのプロセスだけで使うストアでは何もしない）
+        
+        プロセス内の順番は SessionGate が守るため、ここではワーカー間の排他だけを行う。
+        """
+        yield
+    
+    async def close(self):
+        """保存先との接続を閉じる"""
+
+class InMemorySessionStore(SessionStore):
+    """
+    プロセス内のメモリにセッションを保持するストア
+    
+    最後のアクセスが古い順に並べて保持し、期限切れのセッションと
+    max_sessions を超えた分のセッションを古い順に破棄する。
+    """
+    
+    def __init__(self, ttl_seconds: int, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, SessionData]]" = OrderedDict()
+    
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        self._purge_expired()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        # 読み出したセッションも最近使われたものとして扱う
+        self._sessions[session_id] = (time.monotonic() + self.ttl_seconds, entry[1])
+        self._sessions.move_to_end(session_id)
+        return copy.deepcopy(entry[1])
+    
+    async def set(self, session_id: str, data: SessionData):
+        self._sessions[session_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(data))
+        self._sessions.move_to_end(session_id)
+        self._purge_expired()
+        while len(self._sessions) > self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            logger.info(f"Evicted session: {evicted_id}")
+    
+    async def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+    
+    def _purge_expired(self):
+        # アクセス順に並んでいるため、先頭から期限切れのものだけを取り除けばよい
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLiteファイルにセッションを保持するストア
+    
+    複数のワーカープロセスから同じファイルを共有できるよう、WALモードで開く。
+    ブロッキングするDB操作はスレッドで実行する。
+    """
+    
+    _PURGE_INTERVAL_SECONDS = 60
+    _LEASE_POLL_SECONDS = 0.05
+    
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._last_purge = 0.0
+        
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        # 処理中のセッションのリース（ワーカー間で同じセッションのターンを1つずつ処理する）
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS session_leases ("
+            "id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.commit()
+        
+        # fork されたワーカープロセス（serve.py）では親プロセスの接続を引き継がず、新しく接続する
+        os.register_at_fork(after_in_child=self._forget_connections)
+    
+    def _forget_connections(self):
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+    
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3の接続はスレッドごとに作成する
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+    
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        return await asyncio.to_thread(self._get_sync, session_id)
+    
+    async def set(self, session_id: str, data: SessionData):
+        await asyncio.to_thread(self._set_sync, session_id, json.dumps(data, ensure_ascii=False))
+    
+    async def delete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self._delete_sync, session_id)
+    
+    def _get_sync(self, session_id: str) -> Optional[SessionData]:
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+            (session_id, now)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE sessions SET expires_at = ? WHERE id = ?",
+            (now + self.ttl_seconds, session_id)
+        )
+        connection.commit()
+        return json.loads(row[0])
+    
+    def _set_sync(self, session_id: str, data: str):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (session_id, data, now + self.ttl_seconds)
+        )
+        if now - self._last_purge > self._PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            connection.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        connection.commit()
+    
+    def _delete_sync(self, session_id: str) -> bool:
+        connection = self._connection()
+        cursor = connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        connection.commit()
+        return cursor.rowcount > 0
+    
+    @asynccontextmanager
+    async def lease(self, session_id: str) -> AsyncIterator[None]:
+        """
+        SQLiteのリースで、他のワーカーが同じセッションを処理している間は待つ
+        
+        リースは保持している間 session_lease_seconds ごとに延長し、ワーカーが異常終了した場合は
+        期限切れで解放される。session_lease_timeout_seconds を待っても取得できない場合は
+        TooManyRequestsError（429）を送出する。
+        """
+        if not session_id:
+            yield
+            return
+        
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + settings.session_lease_timeout_seconds
+        while not await asyncio.to_thread(self._acquire_lease_sync, session_id, owner):
+            if time.monotonic() >= deadline:
+                raise TooManyRequestsError(
+                    "This session is being processed by another worker",
+                    retry_after=settings.admission_retry_after_seconds
+                )
+            await asyncio.sleep(self._LEASE_POLL_SECONDS)
+        
+        renewer = asyncio.create_task(self._renew_lease(session_id, owner))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await asyncio.to_thread(self._release_lease_sync, session_id, owner)
+    
+    async def _renew_lease(self, session_id: str, owner: str):
+        while True:
+            await asyncio.sleep(settings.session_lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._renew_lease_sync, session_id, owner)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to renew session lease: {str(e)}")
+    
+    def _acquire_lease_sync(self, session_id: str, owner: str) -> bool:
+        connection = self._connection()
+        now = time.time()
+        # 期限切れのリースだけを上書きする（有効なリースがあれば rowcount は0）
+        cursor = connection.execute(
+            "INSERT INTO session_leases (id, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE session_leases.expires_at <= ?",
+            (session_id, owner, now + settings.session_lease_seconds, now)
+        )
+        connection.commit()
+        return cursor.rowcount > 0
+    
+    def _renew_lease_sync(self, session_id: str, owner: str):
+        connection = self._connection()
+        connection.execute(
+            "UPDATE session_leases SET expires_at = ? WHERE id = ? AND owner = ?",
+            (time.time() + settings.session_lease_seconds, session_id, owner)
+        )
+        connection.commit()
+    
+    def _release_lease_sync(self, session_id: str, owner: str):
+        connection = self._connection()
+        connection.execute("DELETE FROM session_leases WHERE id = ? AND owner = ?", (session_id, owner))
+        connection.commit()
+    
+    async def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+def create_session_store() -> SessionStore:
+    """設定に応じたセッションストアを作成"""
+    if settings.session_store == "sqlite":
+        logger.info(f"Using SQLite session store: {settings.session_sqlite_path}")
+        return SQLiteSessionStore(settings.session_sqlite_path, settings.session_ttl_seconds)
+    return InMemorySessionStore(settings.session_ttl_seconds, settings.session_max_sessions)
@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+from services.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+single_flight_calls = registry.register(Counter(
+    "single_flight_calls",
+    "Calls per operation that started an upstream call (leader) or joined one in flight (shared).",
+    ("operation", "role")
+))
+single_flight_in_flight = registry.register(Gauge(
+    "single_flight_in_flight",
+    "Distinct upstream calls currently in flight per operation.",
+    ("operation",)
+))
+
+def content_key(*parts: Any) -> str:
+    """処理の内容（テキスト、バイト列等）からキー（SHA-256）を作成"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中であれば新たに実行せず、実行中の処理の結果を共有する
+    
+    処理は最初の呼び出し元とは独立したタスクとして実行するため、一部の呼び出し元が
+    キャンセルされても他の呼び出し元には影響しない。待っている呼び出し元が
+    すべてキャンセルされた場合のみ処理をキャンセルする。
+    """
+    
+    def __init__(self, operation: str):
+        self.operation = operation
+        # キー -> (実行中のタスク, 待っている呼び出し元の数)
+        self._calls: Dict[str, Tuple[asyncio.Task, int]] = {}
+    
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        キーが同じ処理が実行中であればその結果を、なければ factory() を実行した結果を返す
+        
+        Args:
+            key: 処理の内容を表すキー（content_key で作成）
+            factory: 処理を開始する関数
+        """
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = (task, 1)
+            single_flight_in_flight.inc(operation=self.operation)
+            task.add_done_callback(lambda done: self._finish(key, done))
+            single_flight_calls.inc(operation=self.operation, role="leader")
+        else:
+            task, waiters = entry
+            self._calls[key] = (task, waiters + 1)
+            single_flight_calls.inc(operation=self.operation, role="shared")
+            logger.debug(f"Joined in-flight {self.operation} call: {key[:12]}")
+        
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            self._leave(key, task)
+            raise
+    
+    def _leave(self, key: str, task: asyncio.Task):
+        entry = self._calls.get(key)
+        if entry is None or entry[0] is not task:
+            return
+        waiters = entry[1] - 1
+        self._calls[key] = (task, waiters)
+        if waiters == 0 and not task.done():
+            task.cancel()
+    
+    def _finish(self, key: str, done: asyncio.Task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is done:
+            del self._calls[key]
+            single_flight_in_flight.dec(operation=self.operation)
+        # 待っている呼び出し元がいない場合でも例外の未取得の警告を出さない
+        if not done.cancelled():
+            done.exception()
+    
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -1,12 +1,28 @@
-from openai import AsyncOpenAI
+import asyncio
 import base64
 import io
-from typing import Tuple, Optional
+from typing import AsyncIterator, List, Tuple, Optional
 import logging
-import tempfile
-import os
 import json
+import time
+import numpy as np
 from config.settings import settings
+from services.audio_utils import (
+    TTS_OUTPUT_FORMATS,
+    WHISPER_SAMPLE_RATE,
+    decode_audio,
+    encode_audio,
+    encode_wav,
+    ffmpeg_available,
+)
+from services.admission import stage_limiters
+from services.errors import ServiceBusyError
+from services.metrics import observe_payload, observe_stage, stage_in_flight, stage_timer
+from services.provider_clients import provider_clients, with_retries
+from services.provider_router import provider_routers
+from services.single_flight import SingleFlight, content_key
+from services.tts_cache import normalize_text, tts_cache
+from services.vad import detect_speech, join_transcripts, split_at_pauses
 
 logger = logging.getLogger(__name__)
 
@@ -15,118 +31,533 @@ class SpeechService:
         self.api_key_exists = bool(settings.openai_api_key)
         self.tts_provider = settings.tts_provider
         self.stt_provider = settings.stt_provider
+        # 同じ内容の同時リクエストは1回の呼び出しを共有する
+        self._stt_flight = SingleFlight("stt")
+        self._tts_flight = SingleFlight("tts")
+        self._vad_ffmpeg_warned = False
         
-        if self.api_key_exists:
-            self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        else:
-            self.client = None
-            
-        # ローカルTTSを使用する場合
-        if self.tts_provider == "local":
+        # ローカルTTSを使用する場合（優先・副のどちらか）
+        self.melotts = None
+        if "local" in (self.tts_provider, settings.tts_secondary_provider):
             from services.melotts_service import melotts_service
             self.melotts = melotts_service
             
-        # ローカルSTTを使用する場合
-        if self.stt_provider == "local":
-            try:
-                from services.whisper_service import whisper_service
+        # ローカルSTTを使用する場合（優先・副のどちらか）
+        # whisperとtorchのインポートとモデルのロードは初回利用時（またはウォームアップ時）に行う
+        self.whisper = None
+        if "local" in (self.stt_provider, settings.stt_secondary_provider):
+            from services.whisper_service import whisper_service
+            if whisper_service.available:
                 self.whisper = whisper_service
-            except ImportError as e:
-                logger.warning(f"Failed to import Whisper service: {str(e)}")
-                self.whisper = None
+            else:
+                logger.warning(
+                    f"Whisper backend '{whisper_service.engine.name}' is not installed, "
+                    "local speech-to-text is unavailable"
+                )
     
-    def _generate_mock_audio(self, text: str) -> Tuple[str, str]:
+    @property
+    def client(self):
+        # OpenAI クライアント（共有のコネクションプールを使用、APIキーがない場合はNone）
+        return provider_clients.openai
+    
+    def _generate_mock_audio(self, text: str) -> Tuple[bytes, str]:
         """APIキーがない場合のモック音声データを生成"""
         # 簡単なWAVヘッダーを持つ無音の音声データを作成
         # これは実際には音が出ませんが、プレースホルダーとして機能します
         wav_header = b'RIFF$\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x08\x00data\x00\x00\x00\x00'
-        return base64.b64encode(wav_header).decode('utf-8'), "wav"
-    
-    async def speech_to_text(self, audio_base64: str, audio_format: str = "webm") -> str:
-        # ローカルSTTを使用する場合
-        if self.stt_provider == "local":
-            # APIキーがなく、TTSもローカルの場合はテストメッセージを返す
-            if not self.api_key_exists and self.tts_provider == "local":
-                return "ローカルTTSのテストメッセージ"
-            
-            if self.whisper is None:
-                return "（ローカルWhisperが利用できません。必要なパッケージをインストールしてください）"
-            try:
-                return await self.whisper.speech_to_text(audio_base64, audio_format)
-            except Exception as e:
-                logger.error(f"Local Whisper error: {str(e)}")
-                return f"（ローカル音声認識エラー: {str(e)}）"
+        return wav_header, "wav"
+    
+    async def speech_to_text(
+        self,
+        audio_base64: str,
+        audio_format: str = "webm",
+        model: Optional[str] = None
+    ) -> str:
+        """Base64エンコードされた音声をテキストに変換（JSON API用）"""
+        with stage_timer("decode", "base64"):
+            audio_data = base64.b64decode(audio_base64)
+        return await self.transcribe(audio_data, audio_format, model)
+    
+    async def transcribe(
+        self,
+        audio_data: bytes,
+        audio_format: str = "webm",
+        model: Optional[str] = None
+    ) -> str:
+        """
+        音声データ（バイナリ）をテキストに変換
         
-        # OpenAI STTを使用する場合
-        # APIキーがない場合の処理
-        if not self.api_key_exists:
-            # ローカルTTSを使用している場合は、テストメッセージを返す
-            if self.tts_provider == "local":
-                return "ローカルTTSのテストメッセージ"
-            else:
-                return "（音声認識機能を使用するにはOpenAI APIキーが必要です）"
+        Args:
+            audio_data: 音声データ
+            audio_format: 音声フォーマット（webm, mp3, wav等）
+            model: ローカルWhisperのモデル名（省略時は設定のデフォルト。OpenAI STTでは無視される）
+        """
+        observe_payload("in", "audio", len(audio_data))
+        key = content_key(self.stt_provider, audio_format, model, audio_data)
+        with stage_timer("stt", self.stt_provider):
+            return await self._stt_flight.do(
+                key,
+                lambda: stage_limiters["stt"].run(
+                    lambda: self._transcribe(audio_data, audio_format, model)
+                )
+            )
+    
+    def _stt_providers(self) -> List[str]:
+        """音声認識に使えるプロバイダー（先頭が優先のプロバイダー）"""
+        providers = [self.stt_provider]
+        secondary = settings.stt_secondary_provider
+        if secondary and secondary != self.stt_provider:
+            providers.append(secondary)
+        return [
+            provider for provider in providers
+            if (self.whisper is not None if provider == "local" else self.api_key_exists)
+        ]
+    
+    async def _transcribe(
+        self,
+        audio_data: bytes,
+        audio_format: str,
+        model: Optional[str]
+    ) -> str:
+        # APIキーがなく、TTSがローカルの場合はテストメッセージを返す
+        if not self.api_key_exists and self.tts_provider == "local":
+            return "ローカルTTSのテストメッセージ"
+        
+        providers = self._stt_providers()
+        if not providers:
+            if self.stt_provider == "local":
+                return "（ローカルWhisperが利用できません。必要なパッケージをインストールしてください）"
+            return "（音声認識機能を使用するにはOpenAI APIキーが必要です）"
         
         try:
-            audio_data = base64.b64decode(audio_base64)
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_format}") as tmp_file:
-                tmp_file.write(audio_data)
-                tmp_file_path = tmp_file.name
+            # 無音を除いた発話部分だけを認識する（発話がなければ認識自体を行わない）
+            speech = await self._speech_chunks(audio_data) if settings.vad_enabled else None
+            if speech is not None and not speech[0]:
+                logger.info("No speech detected, skipping speech recognition")
+                return ""
             
-            try:
-                with open(tmp_file_path, "rb") as audio_file:
-                    transcript = await self.client.audio.transcriptions.create(
-                        model=settings.openai_whisper_model,
-                        file=audio_file,
-                        language="ja"
-                    )
-                
-                return transcript.text
-            finally:
-                os.unlink(tmp_file_path)
-                
+            text, _ = await provider_routers["stt"].run({
+                provider: lambda provider=provider: self._recognize(provider, audio_data, audio_format, model, speech)
+                for provider in providers
+            })
+            return text
+        
+        except (ServiceBusyError, ValueError):
+            raise
         except Exception as e:
+            if self.stt_provider == "local":
+                logger.error(f"Local Whisper error: {str(e)}")
+                return f"（ローカル音声認識エラー: {str(e)}）"
             logger.error(f"Error in speech to text: {str(e)}")
             raise Exception(f"Failed to convert speech to text: {str(e)}")
     
+    async def _recognize(
+        self,
+        provider: str,
+        audio_data: bytes,
+        audio_format: str,
+        model: Optional[str],
+        speech: Optional[Tuple[List[np.ndarray], int]]
+    ) -> str:
+        """1つのプロバイダーで認識（speech がNoneの場合は元の音声をそのまま認識する）"""
+        if provider == "local":
+            if speech is None:
+                return await self.whisper.transcribe(audio_data, audio_format, model_name=model)
+            return join_transcripts(await self.whisper.transcribe_chunks(speech[0], model_name=model))
+        
+        uploads = await self._trimmed_uploads(speech, len(audio_data)) if speech is not None else None
+        if uploads is None:
+            return await self._openai_transcribe(audio_data, audio_format)
+        # 長い録音は無音の位置で分割して並列に送信する
+        texts = await asyncio.gather(*(
+            self._openai_transcribe(data, upload_format) for data, upload_format in uploads
+        ))
+        return join_transcripts(texts)
+    
+    async def _trimmed_uploads(
+        self,
+        speech: Tuple[List[np.ndarray], int],
+        original_size: int
+    ) -> Optional[List[Tuple[bytes, str]]]:
+        """
+        無音を除いた波形をOpenAIへ送るデータ（Opus、ffmpegがない場合はWAV）に変換
+        
+        ほとんど削れない場合と、変換しても元の（圧縮された）音声より小さくならない場合はNoneを返す。
+        """
+        chunks, total_samples = speech
+        if len(chunks) == 1 and len(chunks[0]) >= total_samples * 0.9:
+            return None
+        
+        def encode(chunk: np.ndarray) -> Tuple[bytes, str]:
+            wav_data = encode_wav(chunk)
+            if ffmpeg_available():
+                try:
+                    return encode_audio(wav_data, "opus", settings.vad_upload_opus_bitrate), "ogg"
+                except Exception as e:
+                    logger.warning(f"Failed to encode trimmed speech, sending wav: {str(e)}")
+            return wav_data, "wav"
+        
+        with stage_timer("encode", "stt_upload"):
+            uploads = await asyncio.to_thread(lambda: [encode(chunk) for chunk in chunks])
+        if sum(len(data) for data, _ in uploads) >= original_size:
+            return None
+        return uploads
+    
+    async def _speech_chunks(self, audio_data: bytes) -> Optional[Tuple[List[np.ndarray], int]]:
+        """
+        音声をデコードして発話区間を検出し、(無音を除いた波形のリスト, 元の音声のサンプル数) を返す
+        
+        長い録音は vad_split_seconds 以内になるよう無音の位置で分割する。
+        発話がない場合は波形のリストが空になる。デコードできない場合はNoneを返す。
+        """
+        try:
+            with stage_timer("decode", "vad"):
+                audio = await asyncio.to_thread(decode_audio, audio_data)
+        except Exception as e:
+            # ffmpegがない場合はWAV以外を毎回デコードできないため、警告は1回だけ出す
+            if ffmpeg_available():
+                logger.warning(f"Skipping voice activity detection: {str(e)}")
+            elif not self._vad_ffmpeg_warned:
+                self._vad_ffmpeg_warned = True
+                logger.warning("ffmpeg is not installed, voice activity detection only applies to 16kHz WAV input")
+            return None
+        
+        with stage_timer("vad", "energy"):
+            regions = detect_speech(audio)
+            if not regions:
+                return [], len(audio)
+            chunks = split_at_pauses(audio, regions, int(settings.vad_split_seconds * WHISPER_SAMPLE_RATE))
+        
+        speech_samples = sum(len(chunk) for chunk in chunks)
+        logger.info(
+            f"Voice activity: {speech_samples / WHISPER_SAMPLE_RATE:.1f}s of speech "
+            f"in {len(audio) / WHISPER_SAMPLE_RATE:.1f}s, {len(chunks)} chunk(s)"
+        )
+        return chunks, len(audio)
+    
+    async def _openai_transcribe(self, audio_data: bytes, audio_format: str) -> str:
+        # 一時ファイルを使わず、ファイル名（拡張子でフォーマットを判別させる）とバイト列を直接渡す
+        transcript = await with_retries("stt", lambda timeout: self.client.audio.transcriptions.create(
+            model=settings.openai_whisper_model,
+            file=(f"audio.{audio_format}", audio_data),
+            language="ja",
+            timeout=timeout
+        ))
+        return transcript.text
+    
     async def text_to_speech(
         self, 
         text: str, 
         voice: Optional[str] = None,
-        speed: float = 1.0
+        speed: Optional[float] = 1.0,
+        output_format: Optional[str] = None
     ) -> Tuple[str, str]:
-        # ローカルTTSを使用する場合
-        if self.tts_provider == "local":
-            try:
-                return await self.melotts.text_to_speech(text, speed)
-            except Exception as e:
-                logger.error(f"MeloTTS error, falling back to mock audio: {str(e)}")
-                return self._generate_mock_audio(text)
+        """テキストを音声に変換し、Base64エンコードして返す（JSON API用）"""
+        audio_content, audio_format = await self.synthesize(text, voice, speed, output_format)
+        with stage_timer("encode", "base64"):
+            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
+        return audio_base64, audio_format
+    
+    def output_format(self, requested: Optional[str]) -> Optional[str]:
+        """
+        出力フォーマットを検証して返す
         
-        # OpenAI TTSを使用する場合
-        # APIキーがない場合はモック音声を返す
+        プロバイダーがそのまま返すフォーマット（OpenAIはmp3、ローカルはwav）の場合はNoneを返す。
+        未対応のフォーマットの場合は ValueError を送出する。
+        """
+        audio_format = (requested or settings.tts_output_format or "").lower() or None
+        if audio_format is None:
+            return None
+        if audio_format not in TTS_OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unsupported audio format: {audio_format} (supported: {', '.join(TTS_OUTPUT_FORMATS)})"
+            )
+        return None if audio_format == _native_format(self.tts_provider) else audio_format
+    
+    def response_format(self, requested: Optional[str]) -> str:
+        """合成した音声のフォーマット（ローカルTTSでエンコードできない場合は実際にはwavになる）"""
+        return self.output_format(requested) or _native_format(self.tts_provider)
+    
+    def _tts_cache_key(
+        self,
+        text: str,
+        voice: Optional[str],
+        speed: float,
+        output_format: Optional[str] = None,
+        provider: Optional[str] = None
+    ) -> Optional[str]:
+        """TTSキャッシュのキーを作成（provider は省略時は優先のプロバイダー、キャッシュしない場合はNone）"""
+        if not settings.tts_cache_enabled:
+            return None
+        provider = provider or self.tts_provider
+        # 副のプロバイダーも優先のプロバイダーと同じフォーマットで返す
+        audio_format = output_format or _native_format(self.tts_provider)
+        if audio_format == _native_format(provider):
+            audio_format = None
+        if provider == "local":
+            # MeloTTSの音声とビープ音（フォールバック）を区別する
+            engine = "melotts" if self.melotts.available else "beep"
+            model = f"{engine}-{settings.melotts_language}"
+            if audio_format:
+                model += f":{audio_format}@{_local_bitrate(audio_format)}"
+            return tts_cache.make_key("local", model, "", speed, text)
+        # モック音声はキャッシュしない
         if not self.api_key_exists:
-            return self._generate_mock_audio(text)
+            return None
+        model = settings.openai_tts_model
+        if audio_format:
+            model += f":{audio_format}"
+        return tts_cache.make_key("openai", model, voice, speed, text)
+    
+    def cached_audio_file(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        speed: Optional[float] = 1.0,
+        output_format: Optional[str] = None
+    ) -> Optional[Tuple[str, str]]:
+        """ディスクキャッシュに合成済みの音声があれば (ファイルパス, フォーマット) を返す"""
+        voice = voice or settings.openai_tts_voice
+        speed = _default_speed(speed)
+        output_format = self.output_format(output_format)
+        cache_key = self._tts_cache_key(text, voice, speed, output_format)
+        if cache_key is None or not tts_cache.disk_dir:
+            return None
+        return tts_cache.get_path(cache_key)
+    
+    async def synthesize(
+        self, 
+        text: str, 
+        voice: Optional[str] = None,
+        speed: Optional[float] = 1.0,
+        output_format: Optional[str] = None
+    ) -> Tuple[bytes, str]:
+        """
+        テキストを音声データ（バイナリ）に変換
+        
+        Args:
+            speed: 読み上げ速度（Noneの場合は1.0）
+            output_format: 出力フォーマット（mp3, opus, aac, flac, wav, pcm、省略時は設定値）
         
+        Returns:
+            (音声データ, 実際のフォーマット)。ローカルTTSでエンコードできない場合はwavを返す
+        """
+        speed = _default_speed(speed)
+        output_format = self.output_format(output_format)
+        stage_in_flight.inc(stage="tts", provider=self.tts_provider)
+        start = time.perf_counter()
+        try:
+            # キャッシュにある音声はTTSの枠を待たずに返す
+            cached = await self._cached_audio(text, voice, speed, output_format)
+            if cached is not None:
+                audio_content, audio_format, source = cached + ("cache",)
+            else:
+                key = content_key(self.tts_provider, voice, speed, output_format, normalize_text(text))
+                audio_content, audio_format, source = await self._tts_flight.do(
+                    key,
+                    lambda: stage_limiters["tts"].run(
+                        lambda: self._synthesize(text, voice, speed, output_format)
+                    )
+                )
+        finally:
+            stage_in_flight.dec(stage="tts", provider=self.tts_provider)
+        
+        # キャッシュヒットは別のプロバイダーとして記録し、合成時間の分布と混ざらないようにする
+        observe_stage("tts", source, time.perf_counter() - start)
+        observe_payload("out", "audio", len(audio_content))
+        return audio_content, audio_format
+    
+    def _tts_providers(self) -> List[str]:
+        """音声合成に使えるプロバイダー（先頭が優先のプロバイダー）"""
+        providers = [self.tts_provider]
+        secondary = settings.tts_secondary_provider
+        if secondary and secondary != self.tts_provider:
+            providers.append(secondary)
+        return [
+            provider for provider in providers
+            if (self.melotts.available if provider == "local" else self.api_key_exists)
+        ]
+    
+    async def _cached_audio(
+        self,
+        text: str,
+        voice: Optional[str],
+        speed: float,
+        output_format: Optional[str]
+    ) -> Optional[Tuple[bytes, str]]:
+        """いずれかのプロバイダーで合成済みの音声がキャッシュにあれば (音声データ, フォーマット) を返す"""
+        voice = voice or settings.openai_tts_voice
+        for provider in self._tts_providers() or [self.tts_provider]:
+            cache_key = self._tts_cache_key(text, voice, speed, output_format, provider)
+            if cache_key is not None:
+                cached = await tts_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        return None
+    
+    async def _synthesize(
+        self, 
+        text: str, 
+        voice: Optional[str],
+        speed: float,
+        output_format: Optional[str]
+    ) -> Tuple[bytes, str, str]:
+        """音声データ、フォーマット、取得元（local, openai, mock）を返す"""
         # 環境変数から音声を取得、指定がなければデフォルト
         voice = voice or settings.openai_tts_voice
         
+        # キャッシュは synthesize でTTSの枠を取る前に確認済み
+        # 使えるプロバイダーがない場合、ローカルTTSはビープ音を返す
+        providers = self._tts_providers() or [self.tts_provider]
+        
+        # OpenAI TTSを使用する場合
+        # APIキーがない場合はモック音声を返す
+        if providers == ["openai"] and not self.api_key_exists:
+            return self._generate_mock_audio(text) + ("mock",)
+        
         try:
-            response = await self.client.audio.speech.create(
-                model=settings.openai_tts_model,
-                voice=voice,
-                input=text,
-                speed=speed
-            )
-            
-            audio_content = response.content
-            
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            
-            return audio_base64, "mp3"
-            
+            (audio_content, audio_format), provider = await provider_routers["tts"].run({
+                provider: lambda provider=provider: self._synthesize_with(provider, text, voice, speed, output_format)
+                for provider in providers
+            })
+        except ServiceBusyError:
+            raise
         except Exception as e:
+            if self.tts_provider == "local":
+                logger.error(f"Text to speech error, falling back to mock audio: {str(e)}")
+                return self._generate_mock_audio(text) + ("mock",)
             logger.error(f"Error in text to speech: {str(e)}")
             raise Exception(f"Failed to convert text to speech: {str(e)}")
+        
+        cache_key = self._tts_cache_key(text, voice, speed, output_format, provider)
+        if cache_key is not None:
+            await tts_cache.put(cache_key, audio_content, audio_format)
+        return audio_content, audio_format, provider
+    
+    async def _synthesize_with(
+        self,
+        provider: str,
+        text: str,
+        voice: str,
+        speed: float,
+        output_format: Optional[str]
+    ) -> Tuple[bytes, str]:
+        """1つのプロバイダーで合成（副のプロバイダーも優先のプロバイダーと同じフォーマットで返す）"""
+        audio_format = output_format or _native_format(self.tts_provider)
+        if provider == "local":
+            audio_content, native_format = await self.melotts.synthesize(text, speed)
+            if audio_format == native_format:
+                return audio_content, native_format
+            return await self._encode_local(audio_content, audio_format)
+        
+        response = await with_retries("tts", lambda timeout: self.client.audio.speech.create(
+            model=settings.openai_tts_model,
+            voice=voice,
+            input=text,
+            speed=speed,
+            response_format=audio_format,
+            timeout=timeout
+        ))
+        return response.content, audio_format
+    
+    async def _encode_local(self, wav_data: bytes, output_format: str) -> Tuple[bytes, str]:
+        """ローカルTTSのWAVを指定のフォーマットにエンコード（ffmpegがない、または失敗した場合はWAVのまま）"""
+        if not ffmpeg_available():
+            logger.warning(f"ffmpeg is not installed, returning wav instead of {output_format}")
+            return wav_data, "wav"
+        try:
+            with stage_timer("encode", output_format):
+                encoded = await asyncio.to_thread(
+                    encode_audio, wav_data, output_format, _local_bitrate(output_format)
+                )
+            return encoded, output_format
+        except Exception as e:
+            logger.error(f"Failed to encode {output_format}, returning wav: {str(e)}")
+            return wav_data, "wav"
+    
+    async def stream_text_to_speech(
+        self, 
+        text: str, 
+        voice: Optional[str] = None,
+        speed: Optional[float] = 1.0,
+        output_format: Optional[str] = None
+    ) -> Tuple[AsyncIterator[bytes], str]:
+        """
+        テキストを音声に変換し、生成されたチャンクから順に返す
+        
+        Returns:
+            (音声データのチャンクを返す非同期イテレータ, 音声フォーマット)
+        """
+        speed = _default_speed(speed)
+        requested_format = output_format
+        output_format = self.output_format(requested_format)
+        
+        # モック音声と、ローカルTTSをエンコードする場合は一括生成した音声を返す
+        # 優先のプロバイダーのブレーカーが開いている場合も、副のプロバイダーで一括生成する
+        if (self.tts_provider == "local" and output_format) or (
+            self.tts_provider != "local" and not self.api_key_exists
+        ) or (
+            len(self._tts_providers()) > 1 and not provider_routers["tts"].stats(self.tts_provider).available()
+        ):
+            audio_content, audio_format = await self.synthesize(text, voice, speed, requested_format)
+            return _iterate_once(audio_content), audio_format
+        
+        # ローカルTTSはWAVのヘッダーとPCMのチャンクを順に返す
+        if self.tts_provider == "local":
+            return self.melotts.stream_synthesize(text, speed), "wav"
+        
+        voice = voice or settings.openai_tts_voice
+        audio_format = output_format or "mp3"
+        cache_key = self._tts_cache_key(text, voice, speed, output_format)
+        if cache_key is not None:
+            cached = await tts_cache.get(cache_key)
+            if cached is not None:
+                return _iterate_once(cached[0]), cached[1]
+        
+        async def iterate_chunks() -> AsyncIterator[bytes]:
+            chunks = []
+            try:
+                # 受信が終わるまでTTSの枠を保持する
+                async with stage_limiters["tts"].slot(), self.client.audio.speech.with_streaming_response.create(
+                    model=settings.openai_tts_model,
+                    voice=voice,
+                    input=text,
+                    speed=speed,
+                    response_format=audio_format,
+                    timeout=settings.tts_timeout_seconds
+                ) as response:
+                    async for chunk in response.iter_bytes():
+                        chunks.append(chunk)
+                        yield chunk
+            except ServiceBusyError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in streaming text to speech: {str(e)}")
+                raise Exception(f"Failed to convert text to speech: {str(e)}")
+            
+            # 最後まで受信できた場合のみキャッシュする
+            if cache_key is not None:
+                await tts_cache.put(cache_key, b"".join(chunks), audio_format)
+        
+        return iterate_chunks(), audio_format
+
+def _default_speed(speed: Optional[float]) -> float:
+    """リクエストで速度が省略（null）された場合は等速にする"""
+    return 1.0 if speed is None else speed
+
+def _native_format(provider: str) -> str:
+    """プロバイダーがそのまま返すフォーマット"""
+    return "wav" if provider == "local" else "mp3"
+
+def _local_bitrate(output_format: str) -> Optional[str]:
+    """ローカルTTSの音声をエンコードする場合のビットレート"""
+    return {
+        "opus": settings.tts_opus_bitrate,
+        "aac": settings.tts_aac_bitrate,
+        "mp3": settings.tts_mp3_bitrate,
+    }.get(output_format)
+
+async def _iterate_once(data: bytes) -> AsyncIterator[bytes]:
+    yield data
 
 speech_service = SpeechService()
\ No newline at end of file
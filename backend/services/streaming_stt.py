@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+import numpy as np
+from config.settings import settings
+from services.admission import BULK, stage_limiters
+from services.audio_utils import decode_audio, WHISPER_SAMPLE_RATE
+from services.errors import ServiceBusyError
+from services.metrics import observe_payload, stage_timer
+from services.single_flight import SingleFlight, content_key
+from services.speech_service import speech_service
+from services.vad import detect_speech, join_transcripts, split_at_pauses
+
+logger = logging.getLogger(__name__)
+
+# 途中結果を送る関数: (確定済み + 未確定のテキスト, 確定済みのテキスト)
+PartialCallback = Callable[[str, str], Awaitable[None]]
+
+# 途中結果を更新する最小の音声の長さ（秒）
+_MIN_PARTIAL_SECONDS = 0.5
+
+# 同じ内容の最終結果の認識は1回の推論を共有する
+_final_flight = SingleFlight("stt_stream")
+
+class StreamingTranscription:
+    """
+    録音中に届く音声チャンクを蓄積しながら逐次認識する（1発話分）
+    
+    ローカルWhisperの場合、一定間隔でこれまでの音声をデコードし、未確定の部分だけを認識する。
+    末尾付近のセグメントは続きの音声で変わりうるため未確定のまま途中結果として返し、
+    それより前のセグメントは確定して以降の認識対象から外す。
+    録音の終了時には未確定の部分だけを認識すればよいため、最終結果をすぐに返せる。
+    
+    OpenAI STTの場合は途中結果を返さず、終了時に全体を認識する。
+    """
+    
+    def __init__(
+        self,
+        audio_format: str = "webm",
+        model_name: Optional[str] = None,
+        language: str = "ja",
+        on_partial: Optional[PartialCallback] = None
+    ):
+        self.audio_format = audio_format
+        self.model_name = model_name
+        self.language = language
+        self.on_partial = on_partial
+        
+        self._buffer = bytearray()
+        self._max_bytes = settings.stt_stream_max_audio_mb * 1024 * 1024
+        # 確定済みのテキストと、その音声の長さ（サンプル数）
+        self._committed: List[str] = []
+        self._committed_samples = 0
+        
+        self._update_task: Optional[asyncio.Task] = None
+        self._last_update_at = 0.0
+        self._last_update_bytes = 0
+    
+    @property
+    def streaming(self) -> bool:
+        """途中結果を返せる（ローカルWhisperを優先して使用している）かどうか"""
+        return speech_service.stt_provider == "local" and speech_service.whisper is not None
+    
+    @property
+    def committed_text(self) -> str:
+        return "".join(self._committed)
+    
+    def append(self, chunk: bytes):
+        """
+        音声チャンクを追加し、必要であれば途中結果の更新をバックグラウンドで開始
+        
+        Raises:
+            ValueError: 1発話の音声の上限を超えた場合
+        """
+        if len(self._buffer) + len(chunk) > self._max_bytes:
+            raise ValueError(f"Audio exceeds {settings.stt_stream_max_audio_mb}MB")
+        self._buffer.extend(chunk)
+        
+        if self.streaming and self._should_update():
+            self._last_update_at = time.monotonic()
+            self._last_update_bytes = len(self._buffer)
+            self._update_task = asyncio.create_task(self._update())
+    
+    def _should_update(self) -> bool:
+        if self._update_task is not None and not self._update_task.done():
+            return False
+        return time.monotonic() - self._last_update_at >= settings.stt_stream_interval_seconds
+    
+    async def _update(self):
+        """これまでの音声で途中結果を更新（失敗しても最終結果には影響しない）"""
+        try:
+            # 録音途中のコンテナは末尾が欠けているため、デコードできた範囲だけを使う
+            audio = await asyncio.to_thread(decode_audio, bytes(self._buffer[:self._last_update_bytes]))
+            pending = audio[self._committed_samples:]
+            if len(pending) < WHISPER_SAMPLE_RATE * _MIN_PARTIAL_SECONDS:
+                return
+            
+            # 途中結果は最終結果の認識より後回しにする（待ち行列がいっぱいの場合は更新しない）
+            async with stage_limiters["stt"].slot(BULK):
+                segments = await speech_service.whisper.transcribe_segments(
+                    pending, self.language, self.model_name, self.committed_text or None
+                )
+            tentative = self._commit(segments, len(pending) / WHISPER_SAMPLE_RATE)
+            
+            if self.on_partial is not None:
+                committed = self.committed_text
+                await self.on_partial((committed + tentative).strip(), committed.strip())
+        except ServiceBusyError:
+            logger.info("Skipped partial transcription: speech recognition is busy")
+        except Exception as e:
+            logger.warning(f"Partial transcription failed: {str(e)}")
+    
+    def _commit(self, segments, duration: float) -> str:
+        """
+        末尾以外のセグメントを確定し、未確定のテキストを返す
+        
+        未確定の音声がウィンドウの長さを超えた場合は、末尾付近のセグメントも区切りまで確定する。
+        """
+        over_window = duration > settings.stt_stream_window_seconds
+        commit_count = 0
+        for index, (_, end, _) in enumerate(segments):
+            is_last = index == len(segments) - 1
+            if over_window and not is_last:
+                commit_count = index + 1
+            elif not is_last and end <= duration - settings.stt_stream_holdback_seconds:
+                commit_count = index + 1
+            else:
+                break
+        # 区切りのない長い発話は、認識のコストが際限なく増えないよう全体を確定する
+        if over_window and commit_count == 0 and segments:
+            commit_count = len(segments)
+        
+        if commit_count:
+            commit_end = min(segments[commit_count - 1][1], duration)
+            self._committed.extend(text for _, _, text in segments[:commit_count])
+            self._committed_samples += int(commit_end * WHISPER_SAMPLE_RATE)
+        return "".join(text for _, _, text in segments[commit_count:])
+    
+    async def finalize(self) -> str:
+        """録音の終了後に最終的な認識結果を返す"""
+        if not self._buffer:
+            raise ValueError("No audio received")
+        
+        if not self.streaming:
+            return await speech_service.transcribe(bytes(self._buffer), self.audio_format, self.model_name)
+        
+        observe_payload("in", "audio", len(self._buffer))
+        # 実行中の途中結果の更新は、確定した部分を引き継ぐために完了を待つ
+        if self._update_task is not None:
+            await self._update_task
+        
+        with stage_timer("stt", "local_stream"):
+            audio = await asyncio.to_thread(decode_audio, bytes(self._buffer))
+            pending = audio[self._committed_samples:]
+            # 非ストリーミングの認識と同様に、無音を除いた発話部分だけを STT の同時実行数の制限の中で認識する
+            chunks = self._speech_chunks(pending)
+            tentative = ""
+            if chunks:
+                key = content_key("local_stream", self.language, self.model_name, self.committed_text, pending.tobytes())
+                tentative = await _final_flight.do(
+                    key,
+                    lambda: stage_limiters["stt"].run(lambda: self._recognize(chunks))
+                )
+        
+        text = (self.committed_text + tentative).strip()
+        logger.info(f"Streaming transcription finished: {text[:50]}...")
+        return text
+    
+    def _speech_chunks(self, audio: np.ndarray) -> List[np.ndarray]:
+        """未確定の音声から無音を除いた波形を返す（発話がない場合は空のリスト）"""
+        if len(audio) == 0:
+            return []
+        if not settings.vad_enabled:
+            return [audio]
+        with stage_timer("vad", "energy"):
+            regions = detect_speech(audio)
+            if not regions:
+                return []
+            return split_at_pauses(audio, regions, int(settings.vad_split_seconds * WHISPER_SAMPLE_RATE))
+    
+    async def _recognize(self, chunks: List[np.ndarray]) -> str:
+        texts = []
+        for chunk in chunks:
+            segments = await speech_service.whisper.transcribe_segments(
+                chunk, self.language, self.model_name, self.committed_text or None
+            )
+            texts.append("".join(text for _, _, text in segments))
+        return join_transcripts(texts)
+    
+    def cancel(self):
+        """途中結果の更新を中止"""
+        if self._update_task is not None:
+            self._update_task.cancel()
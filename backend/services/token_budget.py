@@ -0,0 +1,69 @@
+import logging
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# メッセージごとにかかるロール等のオーバーヘッド（トークン）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+@lru_cache(maxsize=None)
+def _tiktoken_encoding(model: str):
+    """tiktokenがインストールされていればモデルに対応するエンコーディングを返す"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def estimate_tokens(text: str, model: str = "") -> int:
+    """
+    テキストのトークン数を見積もる
+    
+    tiktokenが利用できる場合はそれを使い、ない場合は
+    日本語等の全角文字を1文字1トークン、それ以外を4文字1トークンとして概算する。
+    """
+    encoding = _tiktoken_encoding(model) if model.startswith("gpt") else None
+    if encoding is not None:
+        return len(encoding.encode(text))
+    
+    wide = sum(1 for char in text if ord(char) > 0x2E7F)
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+def message_tokens(message: Dict[str, str], model: str = "") -> int:
+    """1メッセージのトークン数を見積もる"""
+    return estimate_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+
+def trim_to_budget(
+    messages: List[Dict[str, str]],
+    budget: int,
+    model: str = "",
+    max_messages: int = 0
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    新しいメッセージから順に予算内に収まる分だけ残す
+    
+    ユーザー発話と応答の組を崩さないよう、古い側から2件ずつ切り捨てる。
+    
+    Args:
+        messages: 会話履歴（古い順）
+        budget: 残す履歴のトークン数の上限
+        model: トークン数の見積もりに使うモデル名
+        max_messages: 残すメッセージ数の上限（0の場合は無制限）
+    
+    Returns:
+        (残すメッセージ, 切り捨てたメッセージ)
+    """
+    total = sum(message_tokens(message, model) for message in messages)
+    start = 0
+    while start < len(messages) and (
+        total > budget or (max_messages and len(messages) - start > max_messages)
+    ):
+        step = 2 if start + 1 < len(messages) else 1
+        total -= sum(message_tokens(message, model) for message in messages[start:start + step])
+        start += step
+    return messages[start:], messages[:start]
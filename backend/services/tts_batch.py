@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from config.settings import settings
+from services.errors import ServiceBusyError
+from services.speech_service import speech_service
+from services.tts_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# (テキスト, 音声, 速度, 出力フォーマット)
+BatchItem = Tuple[str, Optional[str], float, Optional[str]]
+
+# (同じ内容の項目のインデックス, (音声データ, フォーマット) または None, エラー または None)
+BatchResult = Tuple[List[int], Optional[Tuple[bytes, str]], Optional[Exception]]
+
+async def synthesize_batch(
+    items: List[BatchItem],
+    concurrency: Optional[int] = None
+) -> AsyncIterator[BatchResult]:
+    """
+    複数のテキストを並列数を制限して音声に変換し、完了した順に結果を返す
+    
+    内容（正規化したテキスト、音声、速度、フォーマット）が同じ項目は1回だけ合成し、
+    結果をまとめて返す。TTSの枠が空かない場合（ServiceBusyError）は Retry-After だけ
+    待ってから再試行し、それでも失敗した項目はエラーとして返す。
+    
+    Args:
+        items: 合成する項目のリスト
+        concurrency: 同時に合成する数（省略時は設定値）
+    """
+    groups: Dict[Tuple[str, str, float, str], List[int]] = {}
+    for index, (text, voice, speed, output_format) in enumerate(items):
+        key = (
+            normalize_text(text),
+            voice or settings.openai_tts_voice,
+            speed,
+            (output_format or "").lower()
+        )
+        groups.setdefault(key, []).append(index)
+    
+    semaphore = asyncio.Semaphore(concurrency or settings.tts_batch_concurrency)
+    
+    async def run(indices: List[int]) -> BatchResult:
+        text, voice, speed, output_format = items[indices[0]]
+        async with semaphore:
+            try:
+                if not text.strip():
+                    raise ValueError("Empty text")
+                attempt = 0
+                while True:
+                    try:
+                        audio = await speech_service.synthesize(text, voice, speed, output_format)
+                        return indices, audio, None
+                    except ServiceBusyError as e:
+                        if attempt >= settings.tts_batch_busy_retries:
+                            raise
+                        attempt += 1
+                        await asyncio.sleep(e.retry_after or 1)
+            except Exception as e:
+                logger.warning(f"Batch text to speech item {indices[0]} failed: {str(e)}")
+                return indices, None, e
+    
+    tasks = [asyncio.create_task(run(indices)) for indices in groups.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # クライアントの切断等で途中で終了した場合は残りをキャンセルする
+        for task in tasks:
+            task.cancel()
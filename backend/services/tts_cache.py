@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config.settings import settings
+from services.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化（NFKC、前後の空白除去、連続空白の統一）"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+class TTSCache:
+    """
+    合成済み音声のコンテンツアドレス型キャッシュ
+    
+    (プロバイダー, モデル, 音声, 速度, 正規化テキスト) のハッシュをキーとし、
+    メモリ上のLRU（合計バイト数で上限）と、任意のディスク層の2段で保持する。
+    ディスク層のファイルはパスを返して、メモリに読み込まずにそのまま配信できる。
+    """
+    
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 0
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        
+        self._memory: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        # ディスク層の索引: キー -> (パス, フォーマット, サイズ)
+        self._disk: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        
+        if self.disk_dir:
+            self._load_disk_index()
+    
+    @staticmethod
+    def make_key(provider: str, model: str, voice: str, speed: float, text: str) -> str:
+        """キャッシュキー（SHA-256）を作成"""
+        raw = "\x1f".join([provider, model, voice or "", f"{speed:.2f}", normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """キャッシュから音声データとフォーマットを取得（ディスク層でヒットした場合はメモリに昇格）"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry
+        
+        disk_entry = self._touch_disk(key)
+        if disk_entry is not None:
+            path, audio_format, _ = disk_entry
+            try:
+                data = await asyncio.to_thread(_read_file, path)
+            except OSError:
+                self._forget_disk(key)
+            else:
+                self.stats["disk_hits"] += 1
+                self._put_memory(key, data, audio_format)
+                return data, audio_format
+        
+        self.stats["misses"] += 1
+        return None
+    
+    def get_path(self, key: str) -> Optional[Tuple[str, str]]:
+        """ディスク層にある場合はファイルパスとフォーマットを返す"""
+        disk_entry = self._touch_disk(key)
+        if disk_entry is None:
+            return None
+        path, audio_format, _ = disk_entry
+        if not os.path.exists(path):
+            self._forget_disk(key)
+            return None
+        self.stats["disk_hits"] += 1
+        return path, audio_format
+    
+    async def put(self, key: str, data: bytes, audio_format: str):
+        """音声データをキャッシュに保存"""
+        self._put_memory(key, data, audio_format)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data, audio_format)
+            except OSError as e:
+                logger.warning(f"Failed to write TTS cache file: {str(e)}")
+    
+    def _put_memory(self, key: str, data: bytes, audio_format: str):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[0])
+        self._memory[key] = (data, audio_format)
+        self._memory_bytes += len(data)
+        
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["memory_evictions"] += 1
+    
+    def _path_for(self, key: str, audio_format: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.{audio_format}")
+    
+    def _write_disk(self, key: str, data: bytes, audio_format: str):
+        path = self._path_for(key, audio_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルが配信されないよう、一時ファイルに書いてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)[2]
+            self._disk[key] = (path, audio_format, len(data))
+            self._disk_bytes += len(data)
+            
+            while self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                _, (evicted_path, _, size) = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.stats["disk_evictions"] += 1
+                try:
+                    os.unlink(evicted_path)
+                except OSError:
+                    pass
+    
+    def _touch_disk(self, key: str) -> Optional[Tuple[str, str, int]]:
+        with self._disk_lock:
+            entry = self._disk.get(key)
+            if entry is not None:
+                self._disk.move_to_end(key)
+            return entry
+    
+    def _forget_disk(self, key: str):
+        with self._disk_lock:
+            entry = self._disk.pop(key, None)
+            if entry is not None:
+                self._disk_bytes -= entry[2]
+    
+    def _load_disk_index(self):
+        """起動時に既存のキャッシュファイルを古い順に索引へ登録"""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                key, _, audio_format = name.partition(".")
+                if len(key) != 64 or not audio_format or audio_format.endswith("tmp"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, key, path, audio_format, stat.st_size))
+        
+        for _, key, path, audio_format, size in sorted(entries):
+            self._disk[key] = (path, audio_format, size)
+            self._disk_bytes += size
+        logger.info(f"TTS disk cache loaded: {len(self._disk)} files, {self._disk_bytes} bytes")
+    
+    def snapshot(self) -> Dict[str, int]:
+        """現在の統計情報を返す"""
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+# シングルトンインスタンス
+tts_cache = TTSCache(
+    max_memory_bytes=settings.tts_cache_max_memory_mb * 1024 * 1024,
+    disk_dir=settings.tts_cache_dir,
+    max_disk_bytes=settings.tts_cache_max_disk_mb * 1024 * 1024
+)
+
+tts_cache_events = registry.register(Counter(
+    "tts_cache_events",
+    "TTS cache hits, misses and evictions by tier since startup.",
+    ("event", "tier")
+))
+tts_cache_entries = registry.register(Gauge(
+    "tts_cache_entries",
+    "Audio clips held in the TTS cache.",
+    ("tier",)
+))
+tts_cache_bytes = registry.register(Gauge(
+    "tts_cache_bytes",
+    "Bytes held in the TTS cache.",
+    ("tier",)
+))
+tts_cache_hit_ratio = registry.register(Gauge(
+    "tts_cache_hit_ratio",
+    "Fraction of TTS cache lookups served from either tier."
+))
+
+def _collect_tts_cache_metrics():
+    stats = tts_cache.snapshot()
+    for tier in ("memory", "disk"):
+        tts_cache_events.set_total(stats[f"{tier}_hits"], event="hit", tier=tier)
+        tts_cache_events.set_total(stats[f"{tier}_evictions"], event="eviction", tier=tier)
+        tts_cache_entries.set(stats[f"{tier}_entries"], tier=tier)
+        tts_cache_bytes.set(stats[f"{tier}_bytes"], tier=tier)
+    tts_cache_events.set_total(stats["misses"], event="miss", tier="all")
+    
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    lookups = hits + stats["misses"]
+    tts_cache_hit_ratio.set(hits / lookups if lookups else 0.0)
+
+registry.add_collector(_collect_tts_cache_metrics)
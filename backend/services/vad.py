@@ -0,0 +1,103 @@
+from typing import List, Tuple
+import numpy as np
+from config.settings import settings
+from services.audio_utils import WHISPER_SAMPLE_RATE
+
+# 音声区間: (開始サンプル, 終了サンプル)
+Region = Tuple[int, int]
+
+# エネルギーを計算するフレームの長さ（ミリ秒）
+FRAME_MS = 30
+# 推定した背景雑音からどれだけ大きいフレームを発話とみなすか（dB）
+NOISE_MARGIN_DB = 10.0
+# 発話の最大音量からこれ以上小さいフレームは発話とみなさない（dB）
+PEAK_RANGE_DB = 35.0
+
+def frame_energies(audio: np.ndarray, sample_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """フレームごとのRMSエネルギー（dBFS）を返す"""
+    frame_length = sample_rate * FRAME_MS // 1000
+    frame_count = len(audio) // frame_length
+    if frame_count == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def detect_speech(audio: np.ndarray, sample_rate: int = WHISPER_SAMPLE_RATE) -> List[Region]:
+    """
+    エネルギーに基づいて発話区間を検出する
+    
+    しきい値は固定の下限（vad_threshold_db）と、音声の静かな部分から推定した
+    背景雑音 + NOISE_MARGIN_DB の大きい方とする。短い途切れは1つの区間にまとめ、
+    短すぎる区間（クリック音等）は除外し、前後に余白を付ける。
+    
+    Returns:
+        発話区間のリスト（発話がない場合は空）
+    """
+    energies = frame_energies(audio, sample_rate)
+    if len(energies) == 0:
+        return []
+    
+    noise_floor = float(np.percentile(energies, 10))
+    peak = float(energies.max())
+    threshold = max(settings.vad_threshold_db, min(noise_floor + NOISE_MARGIN_DB, peak - PEAK_RANGE_DB))
+    voiced = energies > threshold
+    if not voiced.any():
+        return []
+    
+    frame_length = sample_rate * FRAME_MS // 1000
+    min_silence_frames = max(1, settings.vad_min_silence_ms // FRAME_MS)
+    min_speech_frames = max(1, settings.vad_min_speech_ms // FRAME_MS)
+    padding = sample_rate * settings.vad_padding_ms // 1000
+    
+    # 発話フレームの連続区間を求める
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    # 短い途切れを挟む区間を結合する
+    merged: List[List[int]] = []
+    for start, end in zip(starts, ends):
+        if merged and start - merged[-1][1] < min_silence_frames:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech_frames:
+            continue
+        regions.append((
+            int(max(0, start * frame_length - padding)),
+            int(min(len(audio), end * frame_length + padding))
+        ))
+    return regions
+
+def split_at_pauses(audio: np.ndarray, regions: List[Region], max_chunk_samples: int) -> List[np.ndarray]:
+    """
+    発話区間を max_chunk_samples 以内のまとまりに分け、前後の無音を除いた波形を返す
+    
+    まとまりの境界は発話区間の間（無音）になるため、単語の途中で切れることはない。
+    1つの発話区間が上限を超える場合はその区間をそのまま1つのまとまりとする。
+    """
+    chunks = []
+    group_start, group_end = regions[0]
+    for start, end in regions[1:]:
+        if end - group_start > max_chunk_samples:
+            chunks.append(audio[group_start:group_end])
+            group_start = start
+        group_end = end
+    chunks.append(audio[group_start:group_end])
+    return chunks
+
+def join_transcripts(texts: List[str]) -> str:
+    """分割して認識したテキストを結合（日本語等の全角文字の間には空白を入れない）"""
+    result = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if result and (ord(result[-1]) < 0x2E80 or ord(text[0]) < 0x2E80):
+            result += " "
+        result += text
+    return result
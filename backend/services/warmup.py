@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from services.metrics import Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+warmup_duration = registry.register(Gauge(
+    "warmup_duration_seconds",
+    "Time spent warming up each component at startup.",
+    ("component",)
+))
+app_ready = registry.register(Gauge(
+    "app_ready",
+    "1 when every startup warm-up has finished successfully."
+))
+
+class StartupWarmUp:
+    """
+    起動時のウォームアップ（SDKのインポート、モデルのロード等）をバックグラウンドで実行し、状態を保持する
+    
+    サーバーはウォームアップの完了を待たずにリクエストを受け付ける（未完了のコンポーネントは
+    初回利用時にロードされる）。/health/ready はすべてのウォームアップが成功するまで503を返す。
+    """
+    
+    def __init__(self):
+        # コンポーネント名 -> 状態（pending, ready, failed）
+        self._states: Dict[str, str] = {}
+        self._durations: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._started_at = time.monotonic()
+        self._ready_at: float = 0.0
+    
+    def start(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        """コンポーネントのウォームアップをバックグラウンドで開始"""
+        self._states[name] = "pending"
+        self._update_ready()
+        self._tasks.append(asyncio.create_task(self._run(name, factory)))
+    
+    async def _run(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        start = time.perf_counter()
+        try:
+            await factory()
+            self._states[name] = "ready"
+        except Exception as e:
+            logger.error(f"Warm-up failed ({name}): {str(e)}")
+            self._states[name] = "failed"
+        self._durations[name] = time.perf_counter() - start
+        warmup_duration.set(self._durations[name], component=name)
+        logger.info(f"Warm-up {self._states[name]} ({name}): {self._durations[name]:.2f}s")
+        self._update_ready()
+    
+    def _update_ready(self):
+        if self.ready and not self._ready_at:
+            self._ready_at = time.monotonic()
+            logger.info(f"Application ready in {self._ready_at - self._started_at:.2f}s")
+        app_ready.set(1 if self.ready else 0)
+    
+    @property
+    def ready(self) -> bool:
+        return all(state == "ready" for state in self._states.values())
+    
+    def status(self) -> Dict[str, Any]:
+        """/health/ready で返す状態"""
+        return {
+            "ready": self.ready,
+            "readySeconds": round(self._ready_at - self._started_at, 3) if self._ready_at else None,
+            "components": {
+                name: {"status": state, "seconds": round(self._durations.get(name, 0.0), 3)}
+                for name, state in self._states.items()
+            },
+        }
+    
+    async def wait(self):
+        """すべてのウォームアップの完了を待つ"""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def cancel(self):
+        """未完了のウォームアップを中止"""
+        for task in self._tasks:
+            task.cancel()
+
+# シングルトンインスタンス
+startup_warmup = StartupWarmUp()
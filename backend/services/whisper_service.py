@@ -1,95 +1,640 @@
-import whisper
+import asyncio
 import base64
-import tempfile
-import os
+import importlib
 import logging
-from typing import Optional
-import torch
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
 import numpy as np
+from config.settings import settings
+from services.audio_utils import decode_audio, WHISPER_SAMPLE_RATE
+from services.errors import ServiceBusyError
+from services.metrics import Gauge, registry, stage_timer
 
 logger = logging.getLogger(__name__)
 
-class WhisperService:
-    def __init__(self):
-        self.model = None
-        self.model_name = "base"  # base model as default for good balance of speed and accuracy
-        self.device = None
-        self._initialize_model()
+# Whisperが1回に処理する音声の長さ（30秒）
+N_SAMPLES = 30 * WHISPER_SAMPLE_RATE
+
+def _resolve_device(device: str) -> str:
+    """デバイスの選択（autoの場合、CUDA利用可能ならCUDA、そうでなければCPU）"""
+    if device == "auto":
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+def _model_memory_bytes(model) -> int:
+    """モデルのパラメータとバッファが占めるメモリ量を見積もる"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+def _beam_size() -> Optional[int]:
+    """ビームサーチの幅（1以下の場合は貪欲法としてNone）"""
+    return settings.whisper_beam_size if settings.whisper_beam_size > 1 else None
+
+_torch_threads_configured = False
+
+def _configure_torch_threads():
+    """推論に使うtorchのスレッド数を設定（0の場合はtorchの既定値のまま）"""
+    global _torch_threads_configured
+    if _torch_threads_configured:
+        return
+    _torch_threads_configured = True
     
-    def _initialize_model(self):
-        """Whisperモデルの初期化"""
+    import torch
+    if settings.whisper_intra_op_threads > 0:
+        torch.set_num_threads(settings.whisper_intra_op_threads)
+    if settings.whisper_inter_op_threads > 0:
         try:
-            # デバイスの選択（CUDA利用可能ならCUDA、そうでなければCPU）
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Using device: {self.device}")
+            torch.set_num_interop_threads(settings.whisper_inter_op_threads)
+        except RuntimeError as e:
+            # 並列処理の開始後は変更できない
+            logger.warning(f"Could not set torch inter-op threads: {str(e)}")
+
+class STTEngine(ABC):
+    """
+    ローカル音声認識エンジンのインターフェース
+    
+    モデルのロードと認識を提供する。ロードしたモデルは WhisperModelRegistry が保持し、
+    認識は推論スレッドから呼び出される。パッケージのインポートは初回利用時まで行わない。
+    """
+    
+    name = ""
+    module = ""  # 必要なパッケージ
+    # ロードしたモデルを fork したプロセスでそのまま使えるか（serve.py が fork 前にロードするか）
+    fork_safe = False
+    
+    @property
+    def available(self) -> bool:
+        return find_spec(self.module) is not None
+    
+    def import_module(self):
+        return importlib.import_module(self.module)
+    
+    @abstractmethod
+    def available_models(self) -> List[str]:
+        """指定できるモデル名"""
+    
+    def resolve_device(self, device: str) -> str:
+        return _resolve_device(device)
+    
+    @abstractmethod
+    def load(self, model_name: str, device: str) -> Tuple[object, int]:
+        """モデルをロードし、(モデル, 推定メモリ量) を返す"""
+    
+    @abstractmethod
+    def transcribe(
+        self,
+        model,
+        audio: np.ndarray,
+        language: str,
+        device: str,
+        initial_prompt: Optional[str] = None,
+        condition_on_previous_text: bool = True
+    ) -> List[Tuple[float, float, str]]:
+        """16kHzのfloat32の波形を認識し、[(開始秒, 終了秒, テキスト)] を返す"""
+    
+    def decode_batch(self, model, audios: List[np.ndarray], language: str, device: str) -> List[str]:
+        """30秒以内の複数の音声を認識（まとめて推論できないエンジンでは1件ずつ処理する）"""
+        return [
+            "".join(text for _, _, text in self.transcribe(model, audio, language, device)).strip()
+            for audio in audios
+        ]
+
+class OpenAIWhisperEngine(STTEngine):
+    """openai-whisper（PyTorch、CUDAの場合はFP16）"""
+    
+    name = "openai-whisper"
+    module = "whisper"
+    fork_safe = True
+    
+    def available_models(self) -> List[str]:
+        return self.import_module().available_models()
+    
+    def load(self, model_name: str, device: str) -> Tuple[object, int]:
+        import whisper
+        _configure_torch_threads()
+        model = whisper.load_model(model_name, device=device)
+        return model, _model_memory_bytes(model)
+    
+    def transcribe(
+        self,
+        model,
+        audio: np.ndarray,
+        language: str,
+        device: str,
+        initial_prompt: Optional[str] = None,
+        condition_on_previous_text: bool = True
+    ) -> List[Tuple[float, float, str]]:
+        result = model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",  # translate ではなく transcribe を使用
+            fp16=device == "cuda",  # CUDAの場合はFP16を使用
+            beam_size=_beam_size(),
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=condition_on_previous_text
+        )
+        return [(segment["start"], segment["end"], segment["text"]) for segment in result["segments"]]
+    
+    def decode_batch(self, model, audios: List[np.ndarray], language: str, device: str) -> List[str]:
+        """1回のデコードでまとめて認識"""
+        import torch
+        import whisper
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(torch.from_numpy(audio)),
+                n_mels=model.dims.n_mels
+            )
+            for audio in audios
+        ]).to(device)
+        
+        options = whisper.DecodingOptions(
+            language=language,
+            task="transcribe",
+            fp16=device == "cuda",
+            beam_size=_beam_size(),
+            without_timestamps=True
+        )
+        results = whisper.decode(model, mels, options)
+        return [result.text.strip() for result in results]
+
+class QuantizedWhisperEngine(OpenAIWhisperEngine):
+    """
+    openai-whisper のLinear層をPyTorchの動的量子化（int8）に置き換えたもの
+    
+    CPU専用。重みのメモリが約1/4になり、行列積がint8で実行される。
+    """
+    
+    name = "torch-int8"
+    
+    def resolve_device(self, device: str) -> str:
+        if device == "cuda":
+            logger.warning("torch-int8 Whisper backend runs on CPU only, ignoring WHISPER_DEVICE=cuda")
+        return "cpu"
+    
+    def load(self, model_name: str, device: str) -> Tuple[object, int]:
+        import torch
+        import whisper
+        _configure_torch_threads()
+        model = whisper.load_model(model_name, device="cpu")
+        # whisperのLinearは重みの型を入力に合わせるだけのサブクラスのため、量子化の対象になるよう nn.Linear として扱う
+        for module in model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        
+        # 量子化したLinearの重みはパラメータに含まれないため別に数える
+        size = _model_memory_bytes(model)
+        for module in model.modules():
+            if hasattr(module, "_packed_params"):
+                for tensor in (module.weight(), module.bias()):
+                    if tensor is not None:
+                        size += tensor.numel() * tensor.element_size()
+        return model, size
+
+class FasterWhisperEngine(STTEngine):
+    """faster-whisper（CTranslate2、WHISPER_COMPUTE_TYPE の精度で推論する）"""
+    
+    name = "faster-whisper"
+    module = "faster_whisper"
+    fork_safe = False  # CTranslate2 はロード時に推論スレッドを起動するため、fork 後のプロセスでは使えない
+    
+    def available_models(self) -> List[str]:
+        return self.import_module().available_models()
+    
+    def resolve_device(self, device: str) -> str:
+        if device == "auto":
+            import ctranslate2
+            return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        return device
+    
+    def load(self, model_name: str, device: str) -> Tuple[object, int]:
+        from faster_whisper import WhisperModel
+        from faster_whisper.utils import download_model
+        path = download_model(model_name)
+        model = WhisperModel(
+            path,
+            device=device,
+            compute_type=settings.whisper_compute_type,
+            cpu_threads=settings.whisper_intra_op_threads,
+            # 推論スレッドごとに並列に認識できるようにする
+            num_workers=max(1, settings.whisper_workers)
+        )
+        # 変換済みモデルのファイルサイズを上限の目安とする（int8では実際はこれより小さい）
+        return model, os.path.getsize(os.path.join(path, "model.bin"))
+    
+    def transcribe(
+        self,
+        model,
+        audio: np.ndarray,
+        language: str,
+        device: str,
+        initial_prompt: Optional[str] = None,
+        condition_on_previous_text: bool = True
+    ) -> List[Tuple[float, float, str]]:
+        segments, _ = model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",
+            beam_size=max(1, settings.whisper_beam_size),
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=condition_on_previous_text
+        )
+        # セグメントは反復した時点で認識されるため、推論スレッド内ですべて取り出す
+        return [(segment.start, segment.end, segment.text) for segment in segments]
+
+STT_ENGINES = {
+    engine.name: engine for engine in (OpenAIWhisperEngine, QuantizedWhisperEngine, FasterWhisperEngine)
+}
+
+def create_stt_engine(name: str) -> STTEngine:
+    if name not in STT_ENGINES:
+        raise ValueError(f"Whisper backend must be one of {list(STT_ENGINES)}")
+    return STT_ENGINES[name]()
+
+class WhisperModelRegistry:
+    """
+    Whisperモデルを必要になった時点でロードし、LRUで保持するレジストリ
+    
+    保持するモデル数とメモリ量の上限を超えると、最も長く使われていないモデルを解放する。
+    推論中のモデルは呼び出し側が参照を保持しているため、解放されても処理は継続できる。
+    """
+    
+    def __init__(self, engine: STTEngine, device: str, max_loaded_models: int, max_memory_mb: int):
+        self.engine = engine
+        self._device_setting = device
+        self._device: Optional[str] = None
+        self.max_loaded_models = max(1, max_loaded_models)
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self._models: "OrderedDict[str, Tuple[object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+    
+    @property
+    def device(self) -> str:
+        # torch等のインポートが必要なため、初めて使う時点で決める
+        if self._device is None:
+            self._device = self.engine.resolve_device(self._device_setting)
+            logger.info(f"Using device: {self._device}")
+        return self._device
+    
+    def get(self, model_name: str):
+        """モデルを取得（未ロードならロードする。推論スレッドから呼び出す）"""
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name][0]
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        
+        # 同じモデルを複数スレッドが同時にロードしないようにする
+        with load_lock:
+            with self._lock:
+                if model_name in self._models:
+                    self._models.move_to_end(model_name)
+                    return self._models[model_name][0]
             
-            # モデルのロード
-            logger.info(f"Loading Whisper model: {self.model_name}")
-            self.model = whisper.load_model(self.model_name, device=self.device)
-            logger.info("Whisper model loaded successfully")
+            logger.info(f"Loading Whisper model: {model_name} ({self.engine.name}) on {self.device}")
+            model, size = self.engine.load(model_name, self.device)
+            logger.info(f"Whisper model loaded successfully: {model_name} ({size / 1024 / 1024:.0f} MB)")
             
-        except Exception as e:
-            logger.error(f"Failed to initialize Whisper model: {str(e)}")
-            self.model = None
+            with self._lock:
+                self._models[model_name] = (model, size)
+                self._evict(keep=model_name)
+            return model
+    
+    def _evict(self, keep: str):
+        """上限を超えている間、最も長く使われていないモデルを解放"""
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_loaded_models
+            or self.memory_bytes() > self.max_memory_bytes
+        ):
+            model_name = next(iter(self._models))
+            if model_name == keep:
+                break
+            del self._models[model_name]
+            logger.info(f"Evicted Whisper model: {model_name}")
+    
+    def memory_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+    
+    def loaded_models(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+class WhisperService:
+    def __init__(self):
+        self.model_name = settings.whisper_model  # base model as default for good balance of speed and accuracy
+        # 認識エンジンのパッケージがインストールされているか（インポートは初回利用時まで行わない）
+        self.engine = create_stt_engine(settings.whisper_backend)
+        self.available = self.engine.available
+        self._available_models: Optional[List[str]] = None
+        
+        # モデルは初回利用時（またはウォームアップ時）にロードする
+        self.registry = WhisperModelRegistry(
+            self.engine,
+            settings.whisper_device,
+            settings.whisper_max_loaded_models,
+            settings.whisper_max_memory_mb
+        )
+        
+        # 推論はイベントループを止めないよう専用スレッドで実行する
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.whisper_workers,
+            thread_name_prefix="whisper"
+        )
+        # 実行中 + 待機中のリクエスト数（上限を超えたら503で押し返す）
+        self._pending = 0
+        self._max_pending = settings.whisper_workers + settings.whisper_queue_size
+        
+        # バッチ推論の待ち行列: (音声, 言語, モデル名, 結果を受け取るFuture)
+        self._batch: List[Tuple[np.ndarray, str, str, asyncio.Future]] = []
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+    
+    @property
+    def device(self) -> str:
+        return self.registry.device
+    
+    async def _resolve_model_name(self, model_name: Optional[str]) -> str:
+        # エンジンのパッケージ（とtorch）のインポートは数秒かかるため、イベントループを止めずに行う
+        if self._available_models is None:
+            self._available_models = await asyncio.to_thread(self.engine.available_models)
+        model_name = model_name or self.model_name
+        available_models = self._available_models
+        if model_name not in available_models:
+            raise ValueError(f"Model must be one of {available_models}")
+        return model_name
     
     async def speech_to_text(
-        self, 
-        audio_base64: str, 
+        self,
+        audio_base64: str,
         audio_format: str = "webm",
-        language: str = "ja"
+        language: str = "ja",
+        model_name: Optional[str] = None
     ) -> str:
         """
-        音声データをテキストに変換
+        Base64エンコードされた音声データをテキストに変換
         
         Args:
             audio_base64: Base64エンコードされた音声データ
             audio_format: 音声フォーマット（webm, mp3, wav等）
             language: 言語コード（デフォルトは日本語）
+            model_name: 使用するモデル（省略時はデフォルトモデル）
+        
+        Returns:
+            認識されたテキスト
+        """
+        audio_data = base64.b64decode(audio_base64)
+        return await self.transcribe(audio_data, audio_format, language, model_name)
+    
+    async def transcribe(
+        self,
+        audio_data: bytes,
+        audio_format: str = "webm",
+        language: str = "ja",
+        model_name: Optional[str] = None
+    ) -> str:
+        """
+        音声データ（バイナリ）をテキストに変換
+        
+        Args:
+            audio_data: 音声データ
+            audio_format: 音声フォーマット（webm, mp3, wav等）
+            language: 言語コード（デフォルトは日本語）
+            model_name: 使用するモデル（省略時はデフォルトモデル）
         
         Returns:
             認識されたテキスト
         """
-        if self.model is None:
-            raise Exception("Whisper model is not initialized")
+        model_name = await self._resolve_model_name(model_name)
+        self._check_capacity()
         
+        self._pending += 1
         try:
-            # Base64デコード
-            audio_data = base64.b64decode(audio_base64)
-            
-            # 一時ファイルに保存
-            with tempfile.NamedTemporaryFile(
-                delete=False, 
-                suffix=f".{audio_format}"
-            ) as tmp_file:
-                tmp_file.write(audio_data)
-                tmp_file_path = tmp_file.name
+            # 一時ファイルを使わず、メモリ上でfloat32の波形にデコード（ffmpegの待ちで推論スレッドを塞がない）
+            with stage_timer("decode", "local"):
+                audio = await asyncio.to_thread(decode_audio, audio_data)
             
-            try:
-                # Whisperで音声認識
-                result = self.model.transcribe(
-                    tmp_file_path,
-                    language=language,
-                    task="transcribe",  # translate ではなく transcribe を使用
-                    fp16=self.device == "cuda"  # CUDAの場合はFP16を使用
-                )
-                
-                # 認識結果のテキストを返す
-                text = result["text"].strip()
-                logger.info(f"Transcription successful: {text[:50]}...")
-                return text
-                
-            finally:
-                # 一時ファイルを削除
-                if os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
-                    
+            text = await self._transcribe_waveform(audio, language, model_name)
+            logger.info(f"Transcription successful: {text[:50]}...")
+            return text
+        
+        except Exception as e:
+            logger.error(f"Error in Whisper speech-to-text: {str(e)}")
+            raise Exception(f"Failed to convert speech to text: {str(e)}")
+        finally:
+            self._pending -= 1
+    
+    async def transcribe_chunks(
+        self,
+        chunks: List[np.ndarray],
+        language: str = "ja",
+        model_name: Optional[str] = None
+    ) -> List[str]:
+        """
+        1つの録音を分割したデコード済みの波形をまとめて認識
+        
+        待ち行列の枠は録音ごとに1つだけ使い、各チャンクは推論スレッドで並列に処理する。
+        
+        Args:
+            chunks: 16kHzのfloat32の波形のリスト
+            language: 言語コード
+            model_name: 使用するモデル（省略時はデフォルトモデル）
+        
+        Returns:
+            チャンクごとの認識結果
+        """
+        model_name = await self._resolve_model_name(model_name)
+        self._check_capacity()
+        
+        self._pending += 1
+        try:
+            texts = await asyncio.gather(*(
+                self._transcribe_waveform(chunk, language, model_name) for chunk in chunks
+            ))
+            logger.info(f"Transcribed {len(chunks)} chunks")
+            return list(texts)
+        
         except Exception as e:
             logger.error(f"Error in Whisper speech-to-text: {str(e)}")
             raise Exception(f"Failed to convert speech to text: {str(e)}")
+        finally:
+            self._pending -= 1
+    
+    async def _transcribe_waveform(self, audio: np.ndarray, language: str, model_name: str) -> str:
+        # 短い音声はバッチ推論の待ち行列に入れる
+        if settings.whisper_batch_window_ms > 0 and len(audio) <= N_SAMPLES:
+            return await self._transcribe_batched(audio, language, model_name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._transcribe_sync, audio, language, model_name
+        )
+    
+    async def transcribe_segments(
+        self,
+        audio: np.ndarray,
+        language: str = "ja",
+        model_name: Optional[str] = None,
+        initial_prompt: Optional[str] = None
+    ) -> List[Tuple[float, float, str]]:
+        """
+        デコード済みの波形を認識し、セグメント単位の結果を返す（ストリーミング認識用）
+        
+        Args:
+            audio: 16kHzのfloat32の波形
+            language: 言語コード
+            model_name: 使用するモデル（省略時はデフォルトモデル）
+            initial_prompt: 直前までの確定済みテキスト（文脈として与える）
+        
+        Returns:
+            [(開始秒, 終了秒, テキスト)]
+        """
+        model_name = await self._resolve_model_name(model_name)
+        self._check_capacity()
+        
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                self._transcribe_segments_sync,
+                audio,
+                language,
+                model_name,
+                initial_prompt
+            )
+        finally:
+            self._pending -= 1
+    
+    def _check_capacity(self):
+        if self._pending >= self._max_pending:
+            raise ServiceBusyError(
+                "Local speech recognition is busy",
+                retry_after=settings.whisper_retry_after_seconds
+            )
+    
+    def _transcribe_segments_sync(
+        self,
+        audio: np.ndarray,
+        language: str,
+        model_name: str,
+        initial_prompt: Optional[str]
+    ) -> List[Tuple[float, float, str]]:
+        model = self.registry.get(model_name)
+        return self.engine.transcribe(
+            model,
+            audio,
+            language,
+            self.device,
+            initial_prompt=initial_prompt,
+            # 同じ音声を繰り返し認識するため、前のウィンドウの誤りを引きずらないようにする
+            condition_on_previous_text=False
+        )
+    
+    def _transcribe_sync(self, audio: np.ndarray, language: str, model_name: str) -> str:
+        """1件の音声を認識（推論スレッドで実行）"""
+        model = self.registry.get(model_name)
+        segments = self.engine.transcribe(model, audio, language, self.device)
+        
+        # 認識結果のテキストを返す
+        return "".join(text for _, _, text in segments).strip()
+    
+    def _decode_batch_sync(self, audios: List[np.ndarray], language: str, model_name: str) -> List[str]:
+        """30秒以内の複数の音声をまとめて認識（推論スレッドで実行）"""
+        model = self.registry.get(model_name)
+        return self.engine.decode_batch(model, audios, language, self.device)
+    
+    async def _transcribe_batched(self, audio: np.ndarray, language: str, model_name: str) -> str:
+        """バッチの待ち行列に追加し、まとめて推論された結果を待つ"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((audio, language, model_name, future))
+        
+        if len(self._batch) >= settings.whisper_max_batch_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(
+                settings.whisper_batch_window_ms / 1000,
+                self._flush_batch
+            )
+        
+        return await future
+    
+    def _flush_batch(self):
+        """待ち行列の音声を言語・モデルごとにまとめて推論スレッドへ投入"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, []
+        
+        groups = {}
+        for audio, language, model_name, future in batch:
+            groups.setdefault((language, model_name), []).append((audio, future))
+        
+        loop = asyncio.get_running_loop()
+        for (language, model_name), items in groups.items():
+            task = loop.run_in_executor(
+                self._executor,
+                self._decode_batch_sync,
+                [audio for audio, _ in items],
+                language,
+                model_name
+            )
+            task.add_done_callback(
+                lambda done, futures=[future for _, future in items]: _resolve_batch(done, futures)
+            )
+    
+    async def warm_up(self, model_names: Optional[List[str]] = None):
+        """
+        モデルを事前にロードし、無音で1回推論して初回リクエストの遅延をなくす
+        
+        Args:
+            model_names: ロードするモデル（省略時は設定の whisper_preload_models、未設定ならデフォルトモデル）
+        """
+        model_names = self._preload_model_names(model_names)
+        silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        for model_name in model_names:
+            model_name = await self._resolve_model_name(model_name)
+            await loop.run_in_executor(
+                self._executor, self._transcribe_sync, silence, "ja", model_name
+            )
+            logger.info(f"Whisper model warmed up: {model_name}")
+    
+    def preload(self, model_names: Optional[List[str]] = None):
+        """
+        モデルをこのプロセスにロードする（推論は行わない）
+        
+        serve.py がワーカープロセスを fork する前に呼び出し、ロードした重みを
+        各ワーカーとコピーオンライトで共有する。
+        """
+        available_models = self.engine.available_models()
+        for model_name in self._preload_model_names(model_names):
+            if model_name not in available_models:
+                raise ValueError(f"Model must be one of {available_models}")
+            self.registry.get(model_name)
+    
+    def _preload_model_names(self, model_names: Optional[List[str]]) -> List[str]:
+        """起動時にロードするモデル（省略時は設定の whisper_preload_models、未設定ならデフォルトモデル）"""
+        if model_names is not None:
+            return model_names
+        return [
+            name.strip() for name in settings.whisper_preload_models.split(",") if name.strip()
+        ] or [self.model_name]
+    
+    def shutdown(self):
+        """推論スレッドを停止"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
     
     def change_model(self, model_name: str):
         """
-        Whisperモデルを変更
+        デフォルトのWhisperモデルを変更
+        
+        新しいモデルは次回の利用時にロードされ、推論中のリクエストは元のモデルで完了する。
         
         Available models:
         - tiny: 最速、精度低
@@ -98,12 +643,42 @@ class WhisperService:
         - medium: 高精度
         - large: 最高精度、最も遅い
         """
-        available_models = ["tiny", "base", "small", "medium", "large"]
+        available_models = self.engine.available_models()
         if model_name not in available_models:
             raise ValueError(f"Model must be one of {available_models}")
-        
         self.model_name = model_name
-        self._initialize_model()
+
+def _resolve_batch(done: asyncio.Future, futures: List[asyncio.Future]):
+    """バッチ推論の結果を各リクエストのFutureに振り分ける"""
+    for index, future in enumerate(futures):
+        if future.done():
+            continue
+        if done.cancelled():
+            future.cancel()
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result()[index])
 
 # シングルトンインスタンス
-whisper_service = WhisperService()
\ No newline at end of file
+whisper_service = WhisperService()
+
+whisper_pending_requests = registry.register(Gauge(
+    "whisper_pending_requests",
+    "Local Whisper requests running or waiting for a worker."
+))
+whisper_loaded_models = registry.register(Gauge(
+    "whisper_loaded_models",
+    "Whisper models currently held in memory."
+))
+whisper_model_memory_bytes = registry.register(Gauge(
+    "whisper_model_memory_bytes",
+    "Estimated memory used by the loaded Whisper models."
+))
+
+def _collect_whisper_metrics():
+    whisper_pending_requests.set(whisper_service._pending)
+    whisper_loaded_models.set(len(whisper_service.registry.loaded_models()))
+    whisper_model_memory_bytes.set(whisper_service.registry.memory_bytes())
+
+registry.add_collector(_collect_whisper_metrics)
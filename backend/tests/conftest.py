@@ -0,0 +1,14 @@
+import os
+import sys
+
+# APIキーを空にしてモックモードで実行する（.env の設定で外部APIを呼ばないように、設定の読み込み前に上書きする）
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["ANTHROPIC_API_KEY"] = ""
+os.environ["LLM_PROVIDER"] = "openai"
+os.environ["STT_PROVIDER"] = "openai"
+os.environ["TTS_PROVIDER"] = "openai"
+os.environ["SESSION_STORE"] = "memory"
+os.environ.pop("TTS_CACHE_DIR", None)
+
+# backend/ をインポートのルートにする（リポジトリのルートから pytest を実行した場合も同じ）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from config.settings import settings
+from services.admission import BULK, INTERACTIVE, SessionGate, StageLimiter
+from services.errors import ServiceBusyError, TooManyRequestsError
+
+def test_runs_up_to_max_concurrency_without_waiting():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=2, max_queue=0)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.active == 2
+        
+        limiter.release()
+        limiter.release()
+        return limiter.active
+    
+    assert asyncio.run(scenario()) == 0
+
+def test_hands_freed_slot_to_interactive_before_bulk():
+    order = []
+    
+    async def worker(limiter, name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+    
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=4)
+        await limiter.acquire()
+        tasks = [
+            asyncio.ensure_future(worker(limiter, "bulk-1", BULK)),
+            asyncio.ensure_future(worker(limiter, "interactive-1", INTERACTIVE)),
+            asyncio.ensure_future(worker(limiter, "bulk-2", BULK)),
+            asyncio.ensure_future(worker(limiter, "interactive-2", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0.01)
+        assert limiter.queued == 4
+        
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return limiter.active
+    
+    assert asyncio.run(scenario()) == 0
+    assert order == ["interactive-1", "interactive-2", "bulk-1", "bulk-2"]
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=1)
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        
+        with pytest.raises(ServiceBusyError) as error:
+            await limiter.acquire()
+        assert error.value.status_code == 503
+        assert error.value.retry_after == settings.admission_retry_after_seconds
+        
+        limiter.release()
+        await waiting
+        limiter.release()
+        return limiter.active, limiter.queued
+    
+    assert asyncio.run(scenario()) == (0, 0)
+
+def test_rejects_after_queue_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "admission_queue_timeout_seconds", 0.02)
+    
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=1)
+        await limiter.acquire()
+        with pytest.raises(ServiceBusyError):
+            await limiter.acquire()
+        return limiter.queued
+    
+    assert asyncio.run(scenario()) == 0
+
+def test_session_gate_orders_requests_of_one_session():
+    order = []
+    
+    async def turn(gate, name):
+        async with gate.hold("session"):
+            order.append(f"{name}+")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}-")
+    
+    async def scenario():
+        gate = SessionGate(max_pending=2)
+        await asyncio.gather(turn(gate, "a"), turn(gate, "b"))
+    
+    asyncio.run(scenario())
+    assert order == ["a+", "a-", "b+", "b-"]
+
+def test_session_gate_rejects_too_many_pending_requests():
+    async def scenario():
+        gate = SessionGate(max_pending=1)
+        async with gate.hold("session"):
+            with pytest.raises(TooManyRequestsError) as error:
+                async with gate.hold("session"):
+                    pass
+            assert error.value.status_code == 429
+            
+            # 他のセッションは制限されない
+            async with gate.hold("other"):
+                pass
+        
+        async with gate.hold("session"):
+            pass
+    
+    asyncio.run(scenario())
@@ -0,0 +1,361 @@
+"""APIキーを設定しないモックモードで、各エンドポイントが応答することを確認する"""
+import asyncio
+import base64
+import io
+import json
+import zipfile
+from email.message import Message
+from email.parser import BytesParser
+from typing import Dict
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import main
+from config.settings import settings
+import services.speech_service as speech_module
+from services.admission import StageLimiter, stage_limiters
+from services.audio_utils import decode_audio, encode_wav
+from services.llm_service import llm_service
+from services.speech_service import speech_service
+from services.tts_cache import TTSCache
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+@pytest.fixture(scope="module")
+def wav() -> bytes:
+    return speech_service._generate_mock_audio("")[0]
+
+def _receive_until_done(websocket):
+    messages = []
+    while True:
+        message = websocket.receive_json()
+        messages.append(message)
+        if message["type"] in ("done", "error"):
+            return messages
+
+def test_health(client):
+    assert client.get("/").status_code == 200
+    assert client.get("/health").json()["status"] == "healthy"
+    assert client.get("/health/ready").json()["ready"]
+
+def test_metrics(client):
+    chat = client.post("/api/chat", json={"message": "こんにちは"})
+    response = client.get("/metrics")
+    
+    assert "total;dur=" in chat.headers["server-timing"]
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "voice_stage_duration_seconds" in response.text
+    assert "tts_cache_events_total" in response.text
+
+def test_speech_to_text(client, wav):
+    response = client.post("/api/speech-to-text", json={
+        "audio": base64.b64encode(wav).decode(),
+        "format": "wav"
+    })
+    
+    assert response.status_code == 200
+    assert response.json()["text"]
+
+def test_chat(client):
+    response = client.post("/api/chat", json={"message": "こんにちは", "sessionId": "api-test"})
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"]
+    assert body["sessionId"] == "api-test"
+
+def test_clear_session(client):
+    response = client.delete("/api/sessions/api-test")
+    
+    assert response.status_code == 200
+    assert response.json()["sessionId"] == "api-test"
+
+def test_text_to_speech(client):
+    response = client.post("/api/text-to-speech", json={"text": "こんにちは"})
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert base64.b64decode(body["audio"]).startswith(b"RIFF")
+    assert body["format"] == "wav"
+
+def test_text_to_speech_rejects_unsupported_format(client):
+    response = client.post("/api/text-to-speech", json={"text": "こんにちは", "format": "m4a"})
+    
+    assert response.status_code == 400
+
+def test_text_to_speech_batch(client):
+    response = client.post("/api/text-to-speech/batch", json={"items": [
+        {"id": "a", "text": "こんにちは"},
+        {"id": "b", "text": " こんにちは "},
+        {"id": "c", "text": "さようなら"},
+        {"id": "d", "text": "  "}
+    ]})
+    
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items = {line["id"]: line for line in lines if line["type"] == "item"}
+    assert all(items[item_id]["audio"] for item_id in ("a", "b", "c"))
+    assert items["d"]["error"]
+    # 同じ内容の項目は1回だけ合成する
+    assert lines[-1] == {"type": "done", "total": 4, "unique": 3, "succeeded": 3, "failed": 1}
+
+def test_text_to_speech_batch_archive(client):
+    response = client.post("/api/text-to-speech/batch", json={
+        "items": [{"id": "greeting/1", "text": "こんにちは"}],
+        "archive": True
+    })
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        assert manifest[0]["file"] == "0000-greeting_1.wav"
+        assert archive.read(manifest[0]["file"]).startswith(b"RIFF")
+
+def test_text_to_speech_batch_rejects_empty(client):
+    assert client.post("/api/text-to-speech/batch", json={"items": []}).status_code == 400
+
+def test_process_voice(client, wav):
+    response = client.post("/api/process-voice", json={
+        "audio": base64.b64encode(wav).decode(),
+        "format": "wav",
+        "sessionId": "api-test"
+    })
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["inputText"]
+    assert body["responseText"]
+    assert body["responseAudio"]
+    assert body["sessionId"] == "api-test"
+
+def test_speculative_process_voice(client, wav):
+    response = client.post("/api/process-voice", json={
+        "audio": base64.b64encode(wav).decode(),
+        "format": "wav",
+        "sessionId": "api-test",
+        "speculative": True
+    })
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["responseText"]
+    assert base64.b64decode(body["responseAudio"]).startswith(b"RIFF")
+
+def _fake_reply(monkeypatch, deltas):
+    """LLMの応答のストリームとTTSを差し替え、呼び出しの順番を記録する"""
+    events = []
+    
+    async def stream_chat_response(message, session_id=None):
+        for delta in deltas:
+            await asyncio.sleep(0.01)
+            events.append(("token", delta))
+            yield delta
+    
+    async def synthesize(text, voice=None, speed=1.0, output_format=None):
+        events.append(("tts", text))
+        return encode_wav(np.zeros(len(text) * 100, dtype=np.float32)), "wav"
+    
+    monkeypatch.setattr(llm_service, "stream_chat_response", stream_chat_response)
+    monkeypatch.setattr(speech_service, "synthesize", synthesize)
+    return events
+
+def test_speculative_reply_synthesizes_the_first_sentence_while_streaming(monkeypatch):
+    events = _fake_reply(monkeypatch, ["最初の文です。", "次の", "文です。", "最後の文です。"])
+    
+    response_text, response_audio, response_format = asyncio.run(
+        main._speculative_reply("こんにちは", "speculative-test", "wav")
+    )
+    
+    assert response_text == "最初の文です。次の文です。最後の文です。"
+    # 最初の文の合成は応答の生成の完了を待たずに始まり、残りの文はまとめて合成する
+    assert [event for event in events if event[0] == "tts"] == [
+        ("tts", "最初の文です。"),
+        ("tts", "次の文です。最後の文です。")
+    ]
+    assert events.index(("tts", "最初の文です。")) < events.index(("token", "最後の文です。"))
+    assert response_format == "wav"
+    assert len(decode_audio(base64.b64decode(response_audio))) == len(response_text) * 100
+
+def test_speculative_reply_synthesizes_once_without_sentence_boundary(monkeypatch):
+    events = _fake_reply(monkeypatch, ["句点の", "ない応答"])
+    
+    response_text, _, _ = asyncio.run(main._speculative_reply("こんにちは", "speculative-test", "wav"))
+    
+    assert response_text == "句点のない応答"
+    assert [event for event in events if event[0] == "tts"] == [("tts", "句点のない応答")]
+
+def test_process_voice_websocket(client, wav):
+    with client.websocket_connect("/ws/process-voice") as websocket:
+        websocket.send_json({"audio": base64.b64encode(wav).decode(), "format": "wav", "sessionId": "ws-test"})
+        messages = _receive_until_done(websocket)
+    
+    types = [message["type"] for message in messages]
+    assert types[0] == "transcript"
+    assert "token" in types
+    assert types[-1] == "done"
+    assert messages[-1]["sessionId"] == "ws-test"
+    
+    # 文ごとの音声は文の順番どおりに届く
+    audio = [message for message in messages if message["type"] == "audio"]
+    assert [message["index"] for message in audio] == list(range(len(audio)))
+    assert "".join(message["text"] for message in audio) == messages[-1]["responseText"]
+
+def test_speech_to_text_websocket_replies(client, wav):
+    with client.websocket_connect("/ws/speech-to-text") as websocket:
+        websocket.send_json({"type": "start", "format": "wav", "sessionId": "ws-test"})
+        websocket.send_bytes(wav)
+        websocket.send_json({"type": "end", "respond": True})
+        messages = _receive_until_done(websocket)
+    
+    types = [message["type"] for message in messages]
+    assert types[0] == "transcript"
+    assert messages[0]["text"]
+    assert "audio" in types
+    assert types[-1] == "done"
+    assert messages[-1]["responseText"]
+
+def test_speech_to_text_websocket_sends_done_without_reply(client, wav):
+    with client.websocket_connect("/ws/speech-to-text") as websocket:
+        websocket.send_json({"type": "start", "format": "wav"})
+        websocket.send_bytes(wav)
+        websocket.send_json({"type": "end", "respond": False})
+        messages = _receive_until_done(websocket)
+    
+    assert [message["type"] for message in messages] == ["transcript", "done"]
+    assert messages[-1]["inputText"] == messages[0]["text"]
+    assert messages[-1]["responseText"] == ""
+
+def test_speech_to_text_websocket_sends_done_when_no_speech_detected(client, wav, monkeypatch):
+    async def transcribe(audio_data, audio_format="webm", model=None):
+        return ""
+    
+    monkeypatch.setattr(speech_service, "transcribe", transcribe)
+    with client.websocket_connect("/ws/speech-to-text") as websocket:
+        websocket.send_json({"type": "start", "format": "wav"})
+        websocket.send_bytes(wav)
+        websocket.send_json({"type": "end", "respond": True})
+        messages = _receive_until_done(websocket)
+    
+    # 発話がない場合はLLMとTTSを呼ばずに終了を知らせる
+    assert [message["type"] for message in messages] == ["transcript", "done"]
+    assert messages[-1]["inputText"] == ""
+
+def test_speech_to_text_upload(client, wav):
+    response = client.post(
+        "/api/speech-to-text/upload?format=wav",
+        content=wav,
+        headers={"content-type": "application/octet-stream"}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["text"]
+
+def test_speech_to_text_upload_multipart(client, wav):
+    response = client.post("/api/speech-to-text/upload", files={"file": ("voice.wav", wav, "audio/wav")})
+    
+    assert response.status_code == 200
+    assert response.json()["text"]
+
+def test_speech_to_text_upload_rejects_empty_body(client):
+    response = client.post("/api/speech-to-text/upload", content=b"", headers={"content-type": "audio/wav"})
+    
+    assert response.status_code == 400
+
+def test_text_to_speech_audio(client):
+    response = client.post("/api/text-to-speech/audio", json={"text": "こんにちは"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/wav"
+    assert response.content.startswith(b"RIFF")
+
+def _form_data_parts(response) -> Dict[str, Message]:
+    message = BytesParser().parsebytes(
+        f"Content-Type: {response.headers['content-type']}\r\n\r\n".encode() + response.content
+    )
+    return {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+
+def test_process_voice_upload_returns_texts_in_body(client, wav):
+    response = client.post(
+        "/api/process-voice/upload?format=wav&sessionId=api-test",
+        content=wav,
+        headers={"content-type": "application/octet-stream"}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/form-data")
+    assert response.headers["x-session-id"] == "api-test"
+    # テキストはヘッダーに入れない（長い応答でプロキシのヘッダーの上限を超えないように）
+    assert "x-response-text" not in response.headers
+    
+    parts = _form_data_parts(response)
+    metadata = json.loads(parts["metadata"].get_payload(decode=True))
+    assert metadata["inputText"]
+    assert metadata["responseText"]
+    assert metadata["sessionId"] == "api-test"
+    assert parts["audio"].get_content_type() == f"audio/{metadata['responseFormat']}"
+    assert parts["audio"].get_payload(decode=True).startswith(b"RIFF")
+
+@pytest.fixture
+def cached_speech(monkeypatch):
+    """合成済みの音声をキャッシュに入れ、APIキーがある場合と同じ経路で返す"""
+    monkeypatch.setattr(speech_module, "tts_cache", TTSCache(max_memory_bytes=1024))
+    monkeypatch.setattr(speech_service, "api_key_exists", True)
+    
+    output_format = speech_service.output_format(None)
+    key = speech_service._tts_cache_key("こんにちは", "alloy", 1.0, output_format)
+    asyncio.run(speech_module.tts_cache.put(key, b"cached-audio", output_format or "mp3"))
+    return b"cached-audio"
+
+def test_text_to_speech_accepts_null_speed(client, cached_speech):
+    response = client.post("/api/text-to-speech", json={"text": "こんにちは", "voice": "alloy", "speed": None})
+    
+    assert response.status_code == 200
+    assert base64.b64decode(response.json()["audio"]) == cached_speech
+
+def test_text_to_speech_audio_accepts_null_speed(client, cached_speech):
+    response = client.post("/api/text-to-speech/audio", json={"text": "こんにちは", "voice": "alloy", "speed": None})
+    
+    assert response.status_code == 200
+    assert response.content == cached_speech
+
+def _saturate(monkeypatch, stage: str):
+    """ステージの枠をすべて使用中にし、待ち行列もない状態にする"""
+    limiter = StageLimiter(stage, max_concurrency=1, max_queue=0)
+    asyncio.run(limiter.acquire())
+    monkeypatch.setitem(stage_limiters, stage, limiter)
+
+@pytest.fixture
+def busy_llm(monkeypatch):
+    monkeypatch.setattr(llm_service, "api_key_exists", True)
+    _saturate(monkeypatch, "llm")
+
+def test_speculative_process_voice_returns_503_when_llm_is_busy(client, wav, busy_llm):
+    response = client.post("/api/process-voice", json={
+        "audio": base64.b64encode(wav).decode(),
+        "format": "wav",
+        "sessionId": "busy-test",
+        "speculative": True
+    })
+    
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.admission_retry_after_seconds)
+
+def test_process_voice_websocket_reports_retry_after_when_llm_is_busy(client, wav, busy_llm):
+    with client.websocket_connect("/ws/process-voice") as websocket:
+        websocket.send_json({"audio": base64.b64encode(wav).decode(), "format": "wav", "sessionId": "busy-test"})
+        messages = _receive_until_done(websocket)
+    
+    assert messages[-1]["type"] == "error"
+    assert messages[-1]["retryAfter"] == settings.admission_retry_after_seconds
+
+def test_cached_speech_is_served_while_tts_is_busy(client, cached_speech, monkeypatch):
+    _saturate(monkeypatch, "tts")
+    
+    response = client.post("/api/text-to-speech", json={"text": "こんにちは", "voice": "alloy"})
+    
+    assert response.status_code == 200
+    assert base64.b64decode(response.json()["audio"]) == cached_speech
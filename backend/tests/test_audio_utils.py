@@ -0,0 +1,51 @@
+import io
+import wave
+import numpy as np
+from services.audio_utils import concat_audio, decode_audio, encode_wav
+
+def _tone(seconds: float, sample_rate: int = 16000, amplitude: float = 0.5) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+def test_decodes_16khz_pcm_wav_in_memory():
+    samples = _tone(0.5)
+    
+    decoded = decode_audio(encode_wav(samples))
+    
+    assert decoded.dtype == np.float32
+    assert len(decoded) == len(samples)
+    assert np.max(np.abs(decoded - samples)) < 1e-3
+
+def _wav_frames(data: bytes):
+    with wave.open(io.BytesIO(data)) as wav_file:
+        return wav_file.getframerate(), wav_file.getnframes()
+
+def test_concatenates_frame_based_formats_as_is():
+    assert concat_audio([(b"ID3a", "mp3"), (b"b", "mp3")]) == (b"ID3ab", "mp3")
+    assert concat_audio([(b"\x00\x01", "pcm"), (b"\x02\x03", "pcm")]) == (b"\x00\x01\x02\x03", "pcm")
+
+def test_concatenates_wav_and_rewrites_the_header():
+    combined, audio_format = concat_audio([(encode_wav(_tone(0.5)), "wav"), (encode_wav(_tone(0.25)), "wav")])
+    
+    assert audio_format == "wav"
+    assert _wav_frames(combined) == (16000, 12000)
+
+def test_resamples_wav_to_the_first_sample_rate():
+    combined, _ = concat_audio([
+        (encode_wav(_tone(0.5, sample_rate=24000), sample_rate=24000), "wav"),
+        (encode_wav(_tone(0.5)), "wav")
+    ])
+    
+    assert _wav_frames(combined) == (24000, 24000)
+
+def test_skips_empty_mock_wav():
+    empty = encode_wav(np.zeros(0, dtype=np.float32))
+    speech = encode_wav(_tone(0.5))
+    
+    assert _wav_frames(concat_audio([(empty, "wav"), (speech, "wav")])[0]) == (16000, 8000)
+    assert concat_audio([(empty, "wav"), (empty, "wav")]) == (empty, "wav")
+
+def test_refuses_formats_that_cannot_be_joined():
+    assert concat_audio([(b"ID3", "mp3"), (encode_wav(_tone(0.1)), "wav")]) is None
+    assert concat_audio([(b"OggS", "opus"), (b"OggS", "opus")]) is None
+    assert concat_audio([(b"RIFF", "wav"), (b"RIFF", "wav")]) is None
@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.fake_providers import LatencyProfile, create_app
+from benchmarks.load_test import compare_with_baseline, parse_server_timing, percentile
+
+@pytest.fixture
+def fake_providers():
+    profile = LatencyProfile(ttft_ms=0, tokens_per_second=0, tts_base_ms=0, tts_ms_per_char=0, stt_base_ms=0)
+    return TestClient(create_app(profile))
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([3.0], 99) == 3.0
+
+def test_parse_server_timing_sums_repeated_stages():
+    header = "stt;dur=120.5, tts;dur=10, tts;dur=5.5, total;desc=\"all\";dur=200"
+    
+    assert parse_server_timing(header) == {"stt": 120.5, "tts": 15.5, "total": 200.0}
+    assert parse_server_timing(None) == {}
+
+def test_compare_with_baseline_reports_p95_regressions():
+    def result(p95):
+        return {"scenario": "chat", "concurrency": 8, "stages": {"client": {"p95": p95}}}
+    
+    assert compare_with_baseline([result(110.0)], [result(100.0)], 0.2) == []
+    [regression] = compare_with_baseline([result(150.0)], [result(100.0)], 0.2)
+    assert regression.startswith("chat c=8 client: p95 100.0ms -> 150.0ms")
+
+def test_fake_openai_chat_streams_sse(fake_providers):
+    response = fake_providers.post("/v1/chat/completions", json={
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": "こんにちは"}],
+        "stream": True
+    })
+    
+    events = [line for line in response.text.splitlines() if line.startswith("data: ")]
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert events[-1] == "data: [DONE]"
+    assert len(events) > 3
+
+def test_fake_anthropic_reads_cached_prompt_prefix(fake_providers):
+    body = {
+        "model": "claude",
+        "max_tokens": 100,
+        "system": [{"type": "text", "text": "システムプロンプト" * 20, "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": "こんにちは"}]
+    }
+    
+    first = fake_providers.post("/v1/messages", json=body).json()["usage"]
+    second = fake_providers.post("/v1/messages", json=body).json()["usage"]
+    
+    assert first["cache_creation_input_tokens"] > 0
+    assert first["cache_read_input_tokens"] == 0
+    assert second["cache_read_input_tokens"] == first["cache_creation_input_tokens"]
+    assert second["cache_creation_input_tokens"] == 0
@@ -0,0 +1,65 @@
+from services import llm_cache
+from services.llm_cache import LLMResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+def test_returns_cached_response():
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    
+    assert cache.get("key") is None
+    cache.put("key", "こんにちは")
+    assert cache.get("key") == "こんにちは"
+
+def test_expires_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    
+    cache.put("key", "こんにちは")
+    clock.now += 59
+    assert cache.get("key") == "こんにちは"
+    
+    clock.now += 1
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+def test_evicts_least_recently_used():
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60)
+    
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+def test_put_refreshes_ttl_and_recency(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60)
+    
+    cache.put("a", "A")
+    cache.put("b", "B")
+    clock.now += 30
+    cache.put("a", "A2")
+    cache.put("c", "C")
+    
+    assert cache.get("b") is None
+    clock.now += 45
+    assert cache.get("a") == "A2"
+
+def test_does_not_store_empty_response_or_when_disabled():
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    cache.put("key", "")
+    assert len(cache) == 0
+    
+    disabled = LLMResponseCache(max_entries=0, ttl_seconds=60)
+    disabled.put("key", "こんにちは")
+    assert disabled.get("key") is None
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from config.settings import settings
+import services.llm_service as llm_module
+from services.llm_cache import LLMResponseCache
+from services.llm_service import LLMService
+
+@pytest.fixture
+def service(monkeypatch):
+    """APIキーがある場合と同じ経路で、プロバイダーの呼び出しと要約の更新を差し替えたサービス"""
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    monkeypatch.setattr(settings, "session_max_messages", 2)
+    service = LLMService()
+    service.api_key_exists = True
+    service.prompts = []
+    service.summary_started = asyncio.Event()
+    service.summary_release = asyncio.Event()
+    
+    async def create_chat_completion(message, history, system_prompt):
+        service.prompts.append(system_prompt)
+        return f"{message}への応答", {}
+    
+    async def update_summary(summary, dropped):
+        service.summary_started.set()
+        await service.summary_release.wait()
+        return summary + "".join(msg["content"] for msg in dropped)
+    
+    async def stream_from(provider, message, history, system_prompt, usage):
+        service.prompts.append(system_prompt)
+        for delta in (message, "への応答"):
+            yield delta
+    
+    service._create_chat_completion = create_chat_completion
+    service._update_summary = update_summary
+    service._stream_from = stream_from
+    return service
+
+def test_reply_returns_before_summary_and_next_turn_sees_it(service):
+    async def scenario():
+        await service.get_chat_response("一", "session")
+        
+        # 2ターン目で1ターン目が履歴から外れるが、要約の完了を待たずに応答を返す
+        reply = await asyncio.wait_for(service.get_chat_response("二", "session"), timeout=1)
+        await asyncio.wait_for(service.summary_started.wait(), timeout=1)
+        
+        # 次のターンは要約の更新が終わるまで待つ
+        third = asyncio.create_task(service.get_chat_response("三", "session"))
+        await asyncio.sleep(0.05)
+        assert len(service.prompts) == 2
+        
+        service.summary_release.set()
+        await asyncio.wait_for(third, timeout=1)
+        await service.close()
+        return reply
+    
+    assert asyncio.run(scenario()) == "二への応答"
+    assert "一一への応答" in service.prompts[2]
+
+def test_streamed_reply_finishes_before_summary(service):
+    async def collect(message):
+        return "".join([delta async for delta in service.stream_chat_response(message, "session")])
+    
+    async def scenario():
+        await collect("一")
+        reply = await asyncio.wait_for(collect("二"), timeout=1)
+        
+        third = asyncio.create_task(collect("三"))
+        await asyncio.sleep(0.05)
+        assert len(service.prompts) == 2
+        
+        service.summary_release.set()
+        await asyncio.wait_for(third, timeout=1)
+        await service.close()
+        session = await service.session_store.get("session")
+        return reply, session
+    
+    reply, session = asyncio.run(scenario())
+    assert reply == "二への応答"
+    assert "一一への応答" in service.prompts[2]
+    assert session["summary"] == "一一への応答二二への応答"
+
+def test_caches_replies_only_without_conversation_context(service, monkeypatch):
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(llm_module, "llm_response_cache", LLMResponseCache(max_entries=10, ttl_seconds=60))
+    
+    async def scenario():
+        first = await service.get_chat_response("こんにちは")
+        second = await service.get_chat_response("こんにちは")
+        # セッションの最初のターンはキャッシュを使い、会話履歴のある次のターンはプロバイダーに送る
+        await service.get_chat_response("こんにちは", "session")
+        await service.get_chat_response("こんにちは", "session")
+        return first, second
+    
+    first, second = asyncio.run(scenario())
+    assert first == second == "こんにちはへの応答"
+    assert len(service.prompts) == 2
+
+def test_claude_prompt_caching_marks_system_prompt_and_history(service, monkeypatch):
+    monkeypatch.setattr(settings, "claude_prompt_caching", True)
+    messages = [
+        {"role": "user", "content": "一"},
+        {"role": "assistant", "content": "一への応答"},
+        {"role": "user", "content": "二"}
+    ]
+    
+    options = service._claude_request_options("system", messages)
+    
+    assert options["system"] == [{"type": "text", "text": "system", "cache_control": {"type": "ephemeral"}}]
+    assert options["messages"][1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    # 最新の発話はキャッシュの区切りにしない
+    assert options["messages"][2] == {"role": "user", "content": "二"}
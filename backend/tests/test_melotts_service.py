@@ -0,0 +1,75 @@
+import asyncio
+import io
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import services.melotts_service as melotts_module
+from services.errors import ServiceBusyError
+from services.melotts_service import SAMPLE_RATE, MeloTTSService, wav_header
+
+def _collect(stream):
+    async def collect():
+        return [chunk async for chunk in stream]
+    return asyncio.run(collect())
+
+def _read_wav(data: bytes):
+    with wave.open(io.BytesIO(data)) as wav:
+        return wav.getframerate(), wav.getnframes()
+
+def test_beep_length_follows_speed_and_is_reused():
+    service = MeloTTSService()
+    service.available = False
+    
+    normal, _ = asyncio.run(service.synthesize("こんにちは"))
+    fast, _ = asyncio.run(service.synthesize("こんにちは", speed=2.0))
+    
+    assert _read_wav(normal) == (SAMPLE_RATE, SAMPLE_RATE // 2)
+    assert _read_wav(fast) == (SAMPLE_RATE, SAMPLE_RATE // 4)
+    # 同じパラメータの波形は生成し直さない
+    assert asyncio.run(service.synthesize("別のテキスト"))[0] is normal
+
+def test_streamed_beep_matches_the_whole_wav():
+    service = MeloTTSService()
+    service.available = False
+    
+    chunks = _collect(service.stream_synthesize("こんにちは"))
+    whole, audio_format = asyncio.run(service.synthesize("こんにちは"))
+    
+    assert audio_format == "wav"
+    assert len(chunks[0]) == 44
+    assert len(chunks) > 2
+    assert b"".join(chunks) == whole
+
+def test_wav_header_for_unknown_length_uses_maximum_size():
+    header = wav_header(None)
+    
+    assert header[:4] == b"RIFF"
+    assert int.from_bytes(header[40:44], "little") == 0xFFFFFFFF - 36
+    assert int.from_bytes(header[4:8], "little") == 0xFFFFFFFF
+
+@pytest.fixture
+def engine(monkeypatch):
+    """MeloTTSの代わりに、前の文ほど時間がかかる合成をスレッドで実行する"""
+    def synthesize_in_worker(text: str, speed: float):
+        time.sleep(0.05 if text.startswith("一") else 0.0)
+        return text.encode("utf-8"), 24000
+    
+    monkeypatch.setattr(melotts_module, "_synthesize_in_worker", synthesize_in_worker)
+    service = MeloTTSService()
+    service.available = True
+    service._pool = ThreadPoolExecutor(max_workers=3)
+    yield service
+    service.shutdown()
+
+def test_sentences_are_synthesized_in_parallel_and_returned_in_order(engine):
+    chunks = _collect(engine.stream_synthesize("一文目です。二文目です。三文目です。"))
+    
+    assert chunks[0] == wav_header(None, 24000)
+    assert b"".join(chunks[1:]).decode("utf-8") == "一文目です。二文目です。三文目です。"
+
+def test_rejects_requests_beyond_the_queue(engine):
+    engine._max_pending = 0
+    
+    with pytest.raises(ServiceBusyError):
+        asyncio.run(engine.synthesize("こんにちは。"))
@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from config.settings import settings
+from services.llm_service import LLMService
+from services.provider_clients import with_retries
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "provider_retry_backoff_seconds", 0)
+
+def _flaky(failures):
+    """failures の例外を順に送出してから "ok" を返す呼び出し"""
+    calls = []
+    
+    async def call(timeout):
+        calls.append(timeout)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "ok"
+    
+    return call, calls
+
+def test_retries_connection_errors_and_server_errors():
+    call, calls = _flaky([httpx.ConnectError("refused"), StatusError(503)])
+    
+    assert asyncio.run(with_retries("chat", call)) == "ok"
+    assert len(calls) == 3
+
+def test_does_not_retry_client_errors():
+    call, calls = _flaky([StatusError(400)])
+    
+    with pytest.raises(StatusError):
+        asyncio.run(with_retries("chat", call))
+    assert len(calls) == 1
+
+def test_gives_up_after_max_retries():
+    call, calls = _flaky([StatusError(429)] * 3)
+    
+    with pytest.raises(StatusError):
+        asyncio.run(with_retries("chat", call, max_retries=1))
+    assert len(calls) == 2
+
+class FakeClaudeStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+    
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+    
+    async def close(self):
+        self.closed = True
+
+def test_claude_stream_creation_is_retried(monkeypatch):
+    usage = SimpleNamespace(input_tokens=10, cache_read_input_tokens=5, cache_creation_input_tokens=0)
+    stream = FakeClaudeStream([
+        SimpleNamespace(type="message_start", message=SimpleNamespace(usage=usage)),
+        SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(text="こんにちは")),
+        SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(text="。")),
+        SimpleNamespace(type="message_stop")
+    ])
+    requests = []
+    
+    async def create(**options):
+        requests.append(options)
+        if len(requests) == 1:
+            raise httpx.ConnectError("refused")
+        return stream
+    
+    client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    monkeypatch.setattr(LLMService, "claude_client", property(lambda self: client))
+    
+    async def scenario():
+        usage = {}
+        deltas = [
+            delta async for delta in LLMService()._stream_from("claude", "こんにちは", [], "system", usage)
+        ]
+        return deltas, usage
+    
+    deltas, token_usage = asyncio.run(scenario())
+    assert deltas == ["こんにちは", "。"]
+    assert len(requests) == 2
+    assert requests[1]["stream"] is True
+    assert token_usage["promptTokens"] == 15
+    assert stream.closed
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from config.settings import settings
+from services import provider_router
+from services.provider_router import ProviderRouter, ProviderStats
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(provider_router.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "router_failure_threshold", 3)
+    monkeypatch.setattr(settings, "router_open_seconds", 30.0)
+    monkeypatch.setattr(settings, "router_min_samples", 20)
+    monkeypatch.setattr(settings, "router_hedging_enabled", True)
+    monkeypatch.setattr(settings, "router_hedge_delay_ms", 20)
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    stats = ProviderStats()
+    for _ in range(2):
+        stats.record(0.1, ok=False)
+    assert stats.available()
+    
+    stats.record(0.1, ok=False)
+    assert stats.circuit_open
+    assert not stats.available()
+
+def test_breaker_lets_one_trial_through_when_half_open(clock):
+    stats = ProviderStats()
+    for _ in range(3):
+        stats.record(0.1, ok=False)
+    
+    clock.now += 30
+    assert not stats.circuit_open
+    assert stats.available()
+    
+    stats.begin()
+    assert not stats.available()
+    
+    stats.record(0.1, ok=True)
+    assert stats.available()
+    assert stats.error_rate() == 0.0
+
+def test_failed_trial_reopens_breaker(clock):
+    stats = ProviderStats()
+    for _ in range(3):
+        stats.record(0.1, ok=False)
+    
+    clock.now += 30
+    stats.begin()
+    stats.record(0.1, ok=False)
+    assert stats.circuit_open
+    
+    clock.now += 29
+    assert not stats.available()
+
+def test_router_skips_provider_with_open_breaker(clock):
+    router = ProviderRouter("test")
+    for _ in range(3):
+        router.stats("primary").record(0.1, ok=False)
+    
+    assert router.order(["primary", "secondary"]) == ["secondary"]
+    # すべて開いている場合は優先のプロバイダーを試す
+    for _ in range(3):
+        router.stats("secondary").record(0.1, ok=False)
+    assert router.order(["primary", "secondary"]) == ["primary"]
+
+def test_router_fails_over_to_next_provider():
+    async def failing():
+        raise RuntimeError("primary is down")
+    
+    async def working():
+        return "secondary"
+    
+    router = ProviderRouter("test")
+    result = asyncio.run(router.run({"primary": failing, "secondary": working}))
+    
+    assert result == ("secondary", "secondary")
+    assert router.stats("primary").error_rate() == 1.0
+
+def test_router_does_not_fail_over_on_invalid_input():
+    calls = []
+    
+    async def invalid():
+        raise ValueError("unsupported format")
+    
+    async def working():
+        calls.append(1)
+        return "secondary"
+    
+    router = ProviderRouter("test")
+    with pytest.raises(ValueError):
+        asyncio.run(router.run({"primary": invalid, "secondary": working}))
+    assert calls == []
+
+def test_router_hedges_slow_primary_and_cancels_it():
+    cancelled = []
+    
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "primary"
+    
+    async def fast():
+        await asyncio.sleep(0.01)
+        return "secondary"
+    
+    async def scenario():
+        router = ProviderRouter("test")
+        result = await router.run({"primary": slow, "secondary": fast})
+        await asyncio.sleep(0.01)
+        return result
+    
+    assert asyncio.run(scenario()) == ("secondary", "secondary")
+    assert cancelled == [1]
+
+def test_router_keeps_fast_primary_without_hedging():
+    calls = []
+    
+    async def primary():
+        await asyncio.sleep(0.001)
+        return "primary"
+    
+    async def secondary():
+        calls.append(1)
+        return "secondary"
+    
+    router = ProviderRouter("test")
+    assert asyncio.run(router.run({"primary": primary, "secondary": secondary})) == ("primary", "primary")
+    assert calls == []
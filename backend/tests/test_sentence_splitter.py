@@ -0,0 +1,35 @@
+from services.sentence_splitter import SentenceSplitter, join_sentences, split_sentences
+
+def test_splits_japanese_sentences_as_tokens_arrive():
+    splitter = SentenceSplitter()
+    
+    assert splitter.feed("こんにちは。今日") == ["こんにちは。"]
+    assert splitter.feed("はいい天気ですね！明日は") == ["今日はいい天気ですね！"]
+    assert splitter.feed("どうですか？") == ["明日はどうですか？"]
+    assert splitter.flush() == []
+
+def test_keeps_closing_brackets_with_the_sentence():
+    assert split_sentences("「はい。」と言いました。（本当？）") == ["「はい。」", "と言いました。", "（本当？）"]
+
+def test_splits_ascii_sentences_only_before_whitespace():
+    splitter = SentenceSplitter()
+    
+    assert splitter.feed("Pi is 3.14 today. It") == ["Pi is 3.14 today."]
+    assert splitter.feed(" works!") == []
+    # 後続の文字が届くまで区切るかどうかを保留する
+    assert splitter.feed(" Really?!") == ["It works!"]
+    assert splitter.flush() == ["Really?!"]
+
+def test_splits_at_ascii_punctuation_followed_by_japanese():
+    assert split_sentences("OK.次に進みます。") == ["OK.", "次に進みます。"]
+
+def test_splits_at_newlines_and_normalizes_whitespace():
+    assert split_sentences("一行目\n二行目  です\n") == ["一行目", "二行目 です"]
+
+def test_joins_short_fragments_with_the_next_sentence():
+    splitter = SentenceSplitter(min_length=5)
+    
+    assert splitter.feed("はい。そうですね。") == ["はい。そうですね。"]
+
+def test_join_sentences_adds_space_after_ascii():
+    assert join_sentences(["Hello.", "こんにちは。", "元気です。"]) == "Hello. こんにちは。元気です。"
@@ -0,0 +1,45 @@
+import os
+import signal
+import time
+import pytest
+import serve
+
+@pytest.fixture
+def restore_signals():
+    handlers = {signum: signal.getsignal(signum) for signum in serve.STOP_SIGNALS}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, serve.STOP_SIGNALS)
+
+def test_supervisor_restarts_crashed_workers_and_stops_on_sigterm(tmp_path, monkeypatch, restore_signals):
+    starts = tmp_path / "starts"
+    
+    def run_worker(app, sock, threads):
+        # fork したワーカー内で実行される（起動回数をファイルに記録する）
+        with open(starts, "a") as log:
+            log.write(f"{threads}\n")
+        if len(starts.read_text().splitlines()) == 1:
+            raise RuntimeError("worker crashed")
+        # 再起動したワーカーが親に停止を依頼し、親からの SIGTERM を待つ
+        for signum in serve.STOP_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, serve.STOP_SIGNALS)
+        os.kill(os.getppid(), signal.SIGTERM)
+        time.sleep(10)
+    
+    monkeypatch.setattr(serve, "run_worker", run_worker)
+    monkeypatch.setattr(serve, "RESTART_BACKOFF_SECONDS", 0)
+    sock = serve.bind_socket("127.0.0.1", 0)
+    
+    started = time.monotonic()
+    assert serve.WorkerSupervisor(None, sock, workers=1, threads=2).run() == 0
+    
+    assert starts.read_text().splitlines() == ["2", "2"]
+    assert time.monotonic() - started < 5
+    assert sock.fileno() == -1
+
+def test_parse_args_reads_worker_options():
+    args = serve.parse_args(["--workers", "4", "--threads-per-worker", "2", "--port", "9000"])
+    
+    assert (args.workers, args.threads_per_worker, args.port) == (4, 2, 9000)
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from config.settings import settings
+from services.errors import TooManyRequestsError
+from services.session_store import InMemorySessionStore, SQLiteSessionStore
+
+def test_memory_store_evicts_least_recently_used_sessions():
+    async def scenario():
+        store = InMemorySessionStore(ttl_seconds=60, max_sessions=2)
+        await store.set("a", {"messages": []})
+        await store.set("b", {"messages": []})
+        # 読み出したセッションは最近使われたものとして残る
+        await store.get("a")
+        await store.set("c", {"messages": []})
+        return [await store.get(session_id) is not None for session_id in ("a", "b", "c")], len(store)
+    
+    present, size = asyncio.run(scenario())
+    assert present == [True, False, True]
+    assert size == 2
+
+def test_memory_store_expires_sessions_and_copies_data():
+    async def scenario():
+        store = InMemorySessionStore(ttl_seconds=60, max_sessions=10)
+        data = {"messages": [{"role": "user", "content": "こんにちは"}]}
+        await store.set("session", data)
+        data["messages"].clear()
+        stored = await store.get("session")
+        
+        expiring = InMemorySessionStore(ttl_seconds=0, max_sessions=10)
+        await expiring.set("session", data)
+        return stored, await expiring.get("session")
+    
+    stored, expired = asyncio.run(scenario())
+    assert stored == {"messages": [{"role": "user", "content": "こんにちは"}]}
+    assert expired is None
+
+def test_sqlite_store_round_trip(tmp_path):
+    async def scenario():
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=60)
+        await store.set("session", {"messages": [{"role": "user", "content": "こんにちは"}]})
+        data = await store.get("session")
+        deleted = await store.delete("session")
+        missing = await store.get("session")
+        await store.close()
+        return data, deleted, missing
+    
+    data, deleted, missing = asyncio.run(scenario())
+    assert data == {"messages": [{"role": "user", "content": "こんにちは"}]}
+    assert deleted
+    assert missing is None
+
+def test_sqlite_store_is_shared_between_stores(tmp_path):
+    # 同じファイルを開いた2つのストアで、別々のワーカープロセスを模す
+    path = str(tmp_path / "sessions.db")
+    
+    async def scenario():
+        first = SQLiteSessionStore(path, ttl_seconds=60)
+        second = SQLiteSessionStore(path, ttl_seconds=60)
+        await first.set("session", {"summary": "挨拶をした"})
+        data = await second.get("session")
+        await first.close()
+        await second.close()
+        return data
+    
+    assert asyncio.run(scenario()) == {"summary": "挨拶をした"}
+
+def test_sqlite_lease_orders_turns_across_stores(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    order = []
+    
+    async def turn(store, name, seconds, acquired=None):
+        async with store.lease("session"):
+            order.append(f"{name}+")
+            if acquired is not None:
+                acquired.set()
+            await asyncio.sleep(seconds)
+            order.append(f"{name}-")
+    
+    async def scenario():
+        first = SQLiteSessionStore(path, ttl_seconds=60)
+        second = SQLiteSessionStore(path, ttl_seconds=60)
+        acquired = asyncio.Event()
+        first_turn = asyncio.create_task(turn(first, "a", 0.1, acquired))
+        # 別のストアからのターンは、先にリースを取ったターンの終了まで待つ
+        await acquired.wait()
+        await asyncio.gather(first_turn, turn(second, "b", 0.01))
+    
+    asyncio.run(scenario())
+    assert order == ["a+", "a-", "b+", "b-"]
+
+def test_sqlite_lease_rejects_after_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "session_lease_timeout_seconds", 0.05)
+    path = str(tmp_path / "sessions.db")
+    
+    async def scenario():
+        first = SQLiteSessionStore(path, ttl_seconds=60)
+        second = SQLiteSessionStore(path, ttl_seconds=60)
+        async with first.lease("session"):
+            with pytest.raises(TooManyRequestsError):
+                async with second.lease("session"):
+                    pass
+        
+        # 解放後は取得できる
+        async with second.lease("session"):
+            pass
+    
+    asyncio.run(scenario())
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from services.single_flight import SingleFlight, content_key
+
+def test_content_key_separates_parts():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key(b"audio", "wav") == content_key(b"audio", "wav")
+    assert content_key(b"audio", "wav") != content_key(b"audio", "mp3")
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+    
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", factory) for _ in range(5)))
+        return results, len(flight)
+    
+    results, in_flight = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert in_flight == 0
+
+def test_different_keys_run_separately():
+    calls = []
+    
+    async def factory(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        return await asyncio.gather(flight.do("a", lambda: factory("a")), flight.do("b", lambda: factory("b")))
+    
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_error_is_shared_and_next_call_runs_again():
+    calls = []
+    
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(
+            flight.do("key", failing),
+            flight.do("key", failing),
+            return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(calls) == 1
+        
+        with pytest.raises(RuntimeError):
+            await flight.do("key", failing)
+        assert len(calls) == 2
+    
+    asyncio.run(scenario())
+
+def test_cancelling_one_caller_keeps_the_call_for_others():
+    started = []
+    
+    async def factory():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        first = asyncio.ensure_future(flight.do("key", factory))
+        second = asyncio.ensure_future(flight.do("key", factory))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        
+        assert await second == "result"
+        assert first.cancelled()
+    
+    asyncio.run(scenario())
+    assert len(started) == 1
+
+def test_cancelling_every_caller_cancels_the_call():
+    finished = []
+    
+    async def factory():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+    
+    async def scenario():
+        flight = SingleFlight("test")
+        waiters = [asyncio.ensure_future(flight.do("key", factory)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.06)
+        return len(flight)
+    
+    assert asyncio.run(scenario()) == 0
+    assert finished == []
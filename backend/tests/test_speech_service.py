@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+import services.speech_service as speech_module
+from services.audio_utils import media_type_for
+from services.melotts_service import MeloTTSService
+from services.speech_service import speech_service
+from services.tts_cache import TTSCache
+
+def test_output_format_is_none_for_the_native_format(monkeypatch):
+    assert speech_service.output_format(None) is None
+    assert speech_service.output_format("MP3") is None
+    assert speech_service.output_format("Opus") == "opus"
+    assert speech_service.response_format(None) == "mp3"
+    
+    monkeypatch.setattr(speech_service, "tts_provider", "local")
+    assert speech_service.output_format("wav") is None
+    assert speech_service.output_format("mp3") == "mp3"
+
+def test_output_format_rejects_unsupported_formats():
+    with pytest.raises(ValueError):
+        speech_service.output_format("m4a")
+
+def test_compressed_formats_have_media_types():
+    assert media_type_for("opus") == "audio/ogg"
+    assert media_type_for("aac") == "audio/aac"
+
+def test_local_tts_falls_back_to_wav_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(speech_service, "tts_provider", "local")
+    monkeypatch.setattr(speech_service, "melotts", MeloTTSService())
+    monkeypatch.setattr(speech_module, "ffmpeg_available", lambda: False)
+    monkeypatch.setattr(speech_module, "tts_cache", TTSCache(max_memory_bytes=1024 * 1024))
+    
+    audio, audio_format = asyncio.run(speech_service.synthesize("こんにちは", output_format="opus"))
+    
+    assert audio_format == "wav"
+    assert audio.startswith(b"RIFF")
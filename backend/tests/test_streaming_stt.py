@@ -0,0 +1,47 @@
+import pytest
+from config.settings import settings
+from services.audio_utils import WHISPER_SAMPLE_RATE
+from services.streaming_stt import StreamingTranscription
+
+@pytest.fixture
+def transcription(monkeypatch):
+    monkeypatch.setattr(settings, "stt_stream_holdback_seconds", 1.0)
+    monkeypatch.setattr(settings, "stt_stream_window_seconds", 20.0)
+    return StreamingTranscription("wav")
+
+def test_commits_segments_before_the_holdback(transcription):
+    tentative = transcription._commit([(0.0, 1.0, "一"), (1.0, 2.5, "二"), (2.5, 3.8, "三")], 4.0)
+    
+    # 最後のセグメントは続きの音声で変わりうるため確定しない
+    assert tentative == "三"
+    assert transcription.committed_text == "一二"
+    assert transcription._committed_samples == int(2.5 * WHISPER_SAMPLE_RATE)
+
+def test_keeps_segments_ending_within_the_holdback_tentative(transcription):
+    tentative = transcription._commit([(0.0, 1.0, "一"), (1.0, 3.5, "二"), (3.5, 4.0, "三")], 4.0)
+    
+    assert tentative == "二三"
+    assert transcription.committed_text == "一"
+    assert transcription._committed_samples == WHISPER_SAMPLE_RATE
+
+def test_commits_up_to_the_last_segment_beyond_the_window(transcription):
+    tentative = transcription._commit([(0.0, 10.0, "一"), (10.0, 24.5, "二"), (24.5, 25.0, "三")], 25.0)
+    
+    assert tentative == "三"
+    assert transcription.committed_text == "一二"
+
+def test_commits_a_single_long_segment_beyond_the_window(transcription):
+    tentative = transcription._commit([(0.0, 26.0, "一")], 25.0)
+    
+    # 区切りのない長い発話も確定し、確定した音声の長さは音声の長さを超えない
+    assert tentative == ""
+    assert transcription.committed_text == "一"
+    assert transcription._committed_samples == 25 * WHISPER_SAMPLE_RATE
+
+def test_accumulates_commits_across_updates(transcription):
+    transcription._commit([(0.0, 1.0, "一"), (1.0, 2.0, "二")], 3.5)
+    tentative = transcription._commit([(0.0, 1.0, "三"), (1.0, 2.0, "四")], 2.5)
+    
+    assert tentative == "四"
+    assert transcription.committed_text == "一三"
+    assert transcription._committed_samples == 2 * WHISPER_SAMPLE_RATE
@@ -0,0 +1,36 @@
+from services.token_budget import estimate_tokens, message_tokens, trim_to_budget
+
+def _turns(count: int):
+    messages = []
+    for index in range(count):
+        messages.append({"role": "user", "content": f"質問{index}"})
+        messages.append({"role": "assistant", "content": f"回答{index}"})
+    return messages
+
+def test_estimates_wide_characters_as_one_token_each():
+    assert estimate_tokens("こんにちは") == 5
+    assert estimate_tokens("hello world!") == 3
+    assert message_tokens({"role": "user", "content": "はい"}) == 6
+
+def test_keeps_everything_within_budget():
+    messages = _turns(3)
+    
+    assert trim_to_budget(messages, 1000) == (messages, [])
+
+def test_drops_oldest_turns_in_pairs_until_within_budget():
+    messages = _turns(3)
+    per_turn = sum(message_tokens(message) for message in messages[:2])
+    
+    kept, dropped = trim_to_budget(messages, per_turn * 2 - 1)
+    
+    # ユーザー発話と応答の組を崩さない
+    assert kept == messages[4:]
+    assert dropped == messages[:4]
+
+def test_limits_the_number_of_messages():
+    messages = _turns(3)
+    
+    kept, dropped = trim_to_budget(messages, 1000, max_messages=4)
+    
+    assert kept == messages[2:]
+    assert dropped == messages[:2]
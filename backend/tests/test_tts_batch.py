@@ -0,0 +1,44 @@
+import asyncio
+from services.errors import ServiceBusyError
+from services.speech_service import speech_service
+from services.tts_batch import synthesize_batch
+
+def _collect(items):
+    async def collect():
+        return [result async for result in synthesize_batch(items, concurrency=2)]
+    return asyncio.run(collect())
+
+def test_retries_items_while_tts_is_busy(monkeypatch):
+    calls = []
+    
+    async def synthesize(text, voice=None, speed=1.0, output_format=None):
+        calls.append(text)
+        if len(calls) == 1:
+            raise ServiceBusyError("busy", retry_after=0.01)
+        return b"audio", "mp3"
+    
+    monkeypatch.setattr(speech_service, "synthesize", synthesize)
+    
+    [(indices, audio, error)] = _collect([("こんにちは", None, 1.0, None)])
+    
+    assert (indices, audio, error) == ([0], (b"audio", "mp3"), None)
+    assert calls == ["こんにちは", "こんにちは"]
+
+def test_groups_items_with_the_same_content(monkeypatch):
+    calls = []
+    
+    async def synthesize(text, voice=None, speed=1.0, output_format=None):
+        calls.append((text, voice, speed, output_format))
+        return text.encode("utf-8"), output_format or "mp3"
+    
+    monkeypatch.setattr(speech_service, "synthesize", synthesize)
+    
+    results = _collect([
+        ("こんにちは", None, 1.0, None),
+        ("こんにちは", "alloy", 1.0, ""),
+        ("こんにちは", None, 1.5, None),
+        ("こんにちは", None, 1.0, "opus")
+    ])
+    
+    assert sorted(indices for indices, _, _ in results) == [[0, 1], [2], [3]]
+    assert len(calls) == 3
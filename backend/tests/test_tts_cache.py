@@ -0,0 +1,65 @@
+import asyncio
+import os
+from services.tts_cache import TTSCache, normalize_text
+
+def test_key_ignores_whitespace_and_width_differences():
+    key = TTSCache.make_key("openai", "tts-1", "alloy", 1.0, "こんにちは 世界ＡＢＣ")
+    
+    assert normalize_text("  こんにちは　 世界ABC\n") == "こんにちは 世界ABC"
+    assert TTSCache.make_key("openai", "tts-1", "alloy", 1.0, "  こんにちは　 世界ABC\n") == key
+
+def test_key_depends_on_synthesis_parameters():
+    key = TTSCache.make_key("openai", "tts-1", "alloy", 1.0, "こんにちは")
+    
+    assert TTSCache.make_key("local", "tts-1", "alloy", 1.0, "こんにちは") != key
+    assert TTSCache.make_key("openai", "tts-1-hd", "alloy", 1.0, "こんにちは") != key
+    assert TTSCache.make_key("openai", "tts-1", "nova", 1.0, "こんにちは") != key
+    assert TTSCache.make_key("openai", "tts-1", "alloy", 1.25, "こんにちは") != key
+    assert TTSCache.make_key("openai", "tts-1", "alloy", 1.001, "こんにちは") == key
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    async def scenario():
+        cache = TTSCache(max_memory_bytes=10)
+        await cache.put("a", b"aaaa", "mp3")
+        await cache.put("b", b"bbbb", "mp3")
+        assert await cache.get("a") == (b"aaaa", "mp3")
+        await cache.put("c", b"cccc", "mp3")
+        
+        assert await cache.get("b") is None
+        assert await cache.get("a") == (b"aaaa", "mp3")
+        assert await cache.get("c") == (b"cccc", "mp3")
+        return cache.snapshot()
+    
+    stats = asyncio.run(scenario())
+    assert stats["memory_evictions"] == 1
+    assert stats["memory_bytes"] == 8
+    assert stats["misses"] == 1
+
+def test_memory_tier_skips_clips_larger_than_limit():
+    async def scenario():
+        cache = TTSCache(max_memory_bytes=4)
+        await cache.put("a", b"aaaaa", "mp3")
+        return await cache.get("a"), cache.snapshot()
+    
+    entry, stats = asyncio.run(scenario())
+    assert entry is None
+    assert stats["memory_entries"] == 0
+
+def test_disk_tier_survives_restart_and_evicts_oldest(tmp_path):
+    async def fill():
+        cache = TTSCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=8)
+        await cache.put("a" * 64, b"aaaa", "mp3")
+        await cache.put("b" * 64, b"bbbb", "mp3")
+        await cache.put("c" * 64, b"cccc", "mp3")
+        return cache.snapshot()
+    
+    stats = asyncio.run(fill())
+    assert stats["disk_evictions"] == 1
+    assert stats["disk_bytes"] == 8
+    
+    restarted = TTSCache(max_memory_bytes=1024, disk_dir=str(tmp_path), max_disk_bytes=8)
+    assert restarted.get_path("a" * 64) is None
+    path, audio_format = restarted.get_path("b" * 64)
+    assert audio_format == "mp3"
+    assert os.path.basename(path) == "b" * 64 + ".mp3"
+    assert asyncio.run(restarted.get("c" * 64)) == (b"cccc", "mp3")
@@ -0,0 +1,56 @@
+import numpy as np
+from services.audio_utils import WHISPER_SAMPLE_RATE
+from services.vad import detect_speech, join_transcripts, split_at_pauses
+
+def _tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * WHISPER_SAMPLE_RATE)) / WHISPER_SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * WHISPER_SAMPLE_RATE), dtype=np.float32)
+
+def _seconds(regions):
+    return [(start / WHISPER_SAMPLE_RATE, end / WHISPER_SAMPLE_RATE) for start, end in regions]
+
+def test_detects_speech_between_silence_with_padding():
+    audio = np.concatenate([_silence(1.0), _tone(1.0), _silence(1.0)])
+    
+    [(start, end)] = _seconds(detect_speech(audio))
+    
+    assert abs(start - 0.8) < 0.05
+    assert abs(end - 2.2) < 0.05
+
+def test_returns_no_regions_for_silence():
+    assert detect_speech(_silence(2.0)) == []
+    assert detect_speech(np.zeros(10, dtype=np.float32)) == []
+
+def test_merges_short_pauses_and_keeps_long_ones():
+    short_pause = np.concatenate([_tone(0.5), _silence(0.1), _tone(0.5)])
+    long_pause = np.concatenate([_tone(0.5), _silence(1.5), _tone(0.5)])
+    
+    assert len(detect_speech(short_pause)) == 1
+    assert len(detect_speech(long_pause)) == 2
+
+def test_ignores_clicks_shorter_than_min_speech():
+    audio = np.concatenate([_silence(1.0), _tone(0.05), _silence(1.0)])
+    
+    assert detect_speech(audio) == []
+
+def test_splits_only_between_regions():
+    audio = np.arange(600, dtype=np.float32)
+    
+    chunks = split_at_pauses(audio, [(0, 100), (200, 300), (400, 500)], 350)
+    
+    assert [(chunk[0], chunk[-1]) for chunk in chunks] == [(0, 299), (400, 499)]
+
+def test_keeps_a_region_longer_than_the_limit_whole():
+    audio = np.arange(600, dtype=np.float32)
+    
+    chunks = split_at_pauses(audio, [(0, 500)], 100)
+    
+    assert len(chunks) == 1
+    assert len(chunks[0]) == 500
+
+def test_joins_transcripts_without_spaces_between_japanese():
+    assert join_transcripts(["こんにちは。", " 今日は", ""]) == "こんにちは。今日は"
+    assert join_transcripts(["Hello.", "World", "です"]) == "Hello. World です"
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import subprocess
+import sys
+from services.warmup import StartupWarmUp
+
+def test_ready_only_after_every_component_succeeds():
+    async def scenario():
+        warmup = StartupWarmUp()
+        release = asyncio.Event()
+        warmup.start("fast", lambda: asyncio.sleep(0))
+        warmup.start("slow", release.wait)
+        await asyncio.sleep(0.01)
+        pending = warmup.status()
+        
+        release.set()
+        await warmup.wait()
+        return pending, warmup.status()
+    
+    pending, done = asyncio.run(scenario())
+    assert not pending["ready"]
+    assert pending["components"]["fast"]["status"] == "ready"
+    assert pending["components"]["slow"]["status"] == "pending"
+    assert done["ready"]
+    assert done["readySeconds"] is not None
+
+def test_failed_component_keeps_the_app_unready():
+    async def fail():
+        raise RuntimeError("model not found")
+    
+    async def scenario():
+        warmup = StartupWarmUp()
+        warmup.start("whisper", fail)
+        await warmup.wait()
+        return warmup.status()
+    
+    status = asyncio.run(scenario())
+    assert not status["ready"]
+    assert status["components"]["whisper"]["status"] == "failed"
+
+def test_importing_the_app_defers_heavy_modules():
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    heavy = ("openai", "anthropic", "torch", "whisper", "melo", "tiktoken")
+    code = f"import sys, main; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    
+    assert result.stdout.strip() == ""
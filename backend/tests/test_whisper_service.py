@@ -0,0 +1,169 @@
+import asyncio
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+import pytest
+from config.settings import settings
+from services.errors import ServiceBusyError
+from services.whisper_service import (
+    FasterWhisperEngine,
+    OpenAIWhisperEngine,
+    QuantizedWhisperEngine,
+    STTEngine,
+    WhisperModelRegistry,
+    WhisperService,
+    _beam_size,
+    create_stt_engine,
+)
+
+class FakeEngine(STTEngine):
+    """torchやwhisperを使わずに、呼び出しを記録する認識エンジン"""
+    
+    name = "fake"
+    
+    def __init__(self, model_bytes: int = 1024):
+        self.model_bytes = model_bytes
+        self.loads: List[str] = []
+        self.batches: List[int] = []
+        self.release = threading.Event()
+        self.release.set()
+    
+    def available_models(self) -> List[str]:
+        return ["tiny", "base", "small"]
+    
+    def resolve_device(self, device: str) -> str:
+        return "cpu"
+    
+    def load(self, model_name: str, device: str) -> Tuple[object, int]:
+        self.loads.append(model_name)
+        return model_name, self.model_bytes
+    
+    def transcribe(
+        self,
+        model,
+        audio: np.ndarray,
+        language: str,
+        device: str,
+        initial_prompt: Optional[str] = None,
+        condition_on_previous_text: bool = True
+    ) -> List[Tuple[float, float, str]]:
+        self.release.wait(5)
+        return [(0.0, len(audio) / 16000, f"{model}:{len(audio)}")]
+    
+    def decode_batch(self, model, audios: List[np.ndarray], language: str, device: str) -> List[str]:
+        self.batches.append(len(audios))
+        return [f"{model}:{len(audio)}" for audio in audios]
+
+def _service(engine: FakeEngine) -> WhisperService:
+    service = WhisperService()
+    service.engine = engine
+    service.registry = WhisperModelRegistry(engine, "cpu", max_loaded_models=2, max_memory_mb=4096)
+    return service
+
+def test_batches_short_clips_that_arrive_together(monkeypatch):
+    monkeypatch.setattr(settings, "whisper_batch_window_ms", 20)
+    monkeypatch.setattr(settings, "whisper_max_batch_size", 8)
+    engine = FakeEngine()
+    service = _service(engine)
+    chunks = [np.zeros(length, dtype=np.float32) for length in (1600, 3200, 4800)]
+    
+    texts = asyncio.run(service.transcribe_chunks(chunks, model_name="base"))
+    
+    assert texts == ["base:1600", "base:3200", "base:4800"]
+    assert engine.batches == [3]
+
+def test_rejects_requests_beyond_the_queue(monkeypatch):
+    monkeypatch.setattr(settings, "whisper_batch_window_ms", 0)
+    engine = FakeEngine()
+    engine.release.clear()
+    service = _service(engine)
+    service._max_pending = 1
+    audio = np.zeros(1600, dtype=np.float32)
+    
+    async def scenario():
+        running = asyncio.ensure_future(service.transcribe_segments(audio, model_name="base"))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(ServiceBusyError):
+                await service.transcribe_segments(audio, model_name="base")
+        finally:
+            engine.release.set()
+        return await running
+    
+    assert asyncio.run(scenario()) == [(0.0, 0.1, "base:1600")]
+    assert service._pending == 0
+
+def test_rejects_unknown_model():
+    service = _service(FakeEngine())
+    
+    with pytest.raises(ValueError):
+        asyncio.run(service.transcribe_segments(np.zeros(1600, dtype=np.float32), model_name="huge"))
+
+def test_registry_loads_lazily_and_evicts_least_recently_used():
+    engine = FakeEngine()
+    registry = WhisperModelRegistry(engine, "cpu", max_loaded_models=2, max_memory_mb=4096)
+    assert engine.loads == []
+    
+    registry.get("tiny")
+    registry.get("base")
+    registry.get("tiny")
+    registry.get("small")
+    
+    assert registry.loaded_models() == ["tiny", "small"]
+    assert engine.loads == ["tiny", "base", "small"]
+
+def test_registry_evicts_to_stay_within_memory_limit():
+    engine = FakeEngine(model_bytes=3 * 1024 * 1024)
+    registry = WhisperModelRegistry(engine, "cpu", max_loaded_models=4, max_memory_mb=5)
+    
+    registry.get("tiny")
+    registry.get("base")
+    
+    assert registry.loaded_models() == ["base"]
+    # 上限より大きいモデルでも1つは保持する
+    assert registry.memory_bytes() == 3 * 1024 * 1024
+
+def test_registry_loads_a_model_once_for_concurrent_callers():
+    engine = FakeEngine()
+    registry = WhisperModelRegistry(engine, "cpu", max_loaded_models=2, max_memory_mb=4096)
+    threads = [threading.Thread(target=registry.get, args=("base",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert engine.loads == ["base"]
+
+def test_creates_engines_by_backend_name():
+    assert isinstance(create_stt_engine("openai-whisper"), OpenAIWhisperEngine)
+    assert isinstance(create_stt_engine("torch-int8"), QuantizedWhisperEngine)
+    assert isinstance(create_stt_engine("faster-whisper"), FasterWhisperEngine)
+    with pytest.raises(ValueError):
+        create_stt_engine("whisper.cpp")
+
+def test_quantized_engine_runs_on_cpu_only():
+    assert QuantizedWhisperEngine().resolve_device("cuda") == "cpu"
+
+def test_engine_without_recognition_cannot_be_created():
+    class IncompleteEngine(STTEngine):
+        name = "incomplete"
+        
+        def available_models(self) -> List[str]:
+            return []
+    
+    with pytest.raises(TypeError):
+        IncompleteEngine()
+
+def test_default_batch_decoding_joins_segments_per_clip():
+    class SegmentEngine(FakeEngine):
+        def transcribe(self, model, audio, language, device, initial_prompt=None, condition_on_previous_text=True):
+            return [(0.0, 1.0, " 前半"), (1.0, 2.0, f"{len(audio)} ")]
+    
+    audios = [np.zeros(1600, dtype=np.float32), np.zeros(3200, dtype=np.float32)]
+    
+    assert STTEngine.decode_batch(SegmentEngine(), "base", audios, "ja", "cpu") == ["前半1600", "前半3200"]
+
+def test_greedy_decoding_is_the_default(monkeypatch):
+    assert _beam_size() is None
+    monkeypatch.setattr(settings, "whisper_beam_size", 5)
+    assert _beam_size() == 5
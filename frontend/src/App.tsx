@@ -1,10 +1,10 @@
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import './App.css'
 import { AudioRecorder } from './components/AudioRecorder'
 import { AudioPlayer } from './components/AudioPlayer'
 import { ChatDisplay, type ChatMessage } from './components/ChatDisplay'
 import { AvatarDisplay } from './components/AvatarDisplay'
-import { apiService } from './services/api'
+import { apiService, type SpeechStream } from './services/api'
 
 type AppStatus = 'idle' | 'listening' | 'thinking' | 'speaking';
 
@@ -13,8 +13,19 @@ function App() {
   const [status, setStatus] = useState<AppStatus>('idle');
   const [sessionId, setSessionId] = useState<string | undefined>();
   const [responseAudio, setResponseAudio] = useState<string | null>(null);
+  const [responseFormat, setResponseFormat] = useState<string>('wav');
+  const [audioKey, setAudioKey] = useState(0);
+  const [partialText, setPartialText] = useState('');
   const [error, setError] = useState<string | null>(null);
 
+  // 録音中の音声を送信している /ws/speech-to-text の接続
+  const streamRef = useRef<SpeechStream | null>(null);
+  // 文ごとに届いた応答音声の再生待ち
+  const audioQueueRef = useRef<{ audio: string; format: string }[]>([]);
+  const playingRef = useRef(false);
+  // ストリーミングの応答を受信中（receiving）か、受信を終えて残りの音声を再生中（done）か
+  const replyStateRef = useRef<'none' | 'receiving' | 'done'>('none');
+
   const speakText = (text: string) => {
     // Web Speech API を使用してテキストを音声で読み上げる
     if ('speechSynthesis' in window) {
@@ -32,7 +43,146 @@ function App() {
     }
   };
 
+  // ローカルTTSのテストメッセージかどうか
+  const isLocalTestMessage = (inputText: string, responseText: string) =>
+    inputText === 'ローカルTTSのテストメッセージ' && responseText.startsWith('こんにちは、ローカルTTSです。');
+
+  // APIキーのエラーメッセージの場合は Web Speech API で読み上げるテキストを返す
+  const apiKeyErrorSpeech = (inputText: string, responseText: string): string | null => {
+    if (!(responseText.includes('APIキーがセットされていません') || 
+        responseText.includes('APIキーが必要です') ||
+        inputText.includes('音声認識機能を使用するには'))) {
+      return null;
+    }
+    // 音声認識エラーと応答生成エラーを組み合わせたメッセージを作成
+    if (inputText.includes('音声認識機能を使用するには') && 
+        responseText.includes('APIキーがセットされていません')) {
+      return "音声認識と応答生成の両方にAPIキーが必要です。OpenAI APIキーとClaude APIキーを設定してください。";
+    }
+    return responseText;
+  };
+
+  const addMessages = (inputText: string, responseText: string) => {
+    const userMessage: ChatMessage = {
+      id: Date.now().toString() + '-user',
+      role: 'user',
+      content: inputText,
+      timestamp: new Date()
+    };
+    
+    const assistantMessage: ChatMessage = {
+      id: Date.now().toString() + '-assistant',
+      role: 'assistant',
+      content: responseText,
+      timestamp: new Date()
+    };
+    
+    setMessages(prev => [...prev, userMessage, assistantMessage]);
+  };
+
+  const playNextAudio = () => {
+    const next = audioQueueRef.current.shift();
+    if (!next) {
+      playingRef.current = false;
+      if (replyStateRef.current === 'done') {
+        replyStateRef.current = 'none';
+        setStatus('idle');
+      }
+      return;
+    }
+    playingRef.current = true;
+    setStatus('speaking');
+    setResponseFormat(next.format);
+    setResponseAudio(next.audio);
+    // 同じ音声が続いても再生されるよう、プレーヤーを作り直す
+    setAudioKey(key => key + 1);
+  };
+
+  const enqueueAudio = (audio: string, format: string) => {
+    audioQueueRef.current.push({ audio, format });
+    if (!playingRef.current) {
+      playNextAudio();
+    }
+  };
+
+  const handleChunk = (chunk: Blob) => {
+    // 最初のチャンクで接続し、録音中の音声を逐次送信して認識を進めておく
+    if (!streamRef.current) {
+      setError(null);
+      setPartialText('');
+      setStatus('listening');
+      streamRef.current = apiService.openSpeechStream('webm', sessionId, {
+        onPartial: setPartialText,
+        onAudio: enqueueAudio,
+      });
+    }
+    streamRef.current.send(chunk);
+  };
+
+  const handleStreamComplete = async (stream: SpeechStream) => {
+    try {
+      setError(null);
+      setStatus('thinking');
+      replyStateRef.current = 'receiving';
+      
+      const response = await stream.finish();
+      
+      setSessionId(response.sessionId);
+      replyStateRef.current = 'done';
+      
+      // 発話が検出されなかった場合は何もしない
+      if (!response.inputText) {
+        replyStateRef.current = 'none';
+        setStatus('idle');
+        return;
+      }
+      
+      addMessages(response.inputText, response.responseText);
+      
+      // ローカルTTSテストメッセージの場合は、ビープ音の後にWeb Speech APIで読み上げる
+      if (isLocalTestMessage(response.inputText, response.responseText)) {
+        replyStateRef.current = 'none';
+        setStatus('speaking');
+        setTimeout(() => {
+          speakText(response.responseText);
+        }, 600);
+        return;
+      }
+      // APIキーエラーメッセージの場合は、（無音の）応答音声の代わりにWeb Speech APIで読み上げる
+      const messageToSpeak = apiKeyErrorSpeech(response.inputText, response.responseText);
+      if (messageToSpeak) {
+        replyStateRef.current = 'none';
+        audioQueueRef.current = [];
+        setStatus('speaking');
+        speakText(messageToSpeak);
+        return;
+      }
+      
+      // 音声をすべて再生し終えていれば待機状態に戻す
+      if (!playingRef.current) {
+        replyStateRef.current = 'none';
+        setStatus('idle');
+      }
+    } catch (err) {
+      replyStateRef.current = 'none';
+      setError(err instanceof Error ? err.message : '予期しないエラーが発生しました');
+      setStatus('idle');
+    }
+  };
+
   const handleRecordingComplete = async (audioBase64: string, format: string) => {
+    const stream = streamRef.current;
+    streamRef.current = null;
+    setPartialText('');
+    
+    // 録音中に送信できた場合は、WebSocketで認識結果と文ごとの応答音声を受け取る
+    if (stream && await stream.connected()) {
+      await handleStreamComplete(stream);
+      return;
+    }
+    // 接続できなかった場合は録音した音声をまとめて送信する
+    stream?.close();
+    
     try {
       setError(null);
       setStatus('thinking');
@@ -41,27 +191,20 @@ function App() {
       
       setSessionId(response.sessionId);
       
-      const userMessage: ChatMessage = {
-        id: Date.now().toString() + '-user',
-        role: 'user',
-        content: response.inputText,
-        timestamp: new Date()
-      };
-      
-      const assistantMessage: ChatMessage = {
-        id: Date.now().toString() + '-assistant',
-        role: 'assistant',
-        content: response.responseText,
-        timestamp: new Date()
-      };
+      // 発話が検出されなかった場合は何もしない
+      if (!response.inputText) {
+        setStatus('idle');
+        return;
+      }
       
-      setMessages(prev => [...prev, userMessage, assistantMessage]);
+      addMessages(response.inputText, response.responseText);
       setStatus('speaking');
       
+      const messageToSpeak = apiKeyErrorSpeech(response.inputText, response.responseText);
       // ローカルTTSテストメッセージの場合は、ビープ音を再生してからWeb Speech APIで読み上げる
-      if (response.inputText === 'ローカルTTSのテストメッセージ' && 
-          response.responseText.startsWith('こんにちは、ローカルTTSです。')) {
+      if (isLocalTestMessage(response.inputText, response.responseText)) {
         // まずビープ音を再生
+        setResponseFormat(response.responseFormat || 'wav');
         setResponseAudio(response.responseAudio);
         
         // ビープ音の後にWeb Speech APIでテキストを読み上げる
@@ -70,18 +213,11 @@ function App() {
         }, 600); // ビープ音が0.5秒なので少し待つ
       }
       // APIキーエラーメッセージの場合は、Web Speech APIで読み上げる
-      else if (response.responseText.includes('APIキーがセットされていません') || 
-          response.responseText.includes('APIキーが必要です') ||
-          response.inputText.includes('音声認識機能を使用するには')) {
-        // 音声認識エラーと応答生成エラーを組み合わせたメッセージを作成
-        let messageToSpeak = response.responseText;
-        if (response.inputText.includes('音声認識機能を使用するには') && 
-            response.responseText.includes('APIキーがセットされていません')) {
-          messageToSpeak = "音声認識と応答生成の両方にAPIキーが必要です。OpenAI APIキーとClaude APIキーを設定してください。";
-        }
+      else if (messageToSpeak) {
         speakText(messageToSpeak);
       } else {
         // 通常の音声再生
+        setResponseFormat(response.responseFormat || 'wav');
         setResponseAudio(response.responseAudio);
         setTimeout(() => {
           setStatus('idle');
@@ -123,13 +259,20 @@ function App() {
       <ChatDisplay messages={messages} />
       
       <div style={{ textAlign: 'center', marginBottom: '20px' }}>
-        <AudioRecorder onRecordingComplete={handleRecordingComplete} />
+        <AudioRecorder onRecordingComplete={handleRecordingComplete} onChunk={handleChunk} />
+        {status === 'listening' && partialText && (
+          <div style={{ marginTop: '10px', color: '#666' }}>
+            {partialText}
+          </div>
+        )}
       </div>
       
       <AudioPlayer 
+        key={audioKey}
         audioBase64={responseAudio} 
-        format="wav"  // MeloTTSはwav形式を返す
+        format={responseFormat}
         autoPlay={true}
+        onEnded={playNextAudio}
       />
       
       <div style={{
@@ -4,9 +4,11 @@ interface AudioPlayerProps {
   audioBase64: string | null;
   format: string;
   autoPlay?: boolean;
+  // 再生が終わった（または再生できなかった）ときに呼ばれる
+  onEnded?: () => void;
 }
 
-export const AudioPlayer: React.FC<AudioPlayerProps> = ({ audioBase64, format, autoPlay = true }) => {
+export const AudioPlayer: React.FC<AudioPlayerProps> = ({ audioBase64, format, autoPlay = true, onEnded }) => {
   const [isPlaying, setIsPlaying] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const audioRef = useRef<HTMLAudioElement | null>(null);
@@ -24,7 +26,10 @@ export const AudioPlayer: React.FC<AudioPlayerProps> = ({ audioBase64, format, a
       setError(null);
       
       // MIMEタイプを適切に設定（wavの場合はaudio/wavを使用）
-      const mimeType = format === 'wav' ? 'audio/wav' : `audio/${format}`;
+      const mimeType = format === 'wav' ? 'audio/wav'
+        : format === 'opus' ? 'audio/ogg'
+        : format === 'mp3' ? 'audio/mpeg'
+        : `audio/${format}`;
       const audioBlob = base64ToBlob(audioBase64, mimeType);
       const audioUrl = URL.createObjectURL(audioBlob);
       
@@ -42,11 +47,13 @@ export const AudioPlayer: React.FC<AudioPlayerProps> = ({ audioBase64, format, a
           .catch(err => {
             setError('音声の再生に失敗しました');
             console.error('Audio playback error:', err);
+            onEnded?.();
           });
       }
     } catch (err) {
       setError('音声データの処理に失敗しました');
       console.error('Audio processing error:', err);
+      onEnded?.();
     }
   };
 
@@ -64,6 +71,7 @@ export const AudioPlayer: React.FC<AudioPlayerProps> = ({ audioBase64, format, a
 
   const handleAudioEnd = () => {
     setIsPlaying(false);
+    onEnded?.();
   };
 
   return (
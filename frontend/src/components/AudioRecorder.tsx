@@ -2,9 +2,12 @@ import React, { useState, useRef } from 'react';
 
 interface AudioRecorderProps {
   onRecordingComplete: (audioBase64: string, format: string) => void;
+  // 録音中に timeslice ミリ秒ごとの音声チャンクを受け取る（/ws/speech-to-text への逐次送信用）
+  onChunk?: (chunk: Blob) => void;
+  timeslice?: number;
 }
 
-export const AudioRecorder: React.FC<AudioRecorderProps> = ({ onRecordingComplete }) => {
+export const AudioRecorder: React.FC<AudioRecorderProps> = ({ onRecordingComplete, onChunk, timeslice = 250 }) => {
   const [isRecording, setIsRecording] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
@@ -25,6 +28,7 @@ export const AudioRecorder: React.FC<AudioRecorderProps> = ({ onRecordingComplet
       mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0) {
           audioChunksRef.current.push(event.data);
+          onChunk?.(event.data);
         }
       };
       
@@ -43,7 +47,8 @@ export const AudioRecorder: React.FC<AudioRecorderProps> = ({ onRecordingComplet
         stream.getTracks().forEach(track => track.stop());
       };
       
-      mediaRecorder.start();
+      // チャンクを受け取る場合は録音中も一定間隔でデータを取り出す
+      mediaRecorder.start(onChunk ? timeslice : undefined);
       setIsRecording(true);
     } catch (err) {
       setError('マイクへのアクセスが拒否されました。ブラウザの設定を確認してください。');
@@ -20,6 +20,89 @@ interface ProcessVoiceResponse {
   responseText: string;
   inputText: string;
   sessionId: string;
+  responseFormat?: string;
+}
+
+export interface SpeechStreamHandlers {
+  // 録音中の途中結果（ローカルWhisperのみ）
+  onPartial?: (text: string) => void;
+  // 応答の文ごとの音声（文の順番どおりに届く）
+  onAudio?: (audioBase64: string, format: string) => void;
+}
+
+interface SpeechStreamResult {
+  inputText: string;
+  responseText: string;
+  sessionId: string;
+}
+
+// 録音中の音声チャンクを /ws/speech-to-text に逐次送信し、録音終了後に応答を受け取る
+export class SpeechStream {
+  private socket: WebSocket;
+  private opened: Promise<void>;
+  private result: Promise<SpeechStreamResult>;
+
+  constructor(format: string, sessionId: string | undefined, handlers: SpeechStreamHandlers) {
+    this.socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/ws/speech-to-text`);
+    this.opened = new Promise((resolve, reject) => {
+      this.socket.onopen = () => {
+        this.socket.send(JSON.stringify({ type: 'start', format, sessionId }));
+        resolve();
+      };
+      this.socket.onerror = () => reject(new Error('WebSocket connection failed'));
+    });
+    // 接続できなかった場合は connected() の呼び出し側で扱う
+    this.opened.catch(() => {});
+
+    this.result = new Promise((resolve, reject) => {
+      this.socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'partial') {
+          handlers.onPartial?.(message.text);
+        } else if (message.type === 'audio') {
+          handlers.onAudio?.(message.audio, message.format);
+        } else if (message.type === 'done') {
+          resolve({
+            inputText: message.inputText,
+            responseText: message.responseText,
+            sessionId: message.sessionId,
+          });
+          this.socket.close();
+        } else if (message.type === 'error') {
+          reject(new Error(message.detail || 'Speech stream failed'));
+          this.socket.close();
+        }
+      };
+      this.socket.onclose = () => reject(new Error('WebSocket connection closed'));
+    });
+    this.result.catch(() => {});
+  }
+
+  // 接続できた場合はtrue
+  async connected(): Promise<boolean> {
+    try {
+      await this.opened;
+      return true;
+    } catch {
+      return false;
+    }
+  }
+
+  send(chunk: Blob) {
+    // 接続前のチャンクは接続後に順番どおり送信する
+    this.opened.then(() => this.socket.send(chunk), () => {});
+  }
+
+  // 録音の終了を伝え、認識結果とLLMの応答を待つ
+  async finish(responseFormat?: string): Promise<SpeechStreamResult> {
+    await this.opened;
+    this.socket.send(JSON.stringify({ type: 'end', respond: true, responseFormat }));
+    return this.result;
+  }
+
+  close() {
+    this.socket.close();
+  }
 }
 
 class ApiService {
@@ -67,6 +150,10 @@ class ApiService {
       body: JSON.stringify({ audio: audioBase64, format, sessionId }),
     });
   }
+
+  openSpeechStream(format: string, sessionId: string | undefined, handlers: SpeechStreamHandlers): SpeechStream {
+    return new SpeechStream(format, sessionId, handlers);
+  }
 }
 
 export const apiService = new ApiService();
\ No newline at end of file